@@ -0,0 +1 @@
+"""Headless benchmarks; run with python3 -m bench.run (see bench/run.py)."""
@@ -0,0 +1,508 @@
+"""Headless benchmarks for the library, render, playback-launch and web hot paths.
+
+    python3 -m bench.run [--sizes 10,1000,50000] [--only list,render,play,server,web]
+                         [--out bench-results.json] [--baseline old.json]
+
+Everything runs in a temp directory: synthetic libraries of each size, a
+copy of config/default_config.yaml, the SDL dummy video driver and
+bench/stub_mpv.py installed as `mpv` on PATH. Results are written as JSON;
+a result fails when it is above its entry in bench/thresholds.json or more
+than --max-slowdown times slower than the same result in --baseline, and
+the exit status is 1 if anything failed.
+"""
+import argparse
+import json
+import math
+import os
+import platform
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from pathlib import Path
+
+import yaml
+
+BENCH_DIR = Path(__file__).resolve().parent
+REPO_DIR = BENCH_DIR.parent
+DEFAULT_SIZES = (10, 1000, 50000)
+DEFAULT_THRESHOLDS = BENCH_DIR / "thresholds.json"
+DEFAULT_MAX_SLOWDOWN = 1.5
+GROUPS = ("list", "render", "play", "server", "web")
+SCREEN_SIZE = (720, 480)
+FONT_SIZE = 48
+LOG_LINES = 100000
+# One-shot plays only count as started when mpv ran for at least a second.
+ONESHOT_PLAY_SECONDS = 1.05
+IPC_PLAY_SECONDS = 0.02
+# Pages a config session loads; both web services are measured after serving them.
+WEB_PAGES = ("/", "/api/config", "/api/logs?lines=120", "/api/metrics", "/api/storage")
+WEB_START_TIMEOUT = 60
+WEB_IDLE_SECONDS = 2
+WORDS = ["alpha", "Bravo", "charlie", "Delta", "echo", "foxtrot", "golf", "Hotel", "india", "Juliet", "kilo", "lima"]
+OTHER_EXTS = [".srt", ".jpg", ".nfo"]
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[max(0, math.ceil(pct / 100.0 * len(ordered)) - 1)]
+
+
+def summarize(name, samples, **params):
+    return {
+        "name": name,
+        "params": params,
+        "n": len(samples),
+        "median_ms": round(statistics.median(samples), 3),
+        "p95_ms": round(percentile(samples, 95), 3),
+        "min_ms": round(min(samples), 3),
+        "max_ms": round(max(samples), 3),
+    }
+
+
+def measure(fn, repeat, setup=None, warmup=1):
+    """Milliseconds per call of fn; setup runs before each call and is not timed."""
+    samples = []
+    for i in range(warmup + repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        fn()
+        if i >= warmup:
+            samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+def repeats_for(size, budget=200000, low=3, high=50):
+    return max(low, min(high, budget // max(1, size)))
+
+
+def make_library(folder, size):
+    """size video files (plus one non-video file per ten) with distinct names and spread-out mtimes."""
+    folder.mkdir(parents=True, exist_ok=True)
+    now = time.time()
+    for i in range(size):
+        name = f"{WORDS[i % len(WORDS)]} {i:05d}.mp4"
+        path = folder / name
+        path.touch()
+        os.utime(path, (now - i * 60, now - i * 60))
+        if i % 10 == 0:
+            (folder / f"{name[:-4]}{OTHER_EXTS[i % len(OTHER_EXTS)]}").touch()
+    return folder
+
+
+def write_log(path, lines):
+    with open(path, "w", encoding="utf-8") as f:
+        for i in range(lines):
+            f.write(f"[2024-01-01 00:00:00] line {i} backend=drm source=/var/lib/crt-kitchen-tv/media/Inbox/clip.mp4\n")
+    return path
+
+
+def prepare(work):
+    """Point the process at the temp directory before any repo module is imported."""
+    os.environ["SDL_VIDEODRIVER"] = "dummy"
+    os.environ["SDL_AUDIODRIVER"] = "dummy"
+    os.environ.pop("DISPLAY", None)
+    os.environ.pop("WAYLAND_DISPLAY", None)
+    bin_dir = work / "bin"
+    bin_dir.mkdir()
+    shutil.copy(BENCH_DIR / "stub_mpv.py", bin_dir / "mpv")
+    os.chmod(bin_dir / "mpv", 0o755)
+    os.environ["PATH"] = f"{bin_dir}{os.pathsep}{os.environ.get('PATH', '')}"
+
+    with open(REPO_DIR / "config" / "default_config.yaml", "r", encoding="utf-8") as f:
+        cfg = yaml.safe_load(f) or {}
+    cfg.update(
+        {
+            "media_root": str(work / "media"),
+            "movies_dir": str(work / "movies"),
+            "backend_cache": str(work / "backend-cache.json"),
+            "library_index": str(work / "library.db"),
+            "thumbnail_dir": str(work / "thumbs"),
+        }
+    )
+    config_path = work / "config.yaml"
+    with open(config_path, "w", encoding="utf-8") as f:
+        yaml.safe_dump(cfg, f, sort_keys=False)
+    os.environ["CRT_CONFIG"] = str(config_path)
+    os.environ["CRT_LOG_RING"] = str(work / "log.ring")
+    if str(REPO_DIR) not in sys.path:
+        sys.path.insert(0, str(REPO_DIR))
+    return cfg
+
+
+def bench_list(libraries):
+    from ui.main import list_video_files
+
+    results = []
+    for size, folder in libraries:
+        for sort_mode in ("newest", "alpha"):
+            samples = measure(lambda: list_video_files(folder, sort_mode), repeats_for(size))
+            results.append(summarize(f"list_video_files/{sort_mode}/{size}", samples, size=size, sort=sort_mode))
+    return results
+
+
+def bench_render(work, libraries):
+    import pygame
+
+    from ui.listview import ListView
+    from ui.main import list_video_files
+    from ui.render import Renderer, load_font
+
+    pygame.display.init()
+    pygame.font.init()
+    screen = pygame.display.set_mode(SCREEN_SIZE)
+    renderer = Renderer(screen, load_font(FONT_SIZE, cache_path=str(work / "font-cache.json")), FONT_SIZE)
+    results = []
+    for size, folder in libraries:
+        files, _ = list_video_files(folder, "alpha")
+        view = ListView(rows=renderer.rows)
+        view.set_items(files)
+
+        def frame():
+            items, row = view.window()
+            renderer.draw_list("Movies", items, row, status=view.position_text())
+
+        repeat = 100
+        results.append(summarize(f"draw_list/full/{size}", measure(frame, repeat, setup=renderer.invalidate), size=size))
+        # Highlight moves repaint two rows; pages repaint everything with mostly uncached text.
+        results.append(summarize(f"draw_list/move/{size}", measure(frame, repeat, setup=lambda: view.move(1)), size=size))
+        results.append(
+            summarize(f"draw_list/page/{size}", measure(frame, repeat, setup=lambda: view.page(1) if view.top + view.rows < len(view) else view.select(0)), size=size)
+        )
+
+    messages = ["Missing folder: /home/pi/Videos", "mpv is not installed or not in PATH"]
+    turn = [0]
+
+    def message():
+        turn[0] += 1
+        renderer.draw_message(messages[turn[0] % 2])
+
+    results.append(summarize("draw_message", measure(message, 100)))
+    pygame.quit()
+    return results
+
+
+def _vo_name(backend_args):
+    return next((a.split("=", 1)[1] for a in backend_args if a.startswith("--vo=")), "auto")
+
+
+def bench_play(work, cfg, repeat):
+    """Time from play_media() to the "playing" status, for each backend plan being the first that works.
+
+    The earlier plans are made to fail in the stub, so the numbers include
+    the fallback cost a fresh device pays before its ranking is learnt.
+    """
+    from player import play
+
+    play.MPV_DEBUG_LOG = str(work / "mpv.log")
+    source = work / "clip.mp4"
+    source.write_bytes(b"\0" * 1024)
+    plans = play.build_plans(cfg.get("mpv_backend", "drm"), False) or []
+    cache_path = Path(cfg["backend_cache"])
+
+    def reset_ranking():
+        # A winner is ranked first on the next play; forget it so every sample walks the same plans.
+        play._backends = None
+        try:
+            cache_path.unlink()
+        except FileNotFoundError:
+            pass
+
+    def launch(config):
+        start = time.perf_counter()
+        seen = {}
+
+        def on_status(state, backend_name):
+            # One-shot plays report "playing" per attempt (there is no first-frame signal); the last one won.
+            if state == "playing":
+                seen["ms"] = (time.perf_counter() - start) * 1000
+                seen["backend"] = backend_name
+
+        ok, err, _ = play.play_media(str(source), config, on_status=on_status)
+        if not ok or "ms" not in seen:
+            raise RuntimeError(f"stub play failed: {err}")
+        return seen["ms"], seen["backend"]
+
+    results = []
+    modes = (("ipc_cold", True, IPC_PLAY_SECONDS), ("ipc_warm", True, IPC_PLAY_SECONDS), ("oneshot", False, ONESHOT_PLAY_SECONDS))
+    try:
+        for mode, use_ipc, play_seconds in modes:
+            config = dict(cfg, mpv_ipc=use_ipc)
+            os.environ["STUB_PLAY_SECONDS"] = str(play_seconds)
+            for idx, (backend_name, _, _) in enumerate(plans):
+                os.environ["STUB_FAIL_VO"] = ",".join(_vo_name(args) for _, args, _ in plans[:idx])
+                # The stub reads STUB_FAIL_VO when it starts; an engine left from the last plan would ignore it.
+                play.shutdown()
+                if mode == "ipc_warm":
+                    reset_ranking()
+                    launch(config)
+                samples = []
+                for _ in range(repeat):
+                    reset_ranking()
+                    if mode == "ipc_cold":
+                        play.shutdown()
+                    ms, winner = launch(config)
+                    if winner != backend_name:
+                        raise RuntimeError(f"expected {backend_name} to play, got {winner}")
+                    samples.append(ms)
+                results.append(
+                    summarize(f"play_media/{mode}/{backend_name}", samples, mode=mode, backend=backend_name, failed_before=idx)
+                )
+    finally:
+        play.shutdown()
+        os.environ.pop("STUB_FAIL_VO", None)
+    return results
+
+
+def bench_server(work, repeat):
+    from server import app as web
+    from ui import ringlog
+
+    # Synthetic logs in place of the live ones (and of journalctl, which may be missing here).
+    web.LOG_SOURCES.clear()
+    for name in ("mpv_output", "respeaker_driver"):
+        web.LOG_SOURCES[name] = ("file", str(write_log(work / f"{name}.log", LOG_LINES)))
+    ring = ringlog.RingLog(ringlog.DEFAULT_RING_PATH)
+    components = ("ui", "mpv")
+    ring.write(
+        [
+            {"ts": time.time(), "level": "info", "component": components[i % 2], "message": f"line {i} backend=drm"}
+            for i in range(LOG_LINES)
+        ]
+    )
+    ring.close()
+    for component in components:
+        web.LOG_SOURCES[f"{component}_ring"] = ("ring", component)
+    client = web.app.test_client()
+    results = []
+
+    def get(url, status=200, headers=None):
+        resp = client.get(url, headers=headers or {})
+        if resp.status_code != status:
+            raise RuntimeError(f"GET {url}: {resp.status_code}")
+        return resp
+
+    etag = get("/api/config").headers["ETag"]
+    results.append(summarize("api/config/get", measure(lambda: get("/api/config"), repeat)))
+    results.append(
+        summarize("api/config/get_not_modified", measure(lambda: get("/api/config", 304, {"If-None-Match": etag}), repeat))
+    )
+    sizes = iter(range(10 ** 6))
+
+    def post():
+        resp = client.post("/api/config", json={"font_size": 40 + next(sizes) % 8})
+        if resp.status_code != 200:
+            raise RuntimeError(f"POST /api/config: {resp.status_code} {resp.get_data(as_text=True)}")
+
+    results.append(summarize("api/config/post", measure(post, repeat)))
+    results.append(summarize("index", measure(lambda: get("/"), repeat)))
+    results.append(summarize("api/logs/cached", measure(lambda: get("/api/logs?lines=120"), repeat)))
+    ttl = web._log_cache.ttl
+    web._log_cache.ttl = 0
+    try:
+        results.append(summarize("api/logs/uncached", measure(lambda: get("/api/logs?lines=500"), repeat), lines=500, log_lines=LOG_LINES))
+    finally:
+        web._log_cache.ttl = ttl
+    return results
+
+
+def _rss_mb(pid):
+    with open(f"/proc/{pid}/status", "r", encoding="ascii") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return round(int(line.split()[1]) / 1024.0, 1)
+    return None
+
+
+def _listening_socket():
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind(("127.0.0.1", 0))
+    sock.listen(16)
+    return sock
+
+
+def _fetch(port, path, timeout=WEB_START_TIMEOUT):
+    with urllib.request.urlopen(f"http://127.0.0.1:{port}{path}", timeout=timeout) as resp:
+        resp.read()
+        return resp.status
+
+
+def _stop(proc):
+    if proc.poll() is None:
+        proc.terminate()
+        try:
+            proc.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+            proc.wait()
+
+
+def bench_web(work, repeat):
+    """Cold first-request latency and RSS of the socket-activated service vs the always-on one.
+
+    The on-demand service gets its listening socket the way systemd passes it
+    (fd 3, LISTEN_FDS/LISTEN_PID); each sample is a fresh process answering
+    its first request. RSS is read after both services served WEB_PAGES.
+    """
+    results = []
+    ondemand_rss = []
+    samples = []
+    for _ in range(repeat):
+        sock = _listening_socket()
+        port, fd = sock.getsockname()[1], sock.fileno()
+        # exec keeps the shell's pid, so LISTEN_PID=$$ is the service's pid as with systemd.
+        command = f'export LISTEN_PID=$$ LISTEN_FDS=1; exec "{sys.executable}" -m server.ondemand --idle-seconds {WEB_IDLE_SECONDS} 3<&{fd}'
+        start = time.perf_counter()
+        proc = subprocess.Popen(["sh", "-c", command], cwd=REPO_DIR, pass_fds=(fd,), stdout=subprocess.DEVNULL)
+        try:
+            _fetch(port, "/")
+            samples.append((time.perf_counter() - start) * 1000)
+            for path in WEB_PAGES:
+                _fetch(port, path)
+            ondemand_rss.append(_rss_mb(proc.pid))
+            # Left alone, it has to exit by itself once idle.
+            try:
+                proc.wait(timeout=WEB_IDLE_SECONDS + 10)
+            except subprocess.TimeoutExpired:
+                raise RuntimeError("on-demand web service did not exit when idle")
+        finally:
+            _stop(proc)
+            sock.close()
+    result = summarize("web/ondemand/first_request", samples, idle_seconds=WEB_IDLE_SECONDS)
+    result["rss_mb"] = statistics.median(ondemand_rss)
+    results.append(result)
+
+    sock = _listening_socket()
+    port = sock.getsockname()[1]
+    sock.close()
+    # The same command line as services/crt-web.service.
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "waitress", f"--listen=127.0.0.1:{port}", "--threads=12", "server.app:app"],
+        cwd=REPO_DIR,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        deadline = time.monotonic() + WEB_START_TIMEOUT
+        while True:
+            try:
+                _fetch(port, "/", timeout=5)
+                break
+            except OSError:
+                if time.monotonic() > deadline or proc.poll() is not None:
+                    raise RuntimeError("always-on web service did not start")
+                time.sleep(0.1)
+        for path in WEB_PAGES:
+            _fetch(port, path)
+        result = summarize("web/always_on/index", measure(lambda: _fetch(port, "/"), repeat * 10))
+        result["rss_mb"] = _rss_mb(proc.pid)
+        results.append(result)
+    finally:
+        _stop(proc)
+    return results
+
+
+def check(results, thresholds, baseline=None, max_slowdown=DEFAULT_MAX_SLOWDOWN):
+    """Mark each result ok/failed against thresholds and the baseline; return the failures."""
+    previous = {r["name"]: r for r in (baseline or {}).get("results", [])}
+    failures = []
+    for result in results:
+        problems = []
+        for key, limit in (thresholds.get(result["name"]) or {}).items():
+            if key in result and result[key] > limit:
+                problems.append(f"{key} {result[key]:.2f} > {limit}")
+        before = previous.get(result["name"])
+        if before and result["median_ms"] > before["median_ms"] * max_slowdown:
+            problems.append(f"median {result['median_ms']:.2f} > {max_slowdown}x baseline {before['median_ms']:.2f}")
+        result["threshold"] = thresholds.get(result["name"])
+        result["ok"] = not problems
+        if problems:
+            result["problems"] = problems
+            failures.append(result["name"])
+    return failures
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default=",".join(str(s) for s in DEFAULT_SIZES))
+    parser.add_argument("--only", default=",".join(GROUPS), help="comma separated: " + ", ".join(GROUPS))
+    parser.add_argument("--repeat", type=int, default=5, help="samples per play_media plan")
+    parser.add_argument("--server-repeat", type=int, default=30)
+    parser.add_argument("--web-repeat", type=int, default=3, help="cold starts of the on-demand web service")
+    parser.add_argument("--out", default="bench-results.json")
+    parser.add_argument("--thresholds", default=str(DEFAULT_THRESHOLDS))
+    parser.add_argument("--baseline", help="earlier results JSON to compare medians against")
+    parser.add_argument("--max-slowdown", type=float, default=DEFAULT_MAX_SLOWDOWN)
+    parser.add_argument("--keep", action="store_true", help="keep the temp directory")
+    args = parser.parse_args(argv)
+    sizes = [int(s) for s in args.sizes.split(",") if s.strip()]
+    groups = [g for g in args.only.split(",") if g.strip()]
+    unknown = set(groups) - set(GROUPS)
+    if unknown:
+        parser.error(f"unknown group(s): {', '.join(sorted(unknown))}")
+
+    work = Path(tempfile.mkdtemp(prefix="crt-bench-"))
+    results = []
+    started = time.time()
+    try:
+        cfg = prepare(work)
+        libraries = []
+        if "list" in groups or "render" in groups:
+            libraries = [(size, make_library(work / "libraries" / str(size), size)) for size in sizes]
+        if "list" in groups:
+            results += bench_list(libraries)
+        if "render" in groups:
+            results += bench_render(work, libraries)
+        if "play" in groups:
+            results += bench_play(work, cfg, args.repeat)
+        if "server" in groups:
+            results += bench_server(work, args.server_repeat)
+        if "web" in groups:
+            results += bench_web(work, args.web_repeat)
+    finally:
+        if not args.keep:
+            shutil.rmtree(work, ignore_errors=True)
+
+    try:
+        with open(args.thresholds, "r", encoding="utf-8") as f:
+            thresholds = json.load(f)
+    except (OSError, ValueError):
+        thresholds = {}
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+    failures = check(results, thresholds, baseline, args.max_slowdown)
+    report = {
+        "created": started,
+        "seconds": round(time.time() - started, 1),
+        "host": platform.node(),
+        "machine": platform.machine(),
+        "python": platform.python_version(),
+        "sizes": sizes,
+        "groups": groups,
+        "results": results,
+        "failures": failures,
+        "ok": not failures,
+    }
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=1)
+
+    for result in results:
+        flag = "ok  " if result["ok"] else "FAIL"
+        rss = f"  rss {result['rss_mb']:.1f} MB" if "rss_mb" in result else ""
+        print(f"{flag} {result['name']:<36} median {result['median_ms']:>9.2f} ms  p95 {result['p95_ms']:>9.2f} ms  n={result['n']}{rss}")
+        for problem in result.get("problems", []):
+            print(f"       {problem}")
+    print(f"{len(results)} results, {len(failures)} failed, written to {args.out}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""Stand-in for mpv used by the benchmarks.
+
+Understands just enough of mpv's command line and JSON IPC for
+player/play.py: --version, one-shot plays (sleep STUB_PLAY_SECONDS, exit 0)
+and --idle --input-ipc-server engines (start-file, playback-restart, end-file).
+Video outputs listed in STUB_FAIL_VO (comma separated, "auto" for no --vo)
+fail straight away, like a real mpv that cannot open the display.
+"""
+import json
+import os
+import socket
+import sys
+import threading
+import time
+
+
+def main(args):
+    if "--version" in args:
+        print("mpv 0.35.1 (benchmark stub)")
+        return 0
+    vo = next((a.split("=", 1)[1] for a in args if a.startswith("--vo=")), "auto")
+    fails = vo in os.environ.get("STUB_FAIL_VO", "").split(",")
+    play_seconds = float(os.environ.get("STUB_PLAY_SECONDS", "1.0"))
+    ipc = next((a.split("=", 1)[1] for a in args if a.startswith("--input-ipc-server=")), None)
+    if ipc is None:
+        if fails:
+            print(f"[vo/{vo}] failed to initialize", file=sys.stderr)
+            return 2
+        time.sleep(play_seconds)
+        return 0
+
+    srv = socket.socket(socket.AF_UNIX)
+    srv.bind(ipc)
+    srv.listen(1)
+    conn, _ = srv.accept()
+    lock = threading.Lock()
+    state = {"playing": False}
+
+    def send(obj):
+        with lock:
+            conn.sendall((json.dumps(obj) + "\n").encode())
+
+    def finish(reason, error=None):
+        if state["playing"]:
+            state["playing"] = False
+            event = {"event": "end-file", "reason": reason}
+            if error:
+                event["file_error"] = error
+            send(event)
+
+    buf = b""
+    while True:
+        data = conn.recv(4096)
+        if not data:
+            return 0
+        buf += data
+        while b"\n" in buf:
+            line, buf = buf.split(b"\n", 1)
+            msg = json.loads(line)
+            cmd = msg["command"]
+            reply = None
+            if cmd[0] == "loadfile":
+                send({"event": "start-file"})
+                state["playing"] = True
+                if fails:
+                    finish("error", "vo init failed")
+                else:
+                    send({"event": "file-loaded"})
+                    send({"event": "playback-restart"})
+                    threading.Timer(play_seconds, finish, args=("eof",)).start()
+            elif cmd[0] == "stop":
+                finish("stop")
+            elif cmd[0] == "get_property":
+                reply = {"vo-configured": True, "current-tracks/video": {"id": 1}}.get(cmd[1])
+            elif cmd[0] == "quit":
+                send({"request_id": msg.get("request_id"), "error": "success"})
+                return 0
+            send({"request_id": msg.get("request_id"), "error": "success", "data": reply})
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,485 @@
+import http.client
+import os
+import queue
+import re
+import signal
+import threading
+import time
+import xml.etree.ElementTree as ET
+from contextlib import contextmanager
+from datetime import datetime
+from email.utils import parsedate_to_datetime
+from pathlib import Path
+from urllib.parse import unquote, urljoin, urlsplit
+
+from ingest.worker import JobStore
+from ui import ringlog
+from ui.config_store import ConfigStore
+from ui.library import VIDEO_EXTS, is_video_name
+
+DOWNLOAD_LOG = "/tmp/crt-kitchen-tv-downloads.log"
+DEFAULT_STATE_PATH = "/var/lib/crt-kitchen-tv/downloads-state.json"
+USER_AGENT = "crt-kitchen-tv"
+HTTP_TIMEOUT = 30
+MAX_REDIRECTS = 5
+READ_SIZE = 64 * 1024
+MAX_FEED_BYTES = 4 * 1024 * 1024
+MAX_ATTEMPTS = 3
+TYPE_EXTS = {"video/mp4": ".mp4", "video/x-m4v": ".m4v", "video/quicktime": ".mov", "video/x-matroska": ".mkv"}
+UNSAFE_RE = re.compile(r"[^\w .()+,-]")
+
+
+_log = ringlog.Logger("downloads", fallback_path=DOWNLOAD_LOG)
+
+
+def load_config(store=None):
+    cfg, _ = (store or ConfigStore()).load()
+    cfg.setdefault("media_root", "/var/lib/crt-kitchen-tv/media")
+    opts = cfg.setdefault("downloads", {}) or {}
+    cfg["downloads"] = opts
+    opts.setdefault("enabled", True)
+    opts.setdefault("interval_minutes", 60)
+    opts.setdefault("workers", 2)
+    opts.setdefault("bandwidth_kbps", 2000)
+    opts.setdefault("state_path", DEFAULT_STATE_PATH)
+    opts.setdefault("feeds", [])
+    opts.setdefault("retention", {})
+    return cfg
+
+
+def _local(tag):
+    return tag.rsplit("}", 1)[-1].lower()
+
+
+def _child(node, name):
+    for child in node:
+        if _local(child.tag) == name:
+            return child
+    return None
+
+
+def _text(node, name):
+    child = _child(node, name)
+    return (child.text or "").strip() if child is not None and child.text else ""
+
+
+def parse_date(text):
+    if not text:
+        return None
+    try:
+        return parsedate_to_datetime(text).timestamp()
+    except (TypeError, ValueError, IndexError):
+        pass
+    try:
+        return datetime.fromisoformat(text.replace("Z", "+00:00")).timestamp()
+    except ValueError:
+        return None
+
+
+def parse_feed(data, base_url=""):
+    """Episodes with a video enclosure from an RSS 2.0 or Atom document, newest first."""
+    root = ET.fromstring(data)
+    episodes = []
+    for node in root.iter():
+        kind = _local(node.tag)
+        if kind not in ("item", "entry"):
+            continue
+        url, length, mime = None, 0, ""
+        for child in node:
+            name = _local(child.tag)
+            if name == "enclosure" and child.get("url"):
+                url, mime = child.get("url"), child.get("type", "")
+                length = child.get("length", 0)
+            elif name == "link" and child.get("rel") == "enclosure" and child.get("href"):
+                url, mime = child.get("href"), child.get("type", "")
+                length = child.get("length", 0)
+            elif name == "content" and child.get("url") and url is None:
+                # Media RSS (<media:content>) as a fallback for feeds without enclosures.
+                url, mime = child.get("url"), child.get("type", "")
+                length = child.get("filesize", 0)
+            if url and (mime.startswith("video/") or is_video_name(urlsplit(url).path)):
+                break
+        if not url or not (mime.startswith("video/") or is_video_name(urlsplit(url).path)):
+            continue
+        published = parse_date(_text(node, "pubdate") or _text(node, "published") or _text(node, "updated"))
+        try:
+            length = int(length or 0)
+        except ValueError:
+            length = 0
+        url = urljoin(base_url, url)
+        episodes.append(
+            {
+                "guid": _text(node, "guid") or _text(node, "id") or url,
+                "title": _text(node, "title") or Path(urlsplit(url).path).stem,
+                "url": url,
+                "type": mime,
+                "length": length,
+                "published": published,
+            }
+        )
+    episodes.sort(key=lambda e: e["published"] or 0, reverse=True)
+    return episodes
+
+
+def episode_filename(episode):
+    ext = Path(unquote(urlsplit(episode["url"]).path)).suffix.lower()
+    if ext not in VIDEO_EXTS:
+        ext = TYPE_EXTS.get(episode.get("type", ""), ".mp4")
+    stamp = time.strftime("%Y-%m-%d ", time.localtime(episode["published"])) if episode.get("published") else ""
+    name = UNSAFE_RE.sub("_", f"{stamp}{episode['title']}").strip(" ._")[:150] or "episode"
+    return name + ext
+
+
+class TokenBucket:
+    """Shared byte budget: consume() sleeps so all downloads together stay under rate bytes/s."""
+
+    def __init__(self, rate):
+        self.rate = float(rate)
+        self.capacity = max(self.rate, READ_SIZE)
+        self.tokens = self.capacity
+        self.stamp = time.monotonic()
+        self._lock = threading.Lock()
+
+    def consume(self, amount):
+        if self.rate <= 0:
+            return
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.stamp) * self.rate)
+            self.stamp = now
+            self.tokens -= amount
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+        if wait > 0:
+            time.sleep(wait)
+
+
+class ConnectionPool:
+    """Keep-alive HTTP(S) connections reused across feed fetches and downloads."""
+
+    def __init__(self, timeout=HTTP_TIMEOUT, per_host=4):
+        self.timeout = timeout
+        self.per_host = per_host
+        self._idle = {}
+        self._lock = threading.Lock()
+
+    def _key(self, url):
+        parts = urlsplit(url)
+        if parts.scheme not in ("http", "https"):
+            raise ValueError(f"unsupported URL scheme: {url}")
+        port = parts.port or (443 if parts.scheme == "https" else 80)
+        return parts.scheme, parts.hostname, port
+
+    def _acquire(self, key):
+        with self._lock:
+            idle = self._idle.get(key)
+            if idle:
+                return idle.pop(), True
+        scheme, host, port = key
+        cls = http.client.HTTPSConnection if scheme == "https" else http.client.HTTPConnection
+        return cls(host, port, timeout=self.timeout), False
+
+    def _release(self, key, conn):
+        with self._lock:
+            idle = self._idle.setdefault(key, [])
+            if len(idle) < self.per_host:
+                idle.append(conn)
+                return
+        conn.close()
+
+    def _send(self, method, url, headers, body=None):
+        key = self._key(url)
+        parts = urlsplit(url)
+        target = (parts.path or "/") + (f"?{parts.query}" if parts.query else "")
+        while True:
+            conn, reused = self._acquire(key)
+            try:
+                conn.request(method, target, body=body, headers=headers)
+                return key, conn, conn.getresponse()
+            except (OSError, http.client.HTTPException):
+                conn.close()
+                # The server may have dropped an idle keep-alive connection; retry once on a fresh one.
+                if not reused:
+                    raise
+
+    @contextmanager
+    def open(self, url, headers=None, method="GET", body=None):
+        """Yield the response (resp.url is the final URL after redirects; body is not resent to them)."""
+        headers = dict(headers or {})
+        headers.setdefault("User-Agent", USER_AGENT)
+        for _ in range(MAX_REDIRECTS + 1):
+            key, conn, resp = self._send(method, url, headers, body)
+            location = resp.getheader("Location")
+            if resp.status in (301, 302, 303, 307, 308) and location:
+                resp.read()
+                self._finish(key, conn, resp)
+                url = urljoin(url, location)
+                if body is not None:
+                    method, body = "GET", None
+                continue
+            break
+        else:
+            raise http.client.HTTPException(f"too many redirects for {url}")
+        resp.url = url
+        try:
+            yield resp
+        finally:
+            self._finish(key, conn, resp)
+
+    def _finish(self, key, conn, resp):
+        # Only a fully read response leaves the connection ready for the next request.
+        if resp.isclosed() and not resp.will_close:
+            self._release(key, conn)
+        else:
+            conn.close()
+
+    def close(self):
+        with self._lock:
+            conns = [c for idle in self._idle.values() for c in idle]
+            self._idle.clear()
+        for conn in conns:
+            conn.close()
+
+
+class Downloader:
+    """Polls the configured feeds and downloads new episodes into their collections.
+
+    At most `workers` downloads run at once, all sharing one connection pool
+    and one bandwidth budget. Partial files (.name.part, ignored by the
+    library) are resumed with HTTP Range after a restart or a dropped
+    connection; finished files are renamed into place.
+    """
+
+    def __init__(self, cfg):
+        self.cfg = cfg
+        self.opts = cfg["downloads"]
+        self.media_root = Path(cfg["media_root"])
+        self.store = JobStore(self.opts.get("state_path", DEFAULT_STATE_PATH))
+        self.pool = ConnectionPool()
+        self.bucket = TokenBucket(float(self.opts.get("bandwidth_kbps", 0) or 0) * 1000 / 8)
+        self.workers = max(1, int(self.opts.get("workers", 2)))
+        self.queue = queue.Queue()
+        self._queued = set()
+        self._queued_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._threads = []
+
+    def start(self):
+        for idx in range(self.workers):
+            thread = threading.Thread(target=self._work, name=f"download-{idx}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        thread = threading.Thread(target=self._schedule, name="download-schedule", daemon=True)
+        thread.start()
+        self._threads.append(thread)
+        _log(f"downloads started: workers={self.workers} feeds={len(self.opts.get('feeds', []))}")
+
+    def stop(self):
+        self._stop.set()
+        for _ in range(self.workers):
+            self.queue.put(None)
+        for thread in self._threads:
+            thread.join(timeout=10)
+        self.pool.close()
+        self.store.save()
+
+    def _schedule(self):
+        interval = max(1.0, float(self.opts.get("interval_minutes", 60)) * 60)
+        while not self._stop.is_set():
+            self.run_once()
+            self._stop.wait(interval)
+
+    def run_once(self):
+        """Check every feed, queue new episodes, then apply retention."""
+        for feed in self.opts.get("feeds", []):
+            if self._stop.is_set():
+                return
+            try:
+                self.check_feed(feed)
+            except Exception as exc:
+                _log(f"feed failed: {feed.get('url')} :: {exc}")
+        self._requeue_unfinished()
+        self.prune()
+
+    def _requeue_unfinished(self):
+        for key, job in self.store.items():
+            # Interrupted or failed downloads keep their .part file and resume with a Range request.
+            if key.startswith("episode:") and job.get("status") in ("pending", "running", "failed"):
+                if job.get("attempts", 0) < MAX_ATTEMPTS:
+                    self._enqueue(key)
+
+    def check_feed(self, feed):
+        url = feed["url"]
+        key = f"feed:{url}"
+        state = self.store.get(key) or {}
+        headers = {}
+        if state.get("etag"):
+            headers["If-None-Match"] = state["etag"]
+        if state.get("last_modified"):
+            headers["If-Modified-Since"] = state["last_modified"]
+        with self.pool.open(url, headers) as resp:
+            if resp.status == 304:
+                resp.read()
+                episodes = None
+            elif resp.status != 200:
+                resp.read()
+                raise OSError(f"HTTP {resp.status}")
+            else:
+                data = resp.read(MAX_FEED_BYTES + 1)
+                if len(data) > MAX_FEED_BYTES:
+                    raise OSError("feed is too large")
+                episodes = parse_feed(data, resp.url)
+                self.store.update(
+                    key, etag=resp.getheader("ETag"), last_modified=resp.getheader("Last-Modified"), checked=time.time()
+                )
+        if episodes is None:
+            return
+        collection = feed.get("collection") or "News"
+        max_age = ((self.opts.get("retention") or {}).get(collection) or {}).get("max_age_days")
+        # Only the newest few are worth fetching; older back-catalogue would be pruned right away.
+        for episode in episodes[: max(1, int(feed.get("max_episodes", 3)))]:
+            job_key = f"episode:{episode['guid']}"
+            if max_age is not None and episode["published"] and time.time() - episode["published"] > float(max_age) * 86400:
+                # Would be pruned straight away.
+                continue
+            job = self.store.get(job_key)
+            if job and (job.get("status") in ("done", "pruned") or job.get("attempts", 0) >= MAX_ATTEMPTS):
+                continue
+            if not job:
+                folder = self.media_root / collection
+                self.store.update(
+                    job_key,
+                    status="pending",
+                    url=episode["url"],
+                    feed=url,
+                    collection=collection,
+                    target=str(folder / episode_filename(episode)),
+                    length=episode["length"],
+                    published=episode["published"],
+                    attempts=0,
+                )
+
+    def _enqueue(self, job_key):
+        with self._queued_lock:
+            if job_key in self._queued:
+                return
+            self._queued.add(job_key)
+        self.queue.put(job_key)
+
+    def _work(self):
+        while not self._stop.is_set():
+            job_key = self.queue.get()
+            if job_key is None:
+                return
+            try:
+                self.download(job_key)
+            except Exception as exc:
+                job = self.store.get(job_key) or {}
+                self.store.update(job_key, status="failed", error=str(exc), attempts=job.get("attempts", 0) + 1)
+                _log(f"download failed: {job.get('url')} :: {exc}")
+            finally:
+                with self._queued_lock:
+                    self._queued.discard(job_key)
+
+    def download(self, job_key):
+        job = self.store.get(job_key)
+        final = Path(job["target"])
+        part = final.with_name(f".{final.name}.part")
+        final.parent.mkdir(parents=True, exist_ok=True)
+        offset = part.stat().st_size if part.exists() else 0
+        headers = {}
+        if offset:
+            headers["Range"] = f"bytes={offset}-"
+            # Resume only if the file on the server is still the one we started.
+            validator = job.get("etag") or job.get("last_modified")
+            if validator:
+                headers["If-Range"] = validator
+        self.store.update(job_key, status="running", started=time.time())
+        _log(f"download {'resume at ' + str(offset) + ' ' if offset else ''}{job['url']} -> {final}")
+        with self.pool.open(job["url"], headers) as resp:
+            if resp.status == 416 and offset and (resp.getheader("Content-Range") or "").endswith(f"/{offset}"):
+                # Everything had already arrived before the interruption.
+                resp.read()
+            elif resp.status in (200, 206):
+                if resp.status == 200:
+                    offset = 0
+                total = resp.getheader("Content-Length")
+                total = offset + int(total) if total and total.isdigit() else None
+                self.store.update(
+                    job_key, etag=resp.getheader("ETag"), last_modified=resp.getheader("Last-Modified"), total=total
+                )
+                with open(part, "r+b" if offset else "wb") as f:
+                    f.seek(offset)
+                    while True:
+                        if self._stop.is_set():
+                            self.store.update(job_key, status="pending")
+                            return False
+                        chunk = resp.read(READ_SIZE)
+                        if not chunk:
+                            break
+                        f.write(chunk)
+                        self.bucket.consume(len(chunk))
+                    f.truncate()
+                    f.flush()
+                    os.fsync(f.fileno())
+                size = part.stat().st_size
+                if total is not None and size != total:
+                    raise OSError(f"connection closed at {size} of {total} bytes")
+            else:
+                resp.read()
+                raise OSError(f"HTTP {resp.status}")
+        os.replace(part, final)
+        self.store.update(job_key, status="done", finished=time.time(), size=final.stat().st_size, error=None)
+        _log(f"download done: {final}")
+        return True
+
+    def prune(self, now=None):
+        """Apply retention.<collection>.max_count / max_age_days to downloaded episodes.
+
+        Only files this service downloaded are ever removed; uploads and
+        ingest output in the same collection are left alone.
+        """
+        now = time.time() if now is None else now
+        rules = self.opts.get("retention") or {}
+        done = {}
+        for key, job in self.store.items():
+            if key.startswith("episode:") and job.get("status") == "done":
+                done.setdefault(job.get("collection"), []).append((key, job))
+        for collection, jobs in done.items():
+            rule = rules.get(collection) or {}
+            max_count = rule.get("max_count")
+            max_age = rule.get("max_age_days")
+            jobs.sort(key=lambda kj: kj[1].get("published") or kj[1].get("finished") or 0, reverse=True)
+            for idx, (key, job) in enumerate(jobs):
+                stamp = job.get("published") or job.get("finished") or now
+                too_many = max_count is not None and idx >= int(max_count)
+                too_old = max_age is not None and now - stamp > float(max_age) * 86400
+                if not (too_many or too_old):
+                    continue
+                try:
+                    os.remove(job["target"])
+                except FileNotFoundError:
+                    pass
+                except OSError as exc:
+                    _log(f"prune failed: {job['target']} :: {exc}")
+                    continue
+                self.store.update(key, status="pruned", pruned=time.time())
+                _log(f"pruned ({'count' if too_many else 'age'}): {job['target']}")
+
+
+def main():
+    cfg = load_config()
+    if not cfg["downloads"].get("enabled", True):
+        _log("downloads disabled in config; exiting")
+        return
+    worker = Downloader(cfg)
+    done = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: done.set())
+    signal.signal(signal.SIGINT, lambda *_: done.set())
+    worker.start()
+    done.wait()
+    _log("downloads stopping")
+    worker.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,455 @@
+import json
+import os
+import queue
+import shutil
+import signal
+import subprocess
+import threading
+import time
+from pathlib import Path
+
+import yaml
+
+from ui import ringlog
+from ui.library import is_video_name
+from ui.watch import DirWatcher
+
+CONFIG_PATH = os.environ.get("CRT_CONFIG", "/etc/crt-kitchen-tv/config.yaml")
+INGEST_LOG = "/tmp/crt-kitchen-tv-ingest.log"
+DEFAULT_STATE_PATH = "/var/lib/crt-kitchen-tv/ingest-state.json"
+SETTLE_SECONDS = 5
+STATE_SAVE_INTERVAL = 5
+
+# Mirrors scripts/send-to-pi.sh: fits the 640x480 composite framebuffer at PAL rate.
+DEFAULT_PROFILE = {
+    "width": 640,
+    "height": 480,
+    "fps": 25,
+    "video_codec": "libx264",
+    "video_profile": "baseline",
+    "video_level": "3.0",
+    "preset": "veryfast",
+    "video_bitrate": "700k",
+    "max_bitrate": "900k",
+    "audio_codec": "aac",
+    "audio_bitrate": "96k",
+    "audio_channels": 1,
+}
+CODEC_FAMILIES = {"libx264": "h264", "libx265": "hevc", "mpeg2video": "mpeg2video", "mpeg4": "mpeg4"}
+BASELINE_PROFILES = {"baseline", "constrained baseline"}
+
+
+_log = ringlog.Logger("ingest", fallback_path=INGEST_LOG)
+
+
+def load_config():
+    try:
+        with open(CONFIG_PATH, "r", encoding="utf-8") as f:
+            cfg = yaml.safe_load(f) or {}
+    except FileNotFoundError:
+        cfg = {}
+    cfg.setdefault("media_root", "/var/lib/crt-kitchen-tv/media")
+    ingest = cfg.setdefault("ingest", {}) or {}
+    cfg["ingest"] = ingest
+    ingest.setdefault("enabled", True)
+    ingest.setdefault("collections", ["Inbox"])
+    ingest.setdefault("workers", 1)
+    ingest.setdefault("nice", 19)
+    ingest.setdefault("ionice_class", 3)
+    ingest.setdefault("state_path", DEFAULT_STATE_PATH)
+    profile = dict(DEFAULT_PROFILE)
+    profile.update(ingest.get("profile") or {})
+    ingest["profile"] = profile
+    return cfg
+
+
+def parse_bitrate(value):
+    text = str(value).strip().lower()
+    scale = 1
+    if text.endswith("k"):
+        scale, text = 1000, text[:-1]
+    elif text.endswith("m"):
+        scale, text = 1000000, text[:-1]
+    try:
+        return int(float(text) * scale)
+    except ValueError:
+        return 0
+
+
+def parse_rate(value):
+    try:
+        num, _, den = str(value).partition("/")
+        return float(num) / float(den or 1)
+    except (ValueError, ZeroDivisionError):
+        return 0.0
+
+
+def probe(path):
+    cmd = ["ffprobe", "-v", "error", "-print_format", "json", "-show_format", "-show_streams", str(path)]
+    try:
+        result = subprocess.run(cmd, check=False, capture_output=True, text=True, timeout=120)
+    except FileNotFoundError:
+        return None, "ffprobe is not installed"
+    except subprocess.TimeoutExpired:
+        return None, "ffprobe timed out"
+    if result.returncode != 0:
+        err = (result.stderr or "").strip().splitlines()
+        return None, err[-1] if err else f"ffprobe exited with code {result.returncode}"
+    try:
+        return json.loads(result.stdout or "{}"), None
+    except ValueError:
+        return None, "ffprobe returned invalid JSON"
+
+
+def needs_transcode(info, profile):
+    """Return a reason string when the probed file exceeds the profile, else None."""
+    streams = info.get("streams", [])
+    video = next((s for s in streams if s.get("codec_type") == "video"), None)
+    if video is None:
+        return "no video stream"
+    family = CODEC_FAMILIES.get(profile["video_codec"], profile["video_codec"])
+    if video.get("codec_name") != family:
+        return f"codec {video.get('codec_name')}"
+    if int(video.get("width") or 0) > int(profile["width"]) or int(video.get("height") or 0) > int(profile["height"]):
+        return f"resolution {video.get('width')}x{video.get('height')}"
+    fps = parse_rate(video.get("avg_frame_rate") or video.get("r_frame_rate"))
+    if fps > float(profile["fps"]) * 1.05:
+        return f"frame rate {fps:.2f}"
+    if video.get("pix_fmt") not in (None, "yuv420p"):
+        return f"pixel format {video.get('pix_fmt')}"
+    if profile.get("video_profile") == "baseline" and str(video.get("profile", "")).lower() not in BASELINE_PROFILES:
+        return f"profile {video.get('profile')}"
+    bitrate = int(info.get("format", {}).get("bit_rate") or 0)
+    limit = parse_bitrate(profile["max_bitrate"]) + parse_bitrate(profile["audio_bitrate"])
+    if limit and bitrate > limit * 1.25:
+        return f"bitrate {bitrate // 1000}k"
+    return None
+
+
+def build_ffmpeg_args(src, dst, profile):
+    w, h, fps = int(profile["width"]), int(profile["height"]), int(profile["fps"])
+    vf = (
+        f"scale=w={w}:h={h}:force_original_aspect_ratio=decrease,"
+        f"pad={w}:{h}:(ow-iw)/2:(oh-ih)/2,format=yuv420p,fps={fps}"
+    )
+    bufsize = parse_bitrate(profile["max_bitrate"]) * 3 // 2
+    args = ["ffmpeg", "-y", "-hide_banner", "-nostdin", "-nostats", "-progress", "pipe:1", "-i", str(src)]
+    args += ["-map", "0:v:0", "-map", "0:a:0?", "-vf", vf, "-c:v", profile["video_codec"]]
+    if profile["video_codec"] == "libx264":
+        args += ["-profile:v", profile["video_profile"], "-level", str(profile["video_level"])]
+        args += ["-preset", profile["preset"]]
+    args += ["-pix_fmt", "yuv420p", "-b:v", str(profile["video_bitrate"]), "-maxrate", str(profile["max_bitrate"])]
+    args += ["-bufsize", str(bufsize), "-g", str(fps * 2), "-keyint_min", str(fps * 2), "-sc_threshold", "0"]
+    args += ["-c:a", profile["audio_codec"], "-ac", str(profile["audio_channels"]), "-b:a", str(profile["audio_bitrate"])]
+    args += ["-movflags", "+faststart", "-f", "mp4", str(dst)]
+    return args
+
+
+def low_priority(cmd, nice=19, ionice_class=3):
+    prefix = []
+    if ionice_class is not None and shutil.which("ionice"):
+        prefix += ["ionice", "-c", str(ionice_class)]
+    if nice is not None and shutil.which("nice"):
+        prefix += ["nice", "-n", str(nice)]
+    return prefix + cmd
+
+
+def _file_key(path):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return [st.st_size, st.st_mtime]
+
+
+def output_path_for(src):
+    src = Path(src)
+    final = src.with_suffix(".mp4")
+    if final != src and final.exists():
+        final = src.with_name(f"{src.stem}_crt.mp4")
+    return final
+
+
+def temp_path_for(final):
+    final = Path(final)
+    return final.with_name(f".{final.stem}.ingest.mp4")
+
+
+class JobStore:
+    """Job table persisted as JSON so queued and interrupted jobs survive a reboot."""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.jobs = {}
+        self._lock = threading.Lock()
+        # Serialises writers of the shared temp file (several workers may save at once).
+        self._save_lock = threading.Lock()
+        self._dirty = False
+        self._last_save = 0.0
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                self.jobs = json.load(f).get("jobs", {})
+        except (FileNotFoundError, ValueError):
+            self.jobs = {}
+
+    def get(self, path):
+        with self._lock:
+            job = self.jobs.get(str(path))
+            return dict(job) if job else None
+
+    def update(self, path, save=True, **fields):
+        with self._lock:
+            job = self.jobs.setdefault(str(path), {})
+            job.update(fields)
+            job["updated"] = time.time()
+            self._dirty = True
+        if save:
+            self.save()
+
+    def remove(self, path):
+        with self._lock:
+            if self.jobs.pop(str(path), None) is not None:
+                self._dirty = True
+        self.save()
+
+    def items(self):
+        with self._lock:
+            return [(p, dict(j)) for p, j in self.jobs.items()]
+
+    def save(self, force=True):
+        with self._save_lock:
+            with self._lock:
+                if not self._dirty:
+                    return
+                if not force and time.time() - self._last_save < STATE_SAVE_INTERVAL:
+                    return
+                payload = json.dumps({"jobs": self.jobs}, indent=1, sort_keys=True)
+                self._dirty = False
+                self._last_save = time.time()
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.path.with_name(self.path.name + ".tmp")
+            with open(tmp, "w", encoding="utf-8") as f:
+                f.write(payload)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, self.path)
+
+
+class IngestWorker:
+    def __init__(self, cfg):
+        self.cfg = cfg
+        self.opts = cfg["ingest"]
+        self.profile = self.opts["profile"]
+        self.store = JobStore(self.opts.get("state_path", DEFAULT_STATE_PATH))
+        self.queue = queue.Queue()
+        self.workers = max(1, int(self.opts.get("workers", 1)))
+        self._queued = set()
+        self._active = set()
+        self._requeue = set()
+        self._queued_lock = threading.Lock()
+        self._procs = {}
+        self._stop = threading.Event()
+        self._threads = []
+        self.watcher = DirWatcher(self._on_change)
+        media_root = Path(cfg["media_root"])
+        self.folders = {name: media_root / name for name in self.opts.get("collections", [])}
+
+    def start(self):
+        self._resume()
+        for name, folder in self.folders.items():
+            self.watcher.add(name, folder)
+            self._scan(name)
+        self.watcher.start()
+        for idx in range(self.workers):
+            thread = threading.Thread(target=self._work, name=f"ingest-{idx}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        _log(f"ingest started: workers={self.workers} collections={','.join(self.folders) or '-'}")
+
+    def stop(self):
+        self._stop.set()
+        self.watcher.stop()
+        for proc in list(self._procs.values()):
+            try:
+                proc.terminate()
+            except Exception:
+                pass
+        for _ in self._threads:
+            self.queue.put(None)
+        for thread in self._threads:
+            thread.join(timeout=10)
+        self.store.save()
+
+    def _resume(self):
+        for path, job in self.store.items():
+            if not os.path.exists(path):
+                self.store.remove(path)
+                continue
+            if job.get("status") in ("pending", "running"):
+                # Interrupted mid-encode: the partial temp file is worthless, start over.
+                tmp = job.get("temp")
+                if tmp and os.path.exists(tmp):
+                    os.remove(tmp)
+                self.store.update(path, status="pending", progress=0.0)
+                self._enqueue(path)
+
+    def _scan(self, collection):
+        folder = self.folders[collection]
+        try:
+            names = [e.name for e in os.scandir(folder) if e.is_file() and is_video_name(e.name)]
+        except OSError:
+            return
+        for name in names:
+            self._consider(folder / name)
+
+    def _on_change(self, collection, name, kind):
+        if kind == "rescan":
+            self._scan(collection)
+        elif kind == "changed" and is_video_name(name):
+            self._consider(self.folders[collection] / name)
+
+    def _consider(self, path):
+        key = _file_key(path)
+        if key is None:
+            return
+        job = self.store.get(path)
+        if job and job.get("key") == key and job.get("status") in ("done", "skipped", "failed"):
+            return
+        self.store.update(path, status="pending", key=key, progress=0.0)
+        self._enqueue(path)
+
+    def _enqueue(self, path):
+        path = str(path)
+        with self._queued_lock:
+            if path in self._active:
+                # Picked up again once the running job for this path finishes.
+                self._requeue.add(path)
+                return
+            if path in self._queued:
+                return
+            self._queued.add(path)
+        self.queue.put(path)
+
+    def _work(self):
+        while not self._stop.is_set():
+            path = self.queue.get()
+            if path is None:
+                return
+            with self._queued_lock:
+                self._queued.discard(path)
+                self._active.add(path)
+            try:
+                self._process(path)
+            except Exception as exc:
+                _log(f"ingest crashed on {path}: {exc}")
+                self.store.update(path, status="failed", error=str(exc))
+            finally:
+                with self._queued_lock:
+                    self._active.discard(path)
+                    again = path in self._requeue
+                    self._requeue.discard(path)
+            if again and not self._stop.is_set():
+                self._consider(path)
+
+    def _settled(self, path):
+        """Wait until a file stops changing (copies over Samba arrive in pieces)."""
+        last = _file_key(path)
+        while not self._stop.is_set():
+            if last is None:
+                return False
+            if time.time() - last[1] >= SETTLE_SECONDS:
+                return True
+            self._stop.wait(SETTLE_SECONDS)
+            current = _file_key(path)
+            if current == last:
+                return True
+            last = current
+        return False
+
+    def _process(self, path):
+        if not self._settled(path):
+            return
+        key = _file_key(path)
+        info, err = probe(path)
+        if info is None:
+            _log(f"probe failed: {path} :: {err}")
+            self.store.update(path, status="failed", key=key, error=err)
+            return
+        reason = needs_transcode(info, self.profile)
+        if reason is None:
+            _log(f"ingest skip (already fits profile): {path}")
+            self.store.update(path, status="skipped", key=key)
+            return
+        duration = float(info.get("format", {}).get("duration") or 0)
+        final = output_path_for(path)
+        tmp = temp_path_for(final)
+        _log(f"transcode start: {path} ({reason}) -> {final}")
+        self.store.update(path, status="running", key=key, temp=str(tmp), output=str(final), reason=reason)
+        started = time.time()
+        ok, err = self._run_ffmpeg(path, tmp, duration)
+        if not ok:
+            if tmp.exists():
+                tmp.unlink()
+            if self._stop.is_set():
+                self.store.update(path, status="pending", progress=0.0)
+                return
+            _log(f"transcode failed: {path} :: {err}")
+            self.store.update(path, status="failed", error=err)
+            return
+        if _file_key(path) != key:
+            # Source changed while encoding; throw the result away and start over.
+            tmp.unlink()
+            self._consider(path)
+            return
+        # Record the result before the rename so the watcher event it triggers is recognised.
+        self.store.update(final, status="done", key=_file_key(tmp), source=str(path), progress=1.0)
+        os.replace(tmp, final)
+        if Path(path) != final:
+            os.remove(path)
+            self.store.remove(path)
+        _log(f"transcode done: {final} in {time.time() - started:.0f}s")
+
+    def _run_ffmpeg(self, src, dst, duration):
+        cmd = low_priority(build_ffmpeg_args(src, dst, self.profile), self.opts.get("nice"), self.opts.get("ionice_class"))
+        try:
+            proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+        except FileNotFoundError:
+            return False, "ffmpeg is not installed"
+        self._procs[src] = proc
+        stderr_lines = []
+        reader = threading.Thread(target=lambda: stderr_lines.extend(proc.stderr), daemon=True)
+        reader.start()
+        try:
+            for line in proc.stdout:
+                key, _, value = line.strip().partition("=")
+                if key == "out_time_us" and duration > 0 and value.isdigit():
+                    progress = min(1.0, int(value) / 1e6 / duration)
+                    self.store.update(src, save=False, progress=round(progress, 3))
+                    self.store.save(force=False)
+            proc.wait()
+        finally:
+            self._procs.pop(src, None)
+        reader.join(timeout=1)
+        if proc.returncode != 0:
+            tail = [ln.strip() for ln in stderr_lines if ln.strip()]
+            return False, tail[-1] if tail else f"ffmpeg exited with code {proc.returncode}"
+        return True, None
+
+
+def main():
+    cfg = load_config()
+    if not cfg["ingest"].get("enabled", True):
+        _log("ingest disabled in config; exiting")
+        return
+    worker = IngestWorker(cfg)
+    done = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: done.set())
+    signal.signal(signal.SIGINT, lambda *_: done.set())
+    worker.start()
+    done.wait()
+    _log("ingest stopping")
+    worker.stop()
+
+
+if __name__ == "__main__":
+    main()
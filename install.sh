@@ -4,6 +4,7 @@ set -euo pipefail
 PROJECT_NAME="crt-kitchen-tv"
 INSTALL_DIR="/opt/${PROJECT_NAME}"
 CONFIG_DIR="/etc/${PROJECT_NAME}"
+DATA_DIR="/var/lib/${PROJECT_NAME}"
 DEFAULT_CONFIG="${CONFIG_DIR}/config.yaml"
 SERVICE_DIR="/etc/systemd/system"
 REPO_ROOT="$(cd "$(dirname "$0")" && pwd)"
@@ -75,6 +76,9 @@ create_venv() {
   # Upgrade pip and install requirements
   sudo -u crt -H "${INSTALL_DIR}/venv/bin/pip" install --upgrade pip
   sudo -u crt -H "${INSTALL_DIR}/venv/bin/pip" install -r "${INSTALL_DIR}/requirements.txt"
+
+  # Bytecode up front, so a freshly started (e.g. socket-activated) service does not compile on its first request.
+  sudo -u crt -H "${INSTALL_DIR}/venv/bin/python" -m compileall -q -x '/venv/' "${INSTALL_DIR}" || true
 }
 
 install_xinitrc() {
@@ -106,6 +110,15 @@ install_config() {
   if [ ! -f "${DEFAULT_CONFIG}" ]; then
     cp "${INSTALL_DIR}/config/default_config.yaml" "${DEFAULT_CONFIG}"
   fi
+  # Saves replace config.yaml via a temp file and rename, so the directory itself must be writable.
+  chown -R crt:crt "${CONFIG_DIR}" || true
+}
+
+ensure_data_dir() {
+  # Media collections, library index, ingest and download state live here.
+  echo "[install] Ensuring data directory ${DATA_DIR}"
+  mkdir -p "${DATA_DIR}/media/Inbox" "${DATA_DIR}/media/News" "${DATA_DIR}/media/Movies"
+  chown -R crt:crt "${DATA_DIR}" || true
 }
 
 enable_interfaces() {
@@ -161,22 +174,46 @@ install_services() {
   echo "[install] Installing systemd units"
 
   cp "${INSTALL_DIR}/services/crt-web.service" "${SERVICE_DIR}/"
+  cp "${INSTALL_DIR}/services/crt-web.socket" "${SERVICE_DIR}/"
+  cp "${INSTALL_DIR}/services/crt-web-ondemand.service" "${SERVICE_DIR}/"
   cp "${INSTALL_DIR}/services/crt-ui.service" "${SERVICE_DIR}/"
+  cp "${INSTALL_DIR}/services/crt-ingest.service" "${SERVICE_DIR}/"
+  cp "${INSTALL_DIR}/services/crt-downloads.service" "${SERVICE_DIR}/"
+  cp "${INSTALL_DIR}/services/crt-sync.service" "${SERVICE_DIR}/"
 
   systemctl daemon-reload
 
-  # Enable both services
-  systemctl enable crt-web.service
+  # Enable all services. WEB_ON_DEMAND=1 starts the web UI per request (crt-web.socket) instead of keeping it resident.
+  if [ "${WEB_ON_DEMAND:-0}" = "1" ]; then
+    WEB_UNIT=crt-web.socket
+    systemctl disable --now crt-web.service || true
+  else
+    WEB_UNIT=crt-web.service
+    systemctl disable --now crt-web.socket || true
+  fi
+  systemctl enable "${WEB_UNIT}"
   systemctl enable crt-ui.service
+  systemctl enable crt-ingest.service
+  systemctl enable crt-downloads.service
+  systemctl enable crt-sync.service
 
   # Start/restart services immediately; UI launches via startx on tty1.
-  echo "[install] Restarting crt-web.service now (web UI should be reachable on :8080)"
-  systemctl restart crt-web.service || true
-  systemctl status crt-web.service --no-pager || true
+  echo "[install] Restarting ${WEB_UNIT} now (web UI should be reachable on :8080)"
+  systemctl restart "${WEB_UNIT}" || true
+  systemctl status "${WEB_UNIT}" --no-pager || true
 
   echo "[install] Restarting crt-ui.service now (CRT UI on tty1)"
   systemctl restart crt-ui.service || true
   systemctl status crt-ui.service --no-pager || true
+
+  echo "[install] Restarting crt-ingest.service now (background transcodes)"
+  systemctl restart crt-ingest.service || true
+
+  echo "[install] Restarting crt-downloads.service now (scheduled episode downloads)"
+  systemctl restart crt-downloads.service || true
+
+  echo "[install] Restarting crt-sync.service now (media sync; exits unless sync.enabled)"
+  systemctl restart crt-sync.service || true
 }
 
 maybe_install_respeaker() {
@@ -195,6 +232,7 @@ main() {
   sync_project_files
   create_venv
   install_config
+  ensure_data_dir
   enable_interfaces
   install_xinitrc
   install_services
@@ -0,0 +1,226 @@
+import itertools
+import json
+import os
+import queue
+import socket
+import subprocess
+import threading
+import time
+
+DEFAULT_SOCKET = "/tmp/crt-kitchen-tv-mpv.sock"
+START_TIMEOUT = 10.0
+LOAD_TIMEOUT = 30.0
+
+
+class EngineError(Exception):
+    pass
+
+
+class MpvEngine:
+    """One idle mpv process driven over its JSON IPC socket.
+
+    The process is started once per backend (--idle --input-ipc-server) and
+    reused for every play, so later launches skip mpv's startup, config
+    parsing and audio init. Events are read on a background thread and queued
+    for play() and watchers. mpv's own output is passed line by line to
+    output_log (e.g. a ringlog.Logger), so it stays bounded however long the
+    process lives.
+    """
+
+    def __init__(self, mpv_bin, backend_name, args, env=None, socket_path=DEFAULT_SOCKET, output_log=None):
+        self.mpv_bin = mpv_bin
+        self.backend_name = backend_name
+        self.args = list(args)
+        self.env = env
+        self.socket_path = socket_path
+        self.output_log = output_log
+        self.proc = None
+        self.events = queue.Queue()
+        self._sock = None
+        self._send_lock = threading.Lock()
+        self._replies = {}
+        self._reply_cond = threading.Condition()
+        self._ids = itertools.count(1)
+        self._reader = None
+
+    def alive(self):
+        return self.proc is not None and self.proc.poll() is None and self._sock is not None
+
+    def start(self, timeout=START_TIMEOUT):
+        try:
+            os.unlink(self.socket_path)
+        except FileNotFoundError:
+            pass
+        cmd = [self.mpv_bin, "--idle=yes", "--force-window=no", f"--input-ipc-server={self.socket_path}"] + self.args
+        out = subprocess.PIPE if self.output_log is not None else subprocess.DEVNULL
+        self.proc = subprocess.Popen(cmd, stdin=subprocess.DEVNULL, stdout=out, stderr=subprocess.STDOUT, env=self.env)
+        if self.output_log is not None:
+            threading.Thread(
+                target=self._pump_output, args=(self.proc.stdout,), name=f"mpv-output-{self.backend_name}", daemon=True
+            ).start()
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self.proc.poll() is not None:
+                raise EngineError(f"mpv exited with code {self.proc.returncode} before opening IPC")
+            try:
+                sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+                sock.connect(self.socket_path)
+                self._sock = sock
+                break
+            except OSError:
+                sock.close()
+                time.sleep(0.05)
+        if self._sock is None:
+            self.close()
+            raise EngineError("mpv IPC socket did not come up")
+        self._reader = threading.Thread(target=self._read_loop, name=f"mpv-ipc-{self.backend_name}", daemon=True)
+        self._reader.start()
+
+    def _pump_output(self, pipe):
+        with pipe:
+            for raw in pipe:
+                line = raw.decode("utf-8", "replace").rstrip()
+                if line:
+                    try:
+                        self.output_log(line)
+                    except Exception:
+                        pass
+
+    def _read_loop(self):
+        buf = b""
+        sock = self._sock
+        while True:
+            try:
+                chunk = sock.recv(65536)
+            except OSError:
+                chunk = b""
+            if not chunk:
+                break
+            buf += chunk
+            while b"\n" in buf:
+                line, buf = buf.split(b"\n", 1)
+                try:
+                    msg = json.loads(line)
+                except ValueError:
+                    continue
+                if "request_id" in msg and "event" not in msg:
+                    with self._reply_cond:
+                        self._replies[msg["request_id"]] = msg
+                        self._reply_cond.notify_all()
+                elif "event" in msg:
+                    self.events.put(msg)
+        self.events.put({"event": "engine-exit"})
+        with self._reply_cond:
+            self._reply_cond.notify_all()
+
+    def command(self, *args, wait=True, timeout=5.0):
+        if self._sock is None:
+            raise EngineError("mpv IPC is not connected")
+        request_id = next(self._ids)
+        payload = json.dumps({"command": list(args), "request_id": request_id}).encode() + b"\n"
+        with self._send_lock:
+            try:
+                self._sock.sendall(payload)
+            except OSError as exc:
+                raise EngineError(f"mpv IPC write failed: {exc}") from exc
+        if not wait:
+            return None
+        deadline = time.monotonic() + timeout
+        with self._reply_cond:
+            while request_id not in self._replies:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or not self.alive():
+                    raise EngineError(f"no reply to {args[0]}")
+                self._reply_cond.wait(remaining)
+            reply = self._replies.pop(request_id)
+        if reply.get("error") not in (None, "success"):
+            raise EngineError(f"{args[0]}: {reply.get('error')}")
+        return reply.get("data")
+
+    def get_property(self, name, default=None):
+        try:
+            return self.command("get_property", name)
+        except EngineError:
+            return default
+
+    def drain_events(self):
+        while True:
+            try:
+                self.events.get_nowait()
+            except queue.Empty:
+                return
+
+    def loadfile(self, source):
+        self.command("loadfile", source, "replace")
+
+    def stop(self):
+        if self.alive():
+            try:
+                self.command("stop", wait=False)
+            except EngineError:
+                pass
+
+    def close(self):
+        if self.alive():
+            try:
+                self.command("quit", wait=False)
+            except EngineError:
+                pass
+        if self.proc is not None:
+            try:
+                self.proc.wait(timeout=3)
+            except subprocess.TimeoutExpired:
+                self.proc.kill()
+        if self._sock is not None:
+            try:
+                self._sock.close()
+            except OSError:
+                pass
+        self._sock = None
+        try:
+            os.unlink(self.socket_path)
+        except OSError:
+            pass
+
+    def play(self, source, on_event=None):
+        """Load source and block until it ends.
+
+        Returns (ok, err, first_frame_seconds). A play counts as successful when
+        playback actually started and ended with eof/stop; a missing video
+        output on a file with video is reported as a failure so the caller can
+        try the next backend.
+        """
+        self.drain_events()
+        started = time.monotonic()
+        self.loadfile(source)
+        first_frame = None
+        loaded = False
+        while True:
+            timeout = LOAD_TIMEOUT if not loaded else None
+            try:
+                msg = self.events.get(timeout=timeout)
+            except queue.Empty:
+                self.stop()
+                return False, "mpv did not start playback in time", None
+            name = msg.get("event")
+            if on_event is not None:
+                on_event(msg)
+            if name == "file-loaded":
+                loaded = True
+            elif name == "playback-restart" and first_frame is None:
+                first_frame = time.monotonic() - started
+                loaded = True
+                has_video = self.get_property("current-tracks/video") is not None
+                if has_video and self.get_property("vo-configured") is False:
+                    self.stop()
+                    return False, f"{self.backend_name} video output failed to initialise", first_frame
+            elif name == "end-file":
+                reason = msg.get("reason")
+                if reason == "error":
+                    return False, msg.get("file_error") or "playback error", first_frame
+                if reason in ("eof", "stop", "quit") and loaded:
+                    return True, None, first_frame
+                if reason in ("eof", "stop", "quit"):
+                    return False, f"playback ended before start ({reason})", first_frame
+            elif name == "engine-exit":
+                return False, "mpv exited unexpectedly", first_frame
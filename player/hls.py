@@ -0,0 +1,140 @@
+import re
+import threading
+import time
+import urllib.request
+from urllib.parse import urljoin
+
+from ui.hw.device import capability_profile
+
+FETCH_TIMEOUT = 5
+DEFAULT_TTL = 300
+MAX_PLAYLIST_BYTES = 512 * 1024
+# CODECS lists audio too (mp4a, ac-3, ec-3, opus, ...); only these are checked against the budget.
+VIDEO_CODECS = ("avc1", "avc3", "hvc1", "hev1", "vp09", "vp8", "av01", "dvh1", "dvhe", "mp4v")
+ATTR_RE = re.compile(r'([A-Z0-9-]+)=("[^"]*"|[^,]*)')
+
+
+def parse_attributes(text):
+    return {key: value.strip('"') for key, value in ATTR_RE.findall(text)}
+
+
+def parse_master(text, base_url):
+    """Return the variants of a master playlist, or [] for a media playlist."""
+    variants = []
+    pending = None
+    for raw in text.splitlines():
+        line = raw.strip()
+        if not line:
+            continue
+        if line.startswith("#EXT-X-STREAM-INF:"):
+            attrs = parse_attributes(line.split(":", 1)[1])
+            width, height = 0, 0
+            if "x" in attrs.get("RESOLUTION", ""):
+                w, _, h = attrs["RESOLUTION"].partition("x")
+                width, height = int(w or 0), int(h or 0)
+            try:
+                fps = float(attrs.get("FRAME-RATE", 0) or 0)
+            except ValueError:
+                fps = 0.0
+            pending = {
+                "bandwidth": int(attrs.get("BANDWIDTH", 0) or 0),
+                "width": width,
+                "height": height,
+                "fps": fps,
+                "codecs": [c.strip() for c in attrs.get("CODECS", "").split(",") if c.strip()],
+            }
+        elif line.startswith("#"):
+            continue
+        elif pending is not None:
+            pending["url"] = urljoin(base_url, line)
+            variants.append(pending)
+            pending = None
+    return variants
+
+
+def fits(variant, budget):
+    if budget.get("max_bandwidth") and variant["bandwidth"] > budget["max_bandwidth"]:
+        return False
+    if budget.get("max_height") and variant["height"] > budget["max_height"]:
+        return False
+    if budget.get("max_fps") and variant["fps"] > budget["max_fps"]:
+        return False
+    allowed = budget.get("codecs")
+    if allowed and variant["codecs"]:
+        video = [c.split(".")[0] for c in variant["codecs"] if c.split(".")[0] in VIDEO_CODECS]
+        if any(not c.startswith(tuple(allowed)) for c in video):
+            return False
+    return True
+
+
+def choose_variant(variants, budget):
+    """Best variant within budget; the cheapest one if nothing fits."""
+    if not variants:
+        return None
+    fitting = [v for v in variants if fits(v, budget)]
+    if fitting:
+        return max(fitting, key=lambda v: (v["bandwidth"], v["height"]))
+    return min(variants, key=lambda v: (v["bandwidth"] or float("inf"), v["height"]))
+
+
+class PlaylistCache:
+    """Parsed master playlists kept for ttl seconds, keyed by URL."""
+
+    def __init__(self, ttl=DEFAULT_TTL):
+        self.ttl = ttl
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get(self, url):
+        with self._lock:
+            entry = self._entries.get(url)
+            if entry is None or entry[0] < time.monotonic():
+                return None
+            return entry[1]
+
+    def put(self, url, variants, ttl=None):
+        with self._lock:
+            self._entries[url] = (time.monotonic() + (self.ttl if ttl is None else ttl), variants)
+
+
+_cache = PlaylistCache()
+
+
+def fetch_variants(url, timeout=FETCH_TIMEOUT, ttl=None, cache=None):
+    cache = _cache if cache is None else cache
+    cached = cache.get(url)
+    if cached is not None:
+        return cached, True
+    req = urllib.request.Request(url, headers={"User-Agent": "crt-kitchen-tv"})
+    with urllib.request.urlopen(req, timeout=timeout) as resp:
+        final_url = resp.geturl()
+        text = resp.read(MAX_PLAYLIST_BYTES).decode("utf-8", errors="replace")
+    if not text.lstrip().startswith("#EXTM3U"):
+        variants = []
+    else:
+        variants = parse_master(text, final_url)
+    cache.put(url, variants, ttl)
+    return variants, False
+
+
+def resolve_stream(url, config=None, log=None):
+    """Return the URL mpv should open: a budget-fitting variant for HLS masters, else url."""
+    config = config or {}
+    if not str(url).startswith(("http://", "https://")) or ".m3u8" not in str(url).lower():
+        return url
+    budget = capability_profile(config)
+    try:
+        variants, cached = fetch_variants(url, ttl=config.get("hls_cache_ttl", DEFAULT_TTL))
+    except Exception as exc:
+        if log:
+            log(f"hls master fetch failed ({exc}); letting mpv choose")
+        return url
+    variant = choose_variant(variants, budget)
+    if variant is None:
+        return url
+    if log:
+        log(
+            f"hls variant {variant['width']}x{variant['height']} {variant['bandwidth'] // 1000}k "
+            f"profile={budget['name']} cached={cached} of {len(variants)}"
+        )
+    return variant["url"]
@@ -1,33 +1,39 @@
 import os
 import subprocess
+import threading
 import time
+from ui import metrics, ringlog
 from ui.hw import audio
+from player.engine import EngineError, MpvEngine
+from player.probe import DEFAULT_CACHE_PATH, BackendCache, probe_backend
 
 
 MPV_BIN = "mpv"
 MPV_DEBUG_LOG = "/tmp/crt-kitchen-tv-mpv.log"
+BASE_ARGS = ["--quiet", "--fs", "--no-terminal", "--ontop"]
 
+_engine = None
+_engine_lock = threading.Lock()
+_backends = None
+_backends_lock = threading.Lock()
+_current_proc = None
+_stop_requested = threading.Event()
 
-def _log(message):
-    stamp = time.strftime("%Y-%m-%d %H:%M:%S")
-    try:
-        with open(MPV_DEBUG_LOG, "a", encoding="utf-8") as f:
-            f.write(f"[{stamp}] {message}\n")
-    except Exception:
-        pass
 
+_ring_log = ringlog.Logger("mpv", fallback_path=MPV_DEBUG_LOG)
+# mpv's own stdout/stderr from the long-lived IPC engine.
+_mpv_output = ringlog.Logger("mpv-output", fallback_path=MPV_DEBUG_LOG)
 
-def play_media(source, config):
-    audio_output = config.get("audio_output", "respeaker") if config else "respeaker"
-    backend_pref = (config.get("mpv_backend", "drm") if config else "drm").lower()
-    audio_args = audio.build_mpv_args(audio_output)
-    base = [MPV_BIN, "--quiet", "--fs", "--no-terminal", "--ontop"]
 
-    has_display = bool(os.environ.get("DISPLAY"))
+def _log(message, level="info"):
+    _ring_log(message, level=level)
+
+
+def build_plans(backend_pref, has_display):
+    """Return the ordered (name, args, force_console_env) backend attempts, or None if impossible."""
     plans = []
     if backend_pref == "x11" and not has_display:
-        _log("x11 requested but DISPLAY is not set")
-        return False, "x11 backend selected but no X11 session (DISPLAY missing)", None
+        return None
 
     if backend_pref == "x11":
         if has_display:
@@ -51,29 +57,241 @@ def play_media(source, config):
         plans.append(("auto", [], True))
         if has_display:
             plans.append(("x11", ["--vo=gpu", "--gpu-context=x11"], False))
+    return plans
+
+
+def _plan_env(force_console_env):
+    env = os.environ.copy()
+    if force_console_env:
+        env.pop("DISPLAY", None)
+        env.pop("WAYLAND_DISPLAY", None)
+    return env
+
+
+def _backend_cache(config):
+    global _backends
+    with _backends_lock:
+        if _backends is None:
+            _backends = BackendCache((config or {}).get("backend_cache", DEFAULT_CACHE_PATH))
+        return _backends
+
+
+def ensure_backend_ranking(config, force=False):
+    """Probe every candidate backend once per environment and persist the ranking."""
+    cache = _backend_cache(config)
+    cache.refresh_key(MPV_BIN)
+    if cache.valid() and not force:
+        return cache
+    # Probe the widest plan list so a later mpv_backend change can reuse the result.
+    plans = build_plans("auto", bool(os.environ.get("DISPLAY")))
+    results = []
+    for backend_name, backend_args, force_console_env in plans:
+        ok, err, seconds = probe_backend(MPV_BIN, backend_args, _plan_env(force_console_env))
+        _log(f"probe backend={backend_name} ok={ok} in {seconds:.1f}s" + (f" err={err}" if err else ""))
+        results.append((backend_name, ok, err, seconds))
+    cache.store_probe(results)
+    _log(f"backend ranking: {', '.join(cache.data.get('ranking', []))}")
+    return cache
+
+
+def _record_outcome(config, winner, failed):
+    # Only blame backends when another one played the same source; if all fail it is the file.
+    cache = _backend_cache(config)
+    for backend_name in failed:
+        cache.record_failure(backend_name)
+    cache.record_success(winner)
+
+
+def _engine_for(backend_name, backend_args, force_console_env, audio_args):
+    """Return a running idle mpv for this backend, replacing one started for another backend."""
+    global _engine
+    args = BASE_ARGS + backend_args + audio_args
+    with _engine_lock:
+        if _engine is not None and _engine.alive() and _engine.backend_name == backend_name and _engine.args == args:
+            return _engine
+        if _engine is not None:
+            _engine.close()
+            _engine = None
+        engine = MpvEngine(MPV_BIN, backend_name, args, env=_plan_env(force_console_env), output_log=_mpv_output)
+        start_ts = time.time()
+        engine.start()
+        _log(f"ipc engine started backend={backend_name} in {time.time() - start_ts:.1f}s")
+        _engine = engine
+        return engine
+
+
+def _notify(on_status, state, backend_name):
+    if on_status is not None:
+        try:
+            on_status(state, backend_name)
+        except Exception:
+            pass
+
+
+def stop_media():
+    """Ask the current play_media call (from another thread) to stop playback."""
+    _stop_requested.set()
+    proc = _current_proc
+    if proc is not None and proc.poll() is None:
+        proc.terminate()
+    engine = _engine
+    if engine is not None:
+        engine.stop()
+
+
+def shutdown():
+    """Quit the idle mpv (called when the UI exits)."""
+    global _engine
+    with _engine_lock:
+        if _engine is not None:
+            _engine.close()
+            _engine = None
+
+
+def warm_up(config):
+    """Rank backends if needed, then start the idle mpv for the winner ahead of the first play."""
+    cache = ensure_backend_ranking(config)
+    if not (config or {}).get("mpv_ipc", True):
+        return
+    backend_pref = (config.get("mpv_backend", "drm") if config else "drm").lower()
+    plans = cache.order(build_plans(backend_pref, bool(os.environ.get("DISPLAY"))) or [])
+    if not plans:
+        return
+    audio_args = audio.build_mpv_args(config.get("audio_output", "respeaker") if config else "respeaker")
+    backend_name, backend_args, force_console_env = plans[0]
+    try:
+        _engine_for(backend_name, backend_args, force_console_env, audio_args)
+    except (EngineError, OSError) as exc:
+        _log(f"ipc warm-up failed backend={backend_name}: {exc}", level="warning")
+
+
+def _play_ipc(source, plans, audio_args, config, on_status=None, tally=None):
+    """Play through the long-lived mpv. Returns None when IPC is unusable so the caller falls back."""
+    errors = []
+    failed = []
+    tally = tally if tally is not None else {}
+    for backend_name, backend_args, force_console_env in plans:
+        if _stop_requested.is_set():
+            return True, None, "stopped"
+        _notify(on_status, "loading", backend_name)
+        tally["attempts"] = tally.get("attempts", 0) + 1
+        attempt_ts = time.monotonic()
+        try:
+            engine = _engine_for(backend_name, backend_args, force_console_env, audio_args)
+        except FileNotFoundError:
+            _log("mpv executable not found", level="error")
+            return False, "mpv is not installed or not in PATH", None
+        except (EngineError, OSError) as exc:
+            _log(f"ipc engine unavailable backend={backend_name}: {exc}", level="warning")
+            metrics.inc("crt_play_failures_total", backend=backend_name, mode="ipc")
+            return None
+        spawn_seconds = time.monotonic() - attempt_ts
+        _log(f"ipc attempt backend={backend_name} source={source}")
+        start_ts = time.time()
+
+        def on_event(msg, engine=engine, backend_name=backend_name):
+            if _stop_requested.is_set():
+                engine.stop()
+            elif msg.get("event") == "playback-restart":
+                _notify(on_status, "playing", backend_name)
+
+        try:
+            ok, err, first_frame = engine.play(source, on_event=on_event)
+        except EngineError as exc:
+            ok, err, first_frame = False, str(exc), None
+        elapsed = time.time() - start_ts
+        if first_frame is not None:
+            metrics.observe("crt_play_launch_seconds", spawn_seconds + first_frame, backend=backend_name)
+        if _stop_requested.is_set():
+            _log(f"stopped backend={backend_name} elapsed={elapsed:.1f}s")
+            return True, None, f"{backend_name} (stopped {elapsed:.1f}s)"
+        if ok:
+            ff = f"{first_frame:.2f}s" if first_frame is not None else "n/a"
+            _log(f"success backend={backend_name} elapsed={elapsed:.1f}s first_frame={ff}")
+            _record_outcome(config, backend_name, failed)
+            return True, None, f"{backend_name} ({elapsed:.1f}s)"
+        failed.append(backend_name)
+        errors.append(f"{backend_name}: {err}")
+        metrics.inc("crt_play_failures_total", backend=backend_name, mode="ipc")
+        _log(f"failed backend={backend_name} err={err}", level="warning")
+        if not engine.alive():
+            shutdown()
+    return False, errors[-1] if errors else "Unable to start mpv", None
+
+
+def play_media(source, config, on_status=None, stop_event=None):
+    """Play source, blocking until it ends. Returns (ok, err, detail).
+
+    on_status(state, backend) is called with "loading" per backend attempt and
+    "playing" once the first frame is up; stop_media() ends playback early.
+    With stop_event the caller owns the stop request: one set before this
+    call is honoured instead of being cleared.
+    """
+    tally = {"attempts": 0, "mode": "ipc" if (config or {}).get("mpv_ipc", True) else "oneshot"}
+    result = _play_media(source, config, on_status, tally, stop_event)
+    ok, _, detail = result
+    outcome = "failed" if not ok else "stopped" if detail and "stopped" in detail else "ok"
+    metrics.inc("crt_plays_total", result=outcome, mode=tally["mode"])
+    if tally["attempts"]:
+        metrics.observe("crt_play_attempts", tally["attempts"], mode=tally["mode"])
+    return result
+
+
+def _play_media(source, config, on_status, tally, stop_event=None):
+    global _current_proc, _stop_requested
+    # A fresh event per play rather than clear(): clearing could drop a stop meant for this play.
+    _stop_requested = stop_event if stop_event is not None else threading.Event()
+    audio_output = config.get("audio_output", "respeaker") if config else "respeaker"
+    backend_pref = (config.get("mpv_backend", "drm") if config else "drm").lower()
+    audio_args = audio.build_mpv_args(audio_output)
+    base = [MPV_BIN] + BASE_ARGS
+
+    has_display = bool(os.environ.get("DISPLAY"))
+    plans = build_plans(backend_pref, has_display)
+    if plans is None:
+        _log("x11 requested but DISPLAY is not set", level="error")
+        return False, "x11 backend selected but no X11 session (DISPLAY missing)", None
+    # Cached winner first; an unprobed environment keeps the preference order.
+    plans = _backend_cache(config).order(plans)
+
+    if (config or {}).get("mpv_ipc", True):
+        result = _play_ipc(source, plans, audio_args, config, on_status, tally)
+        if result is not None:
+            return result
+        _log("falling back to one mpv process per play")
+        tally["mode"] = "oneshot"
 
     errors = []
+    failed = []
     for backend_name, backend_args, force_console_env in plans:
+        if _stop_requested.is_set():
+            return True, None, "stopped"
         args = base + backend_args + audio_args + [source]
+        tally["attempts"] += 1
         start_ts = time.time()
-        env = os.environ.copy()
-        if force_console_env:
-            env.pop("DISPLAY", None)
-            env.pop("WAYLAND_DISPLAY", None)
+        env = _plan_env(force_console_env)
         try:
             _log(f"attempt backend={backend_name} source={source} args={' '.join(args)}")
-            result = subprocess.run(
+            proc = subprocess.Popen(
                 args,
-                check=False,
                 stdout=subprocess.PIPE,
                 stderr=subprocess.PIPE,
                 text=True,
                 env=env,
             )
         except FileNotFoundError:
-            _log("mpv executable not found")
+            _log("mpv executable not found", level="error")
             return False, "mpv is not installed or not in PATH", None
+        _current_proc = proc
+        # Without IPC there is no first-frame signal; the process being up is the best we know.
+        _notify(on_status, "playing", backend_name)
+        stdout_data, stderr_data = proc.communicate()
+        _current_proc = None
+        result = subprocess.CompletedProcess(args, proc.returncode, stdout_data, stderr_data)
         elapsed = time.time() - start_ts
+        if _stop_requested.is_set():
+            _log(f"stopped backend={backend_name} elapsed={elapsed:.1f}s")
+            return True, None, f"{backend_name} (stopped {elapsed:.1f}s)"
         stderr_text = (result.stderr or "").strip()
         stdout_text = (result.stdout or "").strip()
         if stderr_text:
@@ -82,11 +300,14 @@ def play_media(source, config):
             _log(f"{backend_name} stdout: {stdout_text.splitlines()[-1]}")
         if result.returncode == 0 and elapsed >= 1.0:
             _log(f"success backend={backend_name} elapsed={elapsed:.1f}s")
+            _record_outcome(config, backend_name, failed)
             return True, None, f"{backend_name} ({elapsed:.1f}s)"
         err_line = (result.stderr or "").strip().splitlines()
         err_text = err_line[-1] if err_line else f"mpv exited with code {result.returncode}"
         if result.returncode == 0 and elapsed < 1.0:
             err_text = f"mpv exited too quickly ({elapsed:.1f}s)"
+        failed.append(backend_name)
         errors.append(f"{backend_name}: {err_text}")
-        _log(f"failed backend={backend_name} err={err_text}")
+        metrics.inc("crt_play_failures_total", backend=backend_name, mode="oneshot")
+        _log(f"failed backend={backend_name} err={err_text}", level="warning")
     return False, errors[-1] if errors else "Unable to start mpv", None
@@ -0,0 +1,152 @@
+import json
+import os
+import shutil
+import subprocess
+import threading
+import time
+from pathlib import Path
+
+DEFAULT_CACHE_PATH = "/var/lib/crt-kitchen-tv/backend-cache.json"
+# Generated by mpv's libavfilter input, so no clip has to ship with the repo.
+TEST_SOURCE = "av://lavfi:testsrc=size=160x120:rate=25:duration=1"
+PROBE_TIMEOUT = 15
+
+
+def mpv_version(mpv_bin, known=None):
+    """Return mpv's version line; known=(stat_key, line) skips the fork when the binary is unchanged."""
+    path = shutil.which(mpv_bin)
+    if path is None:
+        return None, None
+    st = os.stat(path)
+    stat_key = [path, st.st_size, int(st.st_mtime)]
+    if known and known[0] == stat_key:
+        return stat_key, known[1]
+    try:
+        out = subprocess.run([path, "--version"], check=False, capture_output=True, text=True, timeout=10).stdout
+    except (OSError, subprocess.TimeoutExpired):
+        return stat_key, None
+    lines = (out or "").strip().splitlines()
+    return stat_key, lines[0] if lines else None
+
+
+def environment_key(version_line):
+    return "|".join(
+        [
+            os.uname().release,
+            os.environ.get("DISPLAY", ""),
+            os.environ.get("WAYLAND_DISPLAY", ""),
+            version_line or "unknown-mpv",
+        ]
+    )
+
+
+def probe_backend(mpv_bin, backend_args, env, timeout=PROBE_TIMEOUT):
+    """Play the test source once on one backend. Returns (ok, err, seconds)."""
+    args = [mpv_bin, "--no-config", "--really-quiet", "--no-terminal", "--no-audio", "--frames=10"]
+    args += backend_args + [TEST_SOURCE]
+    start = time.time()
+    try:
+        result = subprocess.run(args, check=False, capture_output=True, text=True, env=env, timeout=timeout)
+    except FileNotFoundError:
+        return False, "mpv is not installed or not in PATH", 0.0
+    except subprocess.TimeoutExpired:
+        return False, f"probe timed out after {timeout}s", float(timeout)
+    elapsed = time.time() - start
+    if result.returncode != 0:
+        err = (result.stderr or "").strip().splitlines()
+        return False, err[-1] if err else f"mpv exited with code {result.returncode}", elapsed
+    return True, None, elapsed
+
+
+class BackendCache:
+    """Persisted ranking of mpv video backends for this box.
+
+    The ranking is only trusted while the environment key (kernel, display
+    variables, mpv version) matches; backends that fail at runtime are moved
+    to the back, ones that succeed to the front.
+    """
+
+    def __init__(self, path=DEFAULT_CACHE_PATH):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self.data = {}
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                self.data = json.load(f)
+        except (FileNotFoundError, ValueError):
+            self.data = {}
+        self.key = None
+
+    def _save(self):
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.path.with_name(self.path.name + ".tmp")
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(self.data, f, indent=1, sort_keys=True)
+            os.replace(tmp, self.path)
+        except OSError:
+            pass
+
+    def refresh_key(self, mpv_bin):
+        known = (self.data.get("mpv_stat"), self.data.get("mpv_version"))
+        stat_key, version_line = mpv_version(mpv_bin, known)
+        self.key = environment_key(version_line)
+        with self._lock:
+            self.data["mpv_stat"] = stat_key
+            self.data["mpv_version"] = version_line
+        return self.key
+
+    def valid(self):
+        return self.key is not None and self.data.get("key") == self.key and bool(self.data.get("ranking"))
+
+    def store_probe(self, results):
+        """results: list of (backend_name, ok, err, seconds) in plan order."""
+        working = [r for r in results if r[1]]
+        broken = [r for r in results if not r[1]]
+        with self._lock:
+            self.data["key"] = self.key
+            self.data["probed_at"] = time.time()
+            self.data["ranking"] = [r[0] for r in working] + [r[0] for r in broken]
+            self.data["failed"] = sorted(r[0] for r in broken)
+            self.data["probe"] = {r[0]: {"ok": r[1], "err": r[2], "seconds": round(r[3], 2)} for r in results}
+            self._save()
+
+    def order(self, plans):
+        if not self.valid():
+            return plans
+        ranking = self.data.get("ranking", [])
+        failed = set(self.data.get("failed", []))
+
+        def rank(plan):
+            name = plan[0]
+            return (name in failed, ranking.index(name) if name in ranking else len(ranking))
+
+        return sorted(plans, key=rank)
+
+    def record_success(self, backend_name):
+        with self._lock:
+            if self.key:
+                self.data["key"] = self.key
+            ranking = self.data.setdefault("ranking", [])
+            failed = self.data.setdefault("failed", [])
+            if ranking[:1] == [backend_name] and backend_name not in failed:
+                return
+            if backend_name in ranking:
+                ranking.remove(backend_name)
+            ranking.insert(0, backend_name)
+            if backend_name in failed:
+                failed.remove(backend_name)
+            self._save()
+
+    def record_failure(self, backend_name):
+        with self._lock:
+            if self.key:
+                self.data["key"] = self.key
+            ranking = self.data.setdefault("ranking", [])
+            failed = self.data.setdefault("failed", [])
+            if backend_name in ranking:
+                ranking.remove(backend_name)
+            ranking.append(backend_name)
+            if backend_name not in failed:
+                failed.append(backend_name)
+            self._save()
@@ -0,0 +1,127 @@
+import threading
+import time
+
+from player import play
+
+IDLE = "idle"
+LOADING = "loading"
+PLAYING = "playing"
+STOPPING = "stopping"
+FINISHED = "finished"
+FAILED = "failed"
+
+
+class PlaybackStatus:
+    """What the UI needs to know about one play: state, backend, timing, outcome."""
+
+    def __init__(self, source, kind="file"):
+        self.source = source
+        self.kind = kind
+        self.state = LOADING
+        self.backend = None
+        self.error = None
+        self.detail = None
+        self.started = time.monotonic()
+        self.first_frame = None
+        self.ended = None
+        self.stopped = False
+        self.stop_requested = threading.Event()
+
+    @property
+    def elapsed(self):
+        end = self.ended if self.ended is not None else time.monotonic()
+        return end - self.started
+
+    @property
+    def completed(self):
+        """Played through to the end rather than stopped by the user."""
+        return self.state == FINISHED and not self.stopped
+
+    @property
+    def active(self):
+        return self.state in (LOADING, PLAYING, STOPPING)
+
+    def snapshot(self):
+        return {
+            "source": self.source,
+            "kind": self.kind,
+            "state": self.state,
+            "backend": self.backend,
+            "elapsed": round(self.elapsed, 1),
+            "first_frame": None if self.first_frame is None else round(self.first_frame, 2),
+            "error": self.error,
+        }
+
+
+class PlaybackSession:
+    """Runs play.play_media on a worker thread so the caller's loop keeps going.
+
+    on_done(status) is called from the worker thread when playback ends; the
+    UI uses it to post a pygame event instead of polling.
+    """
+
+    def __init__(self, config, on_done=None):
+        self.config = config
+        self.on_done = on_done
+        self.status = None
+        self._thread = None
+
+    @property
+    def busy(self):
+        return self.status is not None and self.status.active
+
+    def start(self, source, kind="file", resolve=None):
+        """Begin playing source; resolve(source) runs on the worker first (e.g. HLS variant pick)."""
+        if self.busy:
+            return None
+        status = PlaybackStatus(source, kind)
+        self.status = status
+        self._thread = threading.Thread(target=self._run, args=(status, resolve), name="playback", daemon=True)
+        self._thread.start()
+        return status
+
+    def stop(self):
+        status = self.status
+        if status is None or not status.active:
+            return
+        status.state = STOPPING
+        status.stopped = True
+        status.stop_requested.set()
+        play.stop_media()
+
+    def _on_status(self, status, state, backend):
+        status.backend = backend
+        if status.state == STOPPING:
+            return
+        if state == PLAYING and status.first_frame is None:
+            status.first_frame = time.monotonic() - status.started
+        status.state = state
+
+    def _run(self, status, resolve=None):
+        try:
+            target = resolve(status.source) if resolve is not None else status.source
+            if status.stop_requested.is_set():
+                ok, err, detail = True, None, "stopped"
+            else:
+                # play_media honours the event even if stop() lands after the check above.
+                ok, err, detail = play.play_media(
+                    target,
+                    self.config,
+                    on_status=lambda state, backend: self._on_status(status, state, backend),
+                    stop_event=status.stop_requested,
+                )
+        except Exception as exc:
+            ok, err, detail = False, f"playback crashed: {exc}", None
+        status.ended = time.monotonic()
+        status.detail = detail
+        if ok:
+            status.state = FINISHED
+        else:
+            status.state = FAILED
+            status.error = err or "Failed to start playback"
+        if self.on_done is not None:
+            self.on_done(status)
+
+    def join(self, timeout=None):
+        if self._thread is not None:
+            self._thread.join(timeout)
@@ -11,9 +11,27 @@ sudo systemctl daemon-reload
 echo "-- Restarting crt-ui"
 sudo systemctl restart crt-ui
 
-# Restart web config UI
-echo "-- Restarting crt-web"
-sudo systemctl restart crt-web
+# Restart web config UI (the on-demand socket if that is what is enabled)
+if systemctl is-enabled --quiet crt-web.socket 2>/dev/null; then
+  echo "-- Restarting crt-web.socket (on-demand)"
+  sudo systemctl stop crt-web-ondemand.service || true
+  sudo systemctl restart crt-web.socket
+else
+  echo "-- Restarting crt-web"
+  sudo systemctl restart crt-web
+fi
+
+# Restart ingest worker
+echo "-- Restarting crt-ingest"
+sudo systemctl restart crt-ingest
+
+# Restart episode downloader
+echo "-- Restarting crt-downloads"
+sudo systemctl restart crt-downloads
+
+# Restart media sync
+echo "-- Restarting crt-sync"
+sudo systemctl restart crt-sync
 
 echo "== Done =="
-echo "UI and web services restarted."
\ No newline at end of file
+echo "UI, web, ingest, download and sync services restarted."
\ No newline at end of file
@@ -1,35 +1,61 @@
+import json
 import os
-import subprocess
-import yaml
-from flask import Flask, request, jsonify, render_template, redirect
+import threading
+import time
+from flask import Flask, Response, g, request, jsonify, render_template, redirect, stream_with_context
+from server import logtail
+from ui import metrics, ringlog
+from ui.config_store import ConfigConflict, ConfigStore
+from ui.startup import DEFAULT_REPORT_PATH as STARTUP_REPORT_PATH
+
+# server.uploads and ui.storage are imported by the routes that use them: the
+# on-demand service (server/ondemand.py) pays for imports on its first request.
 
 CONFIG_PATH = os.environ.get("CRT_CONFIG", "/etc/crt-kitchen-tv/config.yaml")
 VALID_AUDIO = {"respeaker", "hdmi", "analog"}
 VALID_SORT = {"newest", "alpha"}
 VALID_MPV_BACKEND = {"drm", "x11", "sdl", "auto"}
 UI_DEBUG_LOG = "/tmp/crt-kitchen-tv-ui.log"
-MPV_DEBUG_LOG = "/tmp/crt-kitchen-tv-mpv.log"
 RESPEAKER_LOG = "/var/log/crt-kitchen-tv/respeaker-driver.log"
+LOG_SOURCES = {
+    "ui_debug": ("ring", "ui"),
+    "mpv_debug": ("ring", "mpv"),
+    "mpv_output": ("ring", "mpv-output"),
+    "respeaker_driver": ("file", RESPEAKER_LOG),
+    "crt_ui_service": ("journal", "crt-ui.service"),
+    "crt_web_service": ("journal", "crt-web.service"),
+}
+LOG_CACHE_TTL = 2.0
+STREAM_POLL_SECONDS = 1.0
+JOURNAL_POLL_SECONDS = 3.0
+STREAM_KEEPALIVE_SECONDS = 15.0
+# Streams end after this long and EventSource reconnects with Last-Event-ID,
+# so an abandoned tab does not hold a waitress thread forever.
+STREAM_MAX_SECONDS = 300.0
+# Open streams each hold a waitress thread; past this many new ones get a 503 so other requests still find a thread.
+MAX_STREAMS = 2
 
+_log_cache = logtail.TTLCache(LOG_CACHE_TTL)
+_stream_slots = threading.BoundedSemaphore(MAX_STREAMS)
+_log_ring = None
+_upload_stores = {}
 
-def load_config():
-    try:
-        with open(CONFIG_PATH, "r", encoding="utf-8") as f:
-            return yaml.safe_load(f) or {}
-    except FileNotFoundError:
-        return {}
 
+config_store = ConfigStore(CONFIG_PATH)
 
-def save_config(data):
-    with open(CONFIG_PATH, "w", encoding="utf-8") as f:
-        yaml.safe_dump(data, f)
+
+def load_config():
+    return config_store.load()[0]
 
 
 def validate(payload):
-    errors = []
     cfg = load_config()
     cfg.update(payload)
+    return validate_config(cfg)
 
+
+def validate_config(cfg):
+    errors = []
     if not isinstance(cfg.get("news_streams", []), list):
         errors.append("news_streams must be a list")
     if not cfg.get("movies_dir"):
@@ -59,6 +85,38 @@ def validate(payload):
     return errors
 
 
+def upload_store(cfg):
+    """One UploadStore per media_root, kept so running checksums survive between requests."""
+    from server.uploads import DEFAULT_RESERVE_MB, UploadStore
+
+    media_root = cfg.get("media_root", "/var/lib/crt-kitchen-tv/media")
+    reserve = cfg.get("upload_reserve_mb", DEFAULT_RESERVE_MB)
+    store = _upload_stores.get(media_root)
+    if store is None:
+        store = _upload_stores.setdefault(media_root, UploadStore(media_root, reserve))
+    store.reserve = int(reserve) * 1024 * 1024
+    return store
+
+
+def upload_response(meta, status=200):
+    resp = jsonify(meta)
+    resp.status_code = status
+    resp.headers["Upload-Offset"] = str(meta["offset"])
+    resp.headers["Upload-Length"] = str(meta["size"])
+    return resp
+
+
+def upload_error(exc):
+    body = {"errors": [str(exc)]}
+    if exc.offset is not None:
+        body["offset"] = exc.offset
+    resp = jsonify(body)
+    resp.status_code = exc.status
+    if exc.offset is not None:
+        resp.headers["Upload-Offset"] = str(exc.offset)
+    return resp
+
+
 def normalize_payload(payload):
     if not isinstance(payload, dict):
         return {}
@@ -89,42 +147,243 @@ def normalize_payload(payload):
 
 
 def read_tail(path, lines=120):
+    """Return (text, end offset); the offset is where a live stream picks up."""
     if not os.path.exists(path):
-        return f"{path}: not found"
+        return f"{path}: not found", None
     try:
-        with open(path, "r", encoding="utf-8", errors="replace") as f:
-            content = f.readlines()
-        return "".join(content[-lines:]).strip() or f"{path}: empty"
+        content, end = logtail.tail_file(path, lines)
+        return "\n".join(content).strip() or f"{path}: empty", end
     except Exception as exc:
-        return f"Failed reading {path}: {exc}"
+        return f"Failed reading {path}: {exc}", None
+
+
+def log_ring():
+    """Read-only view of the UI's log ring, reopened until the UI has created it."""
+    global _log_ring
+    if _log_ring is None or not _log_ring.available:
+        _log_ring = ringlog.RingLog(ringlog.DEFAULT_RING_PATH, readonly=True)
+    return _log_ring
+
+
+def ring_records(component, lines=None, level=None, since=None):
+    """Return (records, head) for one component, newest lines records at or above level."""
+    at_level = ringlog.level_at_least(level) if level else None
+
+    def match(record):
+        return record.get("component") == component and (at_level is None or at_level(record))
+
+    return log_ring().read(since=since, limit=lines, match=match, component=component)
+
+
+def read_ring(component, lines=120, level=None):
+    """Return (text, records, head); head is where a live stream picks up."""
+    records, head = ring_records(component, lines, level)
+    return "\n".join(ringlog.format_record(r) for r in records) or "No entries", records, head
 
 
 def read_journal(unit, lines=120):
-    cmd = ["journalctl", "-u", unit, "-n", str(lines), "--no-pager"]
-    try:
-        result = subprocess.run(cmd, check=False, capture_output=True, text=True)
-    except FileNotFoundError:
-        return "journalctl not available"
-    if result.returncode != 0:
-        err = (result.stderr or "").strip()
-        return f"journalctl error: {err or 'unknown'}"
-    out = (result.stdout or "").strip()
-    return out or "No entries"
+    """Return (text, cursor); the cursor is where a live stream picks up."""
+    entries, err, cursor = logtail.journal_tail(unit, lines)
+    if err:
+        return err, None
+    return "\n".join(entries).strip() or "No entries", cursor
+
+
+def _collect(lines, level=None):
+    logs = {}
+    positions = {}
+    records = {}
+    for name, (kind, target) in LOG_SOURCES.items():
+        if kind == "ring":
+            logs[name], records[name], positions[name] = read_ring(target, lines=lines, level=level)
+        elif kind == "file":
+            logs[name], positions[name] = read_tail(target, lines=lines)
+        else:
+            logs[name], positions[name] = read_journal(target, lines=lines)
+    return logs, positions, records
+
+
+def collect_log_data(lines=120, level=None):
+    """(logs, positions, records) shared between requests for LOG_CACHE_TTL seconds.
+
+    records holds the structured entries (ts, level, component, message) of
+    the ring sources.
+    """
+    return _log_cache.get((lines, level), lambda: _collect(lines, level))
+
+
+def collect_logs_with_positions(lines=120, level=None):
+    """Logs plus per-source offsets/cursors."""
+    return collect_log_data(lines, level)[:2]
 
 
 def collect_logs(lines=120):
-    return {
-        "ui_debug": read_tail(UI_DEBUG_LOG, lines=lines),
-        "mpv_debug": read_tail(MPV_DEBUG_LOG, lines=lines),
-        "respeaker_driver": read_tail(RESPEAKER_LOG, lines=lines),
-        "crt_ui_service": read_journal("crt-ui.service", lines=lines),
-        "crt_web_service": read_journal("crt-web.service", lines=lines),
-    }
+    return collect_logs_with_positions(lines)[0]
+
+
+def _sse(event=None, data=None, event_id=None, comment=None):
+    out = []
+    if comment is not None:
+        out.append(f": {comment}")
+    if event_id is not None:
+        out.append(f"id: {event_id}")
+    if event is not None:
+        out.append(f"event: {event}")
+    if data is not None:
+        out.extend(f"data: {line}" for line in data.split("\n"))
+    return "\n".join(out) + "\n\n"
+
+
+def stream_logs(positions, max_seconds=STREAM_MAX_SECONDS, level=None):
+    """Yield SSE messages with lines added to the given log sources after their positions.
+
+    positions maps each source to where it was read up to: a byte offset for
+    file sources, the ring head for ring sources and a journal cursor for
+    journal sources (None: from now on). All sources share one connection;
+    each event names its source in the data and carries every position as a
+    JSON event id, so a reconnecting EventSource resumes all of them without
+    gaps or repeats.
+    """
+    positions = dict(positions)
+    for name, position in positions.items():
+        kind, target = LOG_SOURCES[name]
+        if kind == "file" and position is None:
+            try:
+                positions[name] = os.path.getsize(target)
+            except OSError:
+                positions[name] = 0
+        elif kind == "ring" and position is None:
+            positions[name] = log_ring().head()
+    started = time.monotonic()
+    last_sent = started
+    due = dict.fromkeys(positions, started)
+    yield "retry: 2000\n\n"
+    while positions and time.monotonic() - started < max_seconds:
+        for name in list(positions):
+            kind, target = LOG_SOURCES[name]
+            now = time.monotonic()
+            if now < due[name]:
+                continue
+            due[name] = now + (JOURNAL_POLL_SECONDS if kind == "journal" else STREAM_POLL_SECONDS)
+            position = positions[name]
+            lines = []
+            records = None
+            if kind == "ring":
+                records, position = ring_records(target, level=level, since=int(position))
+                lines = [ringlog.format_record(r) for r in records]
+            elif kind == "file":
+                try:
+                    lines, position = logtail.read_from(target, int(position))
+                except OSError:
+                    lines = []
+            elif position is None:
+                # Start at the newest entry; only what follows it is streamed.
+                _, err, position = logtail.journal_tail(target, 1)
+            else:
+                lines, err, position = logtail.journal_since(target, position)
+                if err:
+                    del positions[name]
+                    yield _sse(event="error", data=json.dumps({"source": name, "error": err}))
+                    continue
+            positions[name] = position
+            if lines:
+                payload = {"source": name, "lines": lines}
+                if records is not None:
+                    payload["records"] = records
+                yield _sse(data=json.dumps(payload), event_id=json.dumps(positions, separators=(",", ":")))
+                last_sent = time.monotonic()
+        if time.monotonic() - last_sent >= STREAM_KEEPALIVE_SECONDS:
+            yield _sse(comment="keepalive")
+            last_sent = time.monotonic()
+        time.sleep(STREAM_POLL_SECONDS)
+
+
+class _StreamSlot:
+    """Response iterable holding one of the MAX_STREAMS slots until the server closes it."""
+
+    def __init__(self, stream):
+        self.stream = stream
+        self._released = False
+
+    def __iter__(self):
+        return iter(self.stream)
+
+    def close(self):
+        try:
+            close = getattr(self.stream, "close", None)
+            if close is not None:
+                close()
+        finally:
+            if not self._released:
+                self._released = True
+                _stream_slots.release()
+
+
+def stream_positions(args, last_event_id=None):
+    """{source: position} for /api/logs/stream from its query and Last-Event-ID; raises ValueError."""
+    names = [n for value in args.getlist("source") for n in value.split(",") if n]
+    positions = {}
+    raw = last_event_id or args.get("positions")
+    if raw:
+        try:
+            positions = json.loads(raw)
+        except ValueError:
+            # A single-source stream from before streams were combined resumes from a bare offset/cursor.
+            positions = {names[0]: raw} if len(names) == 1 else None
+        if not isinstance(positions, dict):
+            raise ValueError("positions must be a JSON object of source: offset/cursor")
+    elif len(names) == 1 and (args.get("offset") or args.get("cursor")):
+        positions = {names[0]: args.get("offset") or args.get("cursor")}
+    names = names or list(positions) or list(LOG_SOURCES)
+    unknown = [n for n in names if n not in LOG_SOURCES]
+    if unknown:
+        raise ValueError(f"source must be one of {', '.join(LOG_SOURCES)}")
+    result = {}
+    for name in names:
+        position = positions.get(name)
+        if position in ("", None):
+            position = None
+        elif LOG_SOURCES[name][0] in ("file", "ring"):
+            try:
+                position = max(0, int(position))
+            except (TypeError, ValueError):
+                raise ValueError(f"offset for {name} must be int") from None
+        result[name] = position
+    return result
+
+
+def render_metrics():
+    """This process's request metrics plus the snapshot the UI last published, as Prometheus text."""
+    ui_snapshot = metrics.load_snapshot()
+    metrics.set_gauge("crt_ui_up", int(bool(ui_snapshot) and metrics.pid_alive(ui_snapshot.get("pid"))))
+    return metrics.render([metrics.registry.snapshot(), ui_snapshot])
 
 
 def create_app():
     app = Flask(__name__)
 
+    @app.before_request
+    def start_timer():
+        g.request_started = time.monotonic()
+
+    @app.after_request
+    def record_latency(response):
+        started = g.get("request_started")
+        if started is not None:
+            endpoint = request.url_rule.rule if request.url_rule is not None else "unmatched"
+            metrics.observe(
+                "crt_web_request_seconds",
+                time.monotonic() - started,
+                endpoint=endpoint,
+                method=request.method,
+                status=response.status_code,
+            )
+        return response
+
+    @app.route("/api/metrics", methods=["GET"])
+    def api_metrics():
+        return Response(render_metrics(), mimetype="text/plain; version=0.0.4")
+
     @app.route("/")
     def index():
         try:
@@ -132,8 +391,11 @@ def create_app():
         except ValueError:
             lines = 120
         lines = max(20, min(lines, 500))
-        logs = collect_logs(lines=lines)
-        return render_template("index.html", cfg=load_config(), logs=logs, lines=lines)
+        level = request.args.get("level") if request.args.get("level") in ringlog.LEVELS else None
+        logs, positions = collect_logs_with_positions(lines=lines, level=level)
+        return render_template(
+            "index.html", cfg=load_config(), logs=logs, positions=positions, lines=lines, level=level, levels=ringlog.LEVELS
+        )
 
     @app.route("/api/logs", methods=["GET"])
     def api_logs():
@@ -142,21 +404,120 @@ def create_app():
         except ValueError:
             lines = 120
         lines = max(20, min(lines, 500))
-        return jsonify({"lines": lines, "logs": collect_logs(lines=lines)})
+        level = request.args.get("level") or None
+        if level is not None and level not in ringlog.LEVELS:
+            return jsonify({"errors": [f"level must be one of {', '.join(ringlog.LEVELS)}"]}), 400
+        logs, positions, records = collect_log_data(lines=lines, level=level)
+        return jsonify({"lines": lines, "level": level, "logs": logs, "positions": positions, "records": records})
+
+    @app.route("/api/logs/stream", methods=["GET"])
+    def api_logs_stream():
+        try:
+            positions = stream_positions(request.args, request.headers.get("Last-Event-ID"))
+        except ValueError as exc:
+            return jsonify({"errors": [str(exc)]}), 400
+        level = request.args.get("level") if request.args.get("level") in ringlog.LEVELS else None
+        if not _stream_slots.acquire(blocking=False):
+            resp = jsonify({"errors": [f"too many open log streams (at most {MAX_STREAMS})"]})
+            resp.status_code = 503
+            resp.headers["Retry-After"] = "30"
+            return resp
+        headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+        stream = stream_logs(positions, level=level)
+        return Response(_StreamSlot(stream_with_context(stream)), mimetype="text/event-stream", headers=headers)
 
     @app.route("/api/config", methods=["GET", "POST"])
     def api_config():
         if request.method == "GET":
-            return jsonify(load_config())
+            cfg, version = config_store.load()
+            etag = config_store.etag(version)
+            if request.if_none_match.contains(etag):
+                resp = Response(status=304)
+            else:
+                resp = jsonify(cfg)
+            resp.set_etag(etag)
+            return resp
         payload = request.get_json(silent=True) or request.form.to_dict(flat=False)
         payload = normalize_payload(payload)
-        errors = validate(payload)
+        expected = None
+        if request.if_match and not request.if_match.star_tag:
+            expected = ConfigStore.parse_etag(next(iter(request.if_match), ""))
+        try:
+            cfg, version, errors = config_store.update(payload, validate=validate_config, expected_version=expected)
+        except ConfigConflict as exc:
+            resp = jsonify({"errors": ["config changed since it was read; reload and retry"], "version": exc.version})
+            resp.set_etag(config_store.etag(exc.version))
+            return resp, 412
         if errors:
             return jsonify({"errors": errors}), 400
+        resp = jsonify({"status": "ok", "config": cfg, "version": version})
+        resp.set_etag(config_store.etag(version))
+        return resp
+
+    @app.route("/api/storage", methods=["GET"])
+    def api_storage():
+        """Dry run: usage per collection and what the UI's storage manager would evict now."""
+        from ui.storage import PlayHistory, plan_eviction, storage_options
+
         cfg = load_config()
-        cfg.update(payload)
-        save_config(cfg)
-        return jsonify({"status": "ok", "config": cfg})
+        history = PlayHistory(storage_options(cfg)["history_path"], readonly=True)
+        try:
+            return jsonify(plan_eviction(cfg, history))
+        finally:
+            history.close()
+
+    @app.route("/api/startup", methods=["GET"])
+    def api_startup():
+        """Phase timings of the UI's last start (boot to menu to interactive) and a short history."""
+        try:
+            with open(STARTUP_REPORT_PATH, "r", encoding="utf-8") as f:
+                return jsonify(json.load(f))
+        except (OSError, ValueError):
+            return jsonify({"latest": None, "history": []})
+
+    @app.route("/api/uploads", methods=["POST"])
+    def api_upload_create():
+        from server.uploads import UploadError
+
+        payload = request.get_json(silent=True) or request.form.to_dict()
+        if not isinstance(payload, dict):
+            return jsonify({"errors": ["expected a JSON object"]}), 400
+        cfg = load_config()
+        try:
+            meta = upload_store(cfg).create(
+                payload.get("collection") or (cfg.get("collections") or ["Inbox"])[0],
+                payload.get("filename"),
+                payload.get("size"),
+                sha256=payload.get("sha256") or None,
+                collections=cfg.get("collections", []),
+            )
+        except UploadError as exc:
+            return upload_error(exc)
+        resp = upload_response(meta, 201)
+        resp.headers["Location"] = f"/api/uploads/{meta['id']}"
+        return resp
+
+    @app.route("/api/uploads/<upload_id>", methods=["GET", "HEAD", "PATCH", "PUT", "DELETE"])
+    def api_upload(upload_id):
+        from server.uploads import UploadError
+
+        store = upload_store(load_config())
+        try:
+            if request.method in ("GET", "HEAD"):
+                return upload_response(store.status(upload_id))
+            if request.method == "DELETE":
+                store.abort(upload_id)
+                return "", 204
+            raw_offset = request.headers.get("Upload-Offset", request.args.get("offset"))
+            try:
+                offset = int(raw_offset)
+            except (TypeError, ValueError):
+                raise UploadError("Upload-Offset header (or offset=) is required", 400)
+            # request.stream is read in CHUNK_SIZE pieces; the body is never held in memory.
+            meta = store.write(upload_id, offset, request.stream, length=request.content_length)
+        except UploadError as exc:
+            return upload_error(exc)
+        return upload_response(meta, 201 if meta.get("path") else 200)
 
     @app.route("/save", methods=["POST"])
     def save():
@@ -185,13 +546,13 @@ def create_app():
             payload["collections"] = [v for line in raw["collections"] for v in line.splitlines() if v.strip()]
 
         payload["leds_enabled"] = raw.get("leds_enabled", ["off"])[0] == "on"
-        errors = validate(payload)
+        _, _, errors = config_store.update(payload, validate=validate_config)
         if errors:
-            logs = collect_logs(lines=120)
-            return render_template("index.html", cfg=load_config(), errors=errors, logs=logs, lines=120), 400
-        cfg = load_config()
-        cfg.update(payload)
-        save_config(cfg)
+            logs, positions = collect_logs_with_positions(lines=120)
+            return (
+                render_template("index.html", cfg=load_config(), errors=errors, logs=logs, positions=positions, lines=120),
+                400,
+            )
         return redirect("/")
 
     return app
@@ -0,0 +1,376 @@
+"""Fleet controller: configure and watch several kitchen TVs through their web APIs.
+
+    python3 -m server.fleet [--inventory fleet.yaml] [--only NAME,...] [--json] COMMAND
+
+    add NAME URL [--timeout S]   remember a device (URL like http://kitchen-tv.local:8080)
+    remove NAME                  forget it
+    list                         the inventory
+    status                       reachability, latency, config version, recent warnings
+    diff [--file desired.yaml]   config keys that differ between devices (or from the file)
+    push (--set KEY=VALUE ... | --file changes.yaml) [--dry-run]
+    logs [--lines N] [--level warning] [--source NAME]
+
+Every command talks to all devices at once, each with its own timeout and
+keep-alive connection, and prints one aggregated view. push is a
+read-merge-write per device: nested keys (--set ingest.workers=2) are
+merged into that device's current section and saved with If-Match, so a
+concurrent edit on the TV itself is retried instead of overwritten.
+
+Exit status: 0 when every device answered, 1 when any of them failed (down,
+rejected the push, ...), 2 for usage and inventory errors.
+"""
+import argparse
+import http.client
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import yaml
+
+from downloads.worker import ConnectionPool
+from ui.config_store import ConfigStore
+from ui.ringlog import LEVELS, format_record
+
+DEFAULT_INVENTORY = os.environ.get("CRT_FLEET", os.path.expanduser("~/.config/crt-kitchen-tv/fleet.yaml"))
+DEFAULT_TIMEOUT = 5.0
+MAX_PARALLEL = 16
+PUSH_ATTEMPTS = 3
+MISSING = "<missing>"
+
+
+class FleetError(Exception):
+    """A device answered, but not the way the command needs."""
+
+
+class Inventory:
+    """The devices file: {timeout: seconds, devices: [{name, url, timeout?}]}."""
+
+    def __init__(self, path=DEFAULT_INVENTORY):
+        self.path = Path(path)
+        self.timeout = DEFAULT_TIMEOUT
+        self.devices = []
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = yaml.safe_load(f) or {}
+        except FileNotFoundError:
+            data = {}
+        self.timeout = float(data.get("timeout", DEFAULT_TIMEOUT))
+        self.devices = [dict(d) for d in data.get("devices") or [] if d.get("name") and d.get("url")]
+
+    def save(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_name(f".{self.path.name}.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            yaml.safe_dump({"timeout": self.timeout, "devices": self.devices}, f, sort_keys=False)
+        os.replace(tmp, self.path)
+
+    def add(self, name, url, timeout=None):
+        entry = {"name": name, "url": url.rstrip("/")}
+        if timeout is not None:
+            entry["timeout"] = timeout
+        self.devices = [d for d in self.devices if d["name"] != name] + [entry]
+
+    def remove(self, name):
+        before = len(self.devices)
+        self.devices = [d for d in self.devices if d["name"] != name]
+        return len(self.devices) != before
+
+    def select(self, names=None):
+        chosen = [d for d in self.devices if not names or d["name"] in names]
+        unknown = set(names or []) - {d["name"] for d in self.devices}
+        if unknown:
+            raise FleetError(f"unknown device(s): {', '.join(sorted(unknown))}")
+        return [Device(d["name"], d["url"], float(d.get("timeout", self.timeout))) for d in chosen]
+
+
+class Device:
+    """One TV's web API over a keep-alive connection with this device's timeout."""
+
+    def __init__(self, name, url, timeout=DEFAULT_TIMEOUT):
+        self.name = name
+        self.url = url.rstrip("/")
+        self.timeout = timeout
+        self.pool = ConnectionPool(timeout=timeout, per_host=2)
+
+    def request(self, method, path, payload=None, headers=None):
+        """Return (status, response headers, decoded JSON body or None)."""
+        headers = dict(headers or {})
+        body = None
+        if payload is not None:
+            body = json.dumps(payload).encode("utf-8")
+            headers["Content-Type"] = "application/json"
+        with self.pool.open(self.url + path, headers=headers, method=method, body=body) as resp:
+            raw = resp.read()
+            try:
+                data = json.loads(raw) if raw else None
+            except ValueError:
+                data = None
+            return resp.status, resp.headers, data
+
+    def get_config(self):
+        status, headers, cfg = self.request("GET", "/api/config")
+        if status != 200 or not isinstance(cfg, dict):
+            raise FleetError(f"GET /api/config answered {status}")
+        return cfg, headers.get("ETag")
+
+    def close(self):
+        self.pool.close()
+
+
+def fan_out(devices, fn):
+    """Run fn(device) on all devices at once; returns [(device, result, error, seconds)] in device order."""
+
+    def call(device):
+        started = time.monotonic()
+        try:
+            return device, fn(device), None, time.monotonic() - started
+        except (OSError, http.client.HTTPException, FleetError, ValueError) as exc:
+            return device, None, str(exc) or exc.__class__.__name__, time.monotonic() - started
+
+    if not devices:
+        return []
+    with ThreadPoolExecutor(max_workers=min(MAX_PARALLEL, len(devices)), thread_name_prefix="fleet") as pool:
+        return list(pool.map(call, devices))
+
+
+def flatten(value, prefix=""):
+    """{"a": {"b": 1}} -> {"a.b": 1}; lists and scalars are leaves."""
+    if isinstance(value, dict) and value:
+        out = {}
+        for key, item in value.items():
+            out.update(flatten(item, f"{prefix}{key}."))
+        return out
+    return {prefix[:-1]: value} if prefix else {}
+
+
+def deep_merge(base, changes):
+    if not isinstance(base, dict) or not isinstance(changes, dict):
+        return changes
+    merged = dict(base)
+    for key, value in changes.items():
+        merged[key] = deep_merge(base.get(key), value)
+    return merged
+
+
+def parse_sets(items):
+    """["ingest.workers=2", "font_size=40"] -> {"ingest": {"workers": 2}, "font_size": 40} (values parsed as YAML)."""
+    changes = {}
+    for item in items:
+        key, sep, raw = item.partition("=")
+        if not sep or not key.strip():
+            raise FleetError(f"--set expects KEY=VALUE, got {item!r}")
+        parts = key.strip().split(".")
+        target = changes
+        for part in parts[:-1]:
+            target = target.setdefault(part, {})
+        target[parts[-1]] = yaml.safe_load(raw) if raw.strip() else ""
+    return changes
+
+
+def show(value):
+    if value is MISSING:
+        return MISSING
+    return json.dumps(value, ensure_ascii=False) if not isinstance(value, str) else value
+
+
+def table(headers, rows):
+    widths = [max(len(str(cell)) for cell in column) for column in zip(headers, *rows)]
+    lines = ["  ".join(str(cell).ljust(width) for cell, width in zip(headers, widths)).rstrip()]
+    for row in rows:
+        lines.append("  ".join(str(cell).ljust(width) for cell, width in zip(row, widths)).rstrip())
+    return "\n".join(lines)
+
+
+def cmd_status(devices, args):
+    def status(device):
+        cfg, etag = device.get_config()
+        code, _, logs = device.request("GET", f"/api/logs?lines={args.lines}&level=warning")
+        records = []
+        if code == 200 and isinstance(logs, dict):
+            records = sorted((r for rs in (logs.get("records") or {}).values() for r in rs), key=lambda r: r.get("ts", 0))
+        return {
+            "version": ConfigStore.parse_etag(etag or ""),
+            "collections": len(cfg.get("collections") or []),
+            "warnings": len(records),
+            "last_warning": format_record(records[-1], with_component=True) if records else "",
+        }
+
+    results = fan_out(devices, status)
+    failed = any(e is not None for _, _, e, _ in results)
+    if args.json:
+        return {d.name: dict(r or {}, error=e, ms=round(s * 1000)) for d, r, e, s in results}, failed
+    rows = []
+    for device, result, error, seconds in results:
+        if error:
+            rows.append((device.name, "DOWN", f"{seconds * 1000:.0f}", "", "", error))
+        else:
+            rows.append((device.name, "ok", f"{seconds * 1000:.0f}", result["version"], result["warnings"], result["last_warning"]))
+    return table(("device", "state", "ms", "config", "warnings", "last warning"), rows), failed
+
+
+def cmd_diff(devices, args):
+    desired = None
+    if args.file:
+        with open(args.file, "r", encoding="utf-8") as f:
+            desired = flatten(yaml.safe_load(f) or {})
+    results = fan_out(devices, lambda d: flatten(d.get_config()[0]))
+    reachable = [(d, r) for d, r, e, _ in results if e is None]
+    errors = {d.name: e for d, _, e, _ in results if e is not None}
+    keys = sorted(desired) if desired is not None else sorted({k for _, flat in reachable for k in flat})
+    rows = []
+    for key in keys:
+        values = [flat.get(key, MISSING) for _, flat in reachable]
+        reference = [desired[key]] if desired is not None else values[:1]
+        if any(value != reference[0] for value in values):
+            rows.append([key] + ([show(desired[key])] if desired is not None else []) + [show(v) for v in values])
+    if args.json:
+        names = (["desired"] if desired is not None else []) + [d.name for d, _ in reachable]
+        return {"differences": {row[0]: dict(zip(names, row[1:])) for row in rows}, "errors": errors}, bool(errors)
+    headers = ["key"] + (["desired"] if desired is not None else []) + [d.name for d, _ in reachable]
+    out = [table(headers, rows) if rows else "no differences"]
+    out.extend(f"{name}: {error}" for name, error in errors.items())
+    return "\n".join(out), bool(errors)
+
+
+def cmd_push(devices, args):
+    changes = {}
+    if args.file:
+        with open(args.file, "r", encoding="utf-8") as f:
+            changes = yaml.safe_load(f) or {}
+        if not isinstance(changes, dict):
+            raise FleetError(f"{args.file} must hold a mapping of config keys")
+    changes = deep_merge(changes, parse_sets(args.set or []))
+    if not changes:
+        raise FleetError("nothing to push: give --set KEY=VALUE or --file")
+
+    def push(device):
+        for _ in range(PUSH_ATTEMPTS):
+            cfg, etag = device.get_config()
+            # The API replaces top-level keys, so send each touched section merged with this device's copy.
+            update = {key: deep_merge(cfg.get(key), value) for key, value in changes.items()}
+            before, after = flatten({k: cfg.get(k) for k in update}), flatten(update)
+            changed = {k: (before.get(k, MISSING), after.get(k, MISSING)) for k in set(before) | set(after) if before.get(k, MISSING) != after.get(k, MISSING)}
+            if args.dry_run or not changed:
+                return {"changed": changed, "version": ConfigStore.parse_etag(etag or ""), "saved": False}
+            code, headers, body = device.request("POST", "/api/config", update, {"If-Match": etag} if etag else None)
+            if code == 412:
+                continue
+            if code != 200:
+                errors = (body or {}).get("errors") if isinstance(body, dict) else None
+                raise FleetError("; ".join(errors) if errors else f"POST /api/config answered {code}")
+            return {"changed": changed, "version": (body or {}).get("version"), "saved": True}
+        raise FleetError("config kept changing on the device; not saved")
+
+    results = fan_out(devices, push)
+    failed = any(e is not None for _, _, e, _ in results)
+    if args.json:
+        return {
+            d.name: {"error": e} if e else dict(r, changed={k: [show(a), show(b)] for k, (a, b) in r["changed"].items()})
+            for d, r, e, _ in results
+        }, failed
+    rows = []
+    for device, result, error, _ in results:
+        if error:
+            rows.append((device.name, "FAILED", "", error))
+            continue
+        state = "would change" if args.dry_run and result["changed"] else "saved" if result["saved"] else "unchanged"
+        details = ", ".join(f"{k}: {show(a)} -> {show(b)}" for k, (a, b) in sorted(result["changed"].items()))
+        rows.append((device.name, state, result["version"], details))
+    return table(("device", "result", "config", "changes"), rows), failed
+
+
+def cmd_logs(devices, args):
+    query = f"/api/logs?lines={args.lines}" + (f"&level={args.level}" if args.level else "")
+
+    def logs(device):
+        code, _, data = device.request("GET", query)
+        if code != 200 or not isinstance(data, dict):
+            raise FleetError(f"GET /api/logs answered {code}")
+        return data
+
+    results = fan_out(devices, logs)
+    failed = any(e is not None for _, _, e, _ in results)
+    if args.json:
+        return {d.name: r if e is None else {"error": e} for d, r, e, _ in results}, failed
+    out = []
+    if args.source:
+        for device, data, error, _ in results:
+            out.append(f"== {device.name} {args.source} ==")
+            out.append(error or (data.get("logs") or {}).get(args.source, "(no such source)"))
+        return "\n".join(out), failed
+    # Structured records from every device, merged by time.
+    merged = []
+    for device, data, error, _ in results:
+        if error:
+            out.append(f"{device.name}: {error}")
+            continue
+        for records in (data.get("records") or {}).values():
+            merged.extend((r.get("ts", 0), device.name, r) for r in records)
+    merged.sort(key=lambda item: (item[0], item[1]))
+    width = max((len(d.name) for d in devices), default=0)
+    lines = [f"{name.ljust(width)}  {format_record(record, with_component=True)}" for _, name, record in merged]
+    return "\n".join(lines + out), failed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--inventory", default=DEFAULT_INVENTORY)
+    parser.add_argument("--only", help="comma separated device names (default: all)")
+    parser.add_argument("--json", action="store_true", help="machine-readable output")
+    sub = parser.add_subparsers(dest="command", required=True)
+    add = sub.add_parser("add")
+    add.add_argument("name")
+    add.add_argument("url")
+    add.add_argument("--timeout", type=float)
+    sub.add_parser("remove").add_argument("name")
+    sub.add_parser("list")
+    sub.add_parser("status").add_argument("--lines", type=int, default=100, help="log lines searched for warnings")
+    sub.add_parser("diff").add_argument("--file", help="desired config (YAML); only its keys are compared")
+    push = sub.add_parser("push")
+    push.add_argument("--set", action="append", metavar="KEY=VALUE", help="dotted keys for nested settings; repeatable")
+    push.add_argument("--file", help="YAML mapping of changes")
+    push.add_argument("--dry-run", action="store_true")
+    logs = sub.add_parser("logs")
+    logs.add_argument("--lines", type=int, default=120)
+    logs.add_argument("--level", choices=LEVELS)
+    logs.add_argument("--source", help="print this log source (e.g. mpv_output) per device instead of merged records")
+    args = parser.parse_args(argv)
+
+    inventory = Inventory(args.inventory)
+    failed = False
+    try:
+        if args.command == "add":
+            inventory.add(args.name, args.url, args.timeout)
+            inventory.save()
+            return 0
+        if args.command == "remove":
+            if not inventory.remove(args.name):
+                raise FleetError(f"unknown device: {args.name}")
+            inventory.save()
+            return 0
+        devices = inventory.select([n.strip() for n in (args.only or "").split(",") if n.strip()])
+        if args.command == "list":
+            output = [{"name": d.name, "url": d.url, "timeout": d.timeout} for d in devices] if args.json else table(
+                ("device", "url", "timeout"), [(d.name, d.url, d.timeout) for d in devices]
+            )
+        else:
+            if not devices:
+                raise FleetError(f"no devices in {inventory.path}; add some with `add NAME URL`")
+            command = {"status": cmd_status, "diff": cmd_diff, "push": cmd_push, "logs": cmd_logs}[args.command]
+            try:
+                output, failed = command(devices, args)
+            finally:
+                for device in devices:
+                    device.close()
+    except (FleetError, OSError, yaml.YAMLError) as exc:
+        print(f"fleet: {exc}", file=sys.stderr)
+        return 2
+    print(json.dumps(output, indent=1, ensure_ascii=False) if args.json else output)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,130 @@
+import os
+import subprocess
+import threading
+import time
+
+BLOCK_SIZE = 8192
+MAX_CHUNK_BYTES = 64 * 1024
+CURSOR_PREFIX = "-- cursor: "
+
+
+def tail_file(path, lines=120, block_size=BLOCK_SIZE):
+    """Return (last lines, end offset) reading backwards from the end of path.
+
+    Only the blocks holding the requested lines are read, so the cost does not
+    grow with the size of a log that is never rotated.
+    """
+    with open(path, "rb") as f:
+        f.seek(0, os.SEEK_END)
+        end = f.tell()
+        pos = end
+        data = b""
+        # One extra newline: the last line usually ends with one.
+        while pos > 0 and data.count(b"\n") <= lines:
+            step = min(block_size, pos)
+            pos -= step
+            f.seek(pos)
+            data = f.read(step) + data
+    if data and not data.endswith(b"\n"):
+        # A line still being written belongs to the next read_from().
+        cut = data.rfind(b"\n") + 1
+        end -= len(data) - cut
+        data = data[:cut]
+    text = data.decode("utf-8", errors="replace")
+    return text.splitlines()[-lines:] if lines > 0 else [], end
+
+
+def read_from(path, offset, max_bytes=MAX_CHUNK_BYTES):
+    """Return (complete new lines, next offset) written after offset.
+
+    A file that got shorter than offset was truncated or replaced, so reading
+    starts over from the beginning. A trailing partial line is left for the
+    next call.
+    """
+    with open(path, "rb") as f:
+        f.seek(0, os.SEEK_END)
+        size = f.tell()
+        if offset > size:
+            offset = 0
+        if offset == size:
+            return [], offset
+        f.seek(offset)
+        data = f.read(max_bytes)
+    cut = data.rfind(b"\n")
+    if cut < 0:
+        if len(data) < max_bytes:
+            return [], offset
+        cut = len(data) - 1
+    chunk = data[: cut + 1]
+    return chunk.decode("utf-8", errors="replace").splitlines(), offset + len(chunk)
+
+
+def _journal(args):
+    cmd = ["journalctl", "--no-pager", "--show-cursor", "-o", "short"] + args
+    try:
+        result = subprocess.run(cmd, check=False, capture_output=True, text=True, timeout=10)
+    except FileNotFoundError:
+        return None, "journalctl not available", None
+    except subprocess.TimeoutExpired:
+        return None, "journalctl timed out", None
+    if result.returncode != 0:
+        err = (result.stderr or "").strip()
+        return None, f"journalctl error: {err or 'unknown'}", None
+    lines = []
+    cursor = None
+    for line in (result.stdout or "").splitlines():
+        if line.startswith(CURSOR_PREFIX):
+            cursor = line[len(CURSOR_PREFIX) :].strip()
+        elif line.strip() and not line.startswith("-- No entries --"):
+            lines.append(line)
+    return lines, None, cursor
+
+
+def journal_tail(unit, lines=120):
+    """Return (lines, err, cursor) for the last entries of a unit."""
+    return _journal(["-u", unit, "-n", str(lines)])
+
+
+def journal_since(unit, cursor):
+    """Return (lines, err, cursor) for entries after cursor; cursor is kept when nothing is new."""
+    entries, err, new_cursor = _journal(["-u", unit, f"--after-cursor={cursor}"])
+    return entries, err, new_cursor or cursor
+
+
+class TTLCache:
+    """Values computed at most once per ttl seconds per key.
+
+    Concurrent callers for the same key wait for the one computing it instead
+    of repeating the work (e.g. several browsers polling the logs).
+    """
+
+    def __init__(self, ttl=2.0):
+        self.ttl = ttl
+        self._entries = {}
+        self._lock = threading.Lock()
+        self._key_locks = {}
+
+    def get(self, key, compute):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                return entry[1]
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+        with key_lock:
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None and entry[0] > time.monotonic():
+                    return entry[1]
+            value = compute()
+            with self._lock:
+                self._entries[key] = (time.monotonic() + self.ttl, value)
+                # Keep only fresh entries; lines= has a small range of values anyway.
+                now = time.monotonic()
+                for stale in [k for k, e in self._entries.items() if e[0] <= now]:
+                    del self._entries[stale]
+            return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
@@ -0,0 +1,163 @@
+"""Socket-activated web service: started by systemd on the first request, exits when idle.
+
+    python3 -m server.ondemand [--idle-seconds 600] [--threads 4] [--listen 0.0.0.0:8080]
+
+crt-web.socket holds port 8080 and starts crt-web-ondemand.service on the
+first connection, passing the listening socket (LISTEN_FDS). Flask, the app
+and waitress are only imported once that socket is in hand; after
+--idle-seconds without a request in flight the process exits and systemd
+goes back to listening. Open log streams do not count as activity, so a
+forgotten diagnostics tab does not keep the service up. Without socket
+activation (run by hand, the bench) it binds --listen itself.
+"""
+import _thread
+import argparse
+import os
+import socket
+import sys
+import threading
+import time
+
+from ui.startup import process_start_since_boot
+
+SD_LISTEN_FDS_START = 3
+DEFAULT_IDLE_SECONDS = 600
+# Log streams are capped at server.app.MAX_STREAMS (2), which leaves threads for normal requests.
+DEFAULT_THREADS = 4
+# Long-lived requests that neither count as in flight nor as activity.
+PASSIVE_PATHS = ("/api/logs/stream",)
+DEFAULT_LISTEN = "0.0.0.0:8080"
+# How long waitress gets to shut down cleanly after the idle exit.
+EXIT_GRACE_SECONDS = 10
+
+
+def systemd_sockets():
+    """Listening sockets passed by systemd socket activation, [] when not activated."""
+    if os.environ.get("LISTEN_PID") != str(os.getpid()):
+        return []
+    try:
+        count = int(os.environ.get("LISTEN_FDS", "0"))
+    except ValueError:
+        return []
+    for key in ("LISTEN_PID", "LISTEN_FDS", "LISTEN_FDNAMES"):
+        os.environ.pop(key, None)
+    return [socket.socket(fileno=fd) for fd in range(SD_LISTEN_FDS_START, SD_LISTEN_FDS_START + count)]
+
+
+def bind_socket(listen):
+    host, _, port = listen.rpartition(":")
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host or "0.0.0.0", int(port)))
+    sock.listen(64)
+    return sock
+
+
+class _Tracked:
+    """Response iterable that reports when the server is done with it (streams included)."""
+
+    def __init__(self, result, done):
+        self.result = result
+        self.done = done
+
+    def __iter__(self):
+        return iter(self.result)
+
+    def close(self):
+        try:
+            close = getattr(self.result, "close", None)
+            if close is not None:
+                close()
+        finally:
+            self.done()
+
+
+class IdleTracker:
+    """WSGI middleware counting requests in flight; idle_for() is 0 while any is running.
+
+    Requests for passive paths (log streams) are passed through untracked.
+    """
+
+    def __init__(self, app, passive_paths=PASSIVE_PATHS):
+        self.app = app
+        self.passive_paths = tuple(passive_paths)
+        self._lock = threading.Lock()
+        self._active = 0
+        self._last = time.monotonic()
+        self.requests = 0
+
+    def _enter(self):
+        with self._lock:
+            self._active += 1
+            self.requests += 1
+
+    def _leave(self):
+        with self._lock:
+            self._active -= 1
+            self._last = time.monotonic()
+
+    def idle_for(self):
+        with self._lock:
+            return 0.0 if self._active else time.monotonic() - self._last
+
+    def __call__(self, environ, start_response):
+        if environ.get("PATH_INFO", "") in self.passive_paths:
+            return self.app(environ, start_response)
+        self._enter()
+        try:
+            result = self.app(environ, start_response)
+        except BaseException:
+            self._leave()
+            raise
+        return _Tracked(result, self._leave)
+
+
+def watch_idle(tracker, idle_seconds, log):
+    while True:
+        idle = tracker.idle_for()
+        if idle >= idle_seconds:
+            log(f"idle for {idle:.0f}s after {tracker.requests} request(s), exiting")
+            # waitress' run() treats KeyboardInterrupt as a request to shut down, but its
+            # dispatcher can swallow it while a stream is writing; exit hard if it does.
+            _thread.interrupt_main()
+            time.sleep(EXIT_GRACE_SECONDS)
+            log(f"still running {EXIT_GRACE_SECONDS}s after the idle exit, forcing it")
+            os._exit(0)
+        time.sleep(max(1.0, min(30.0, idle_seconds - idle)))
+
+
+def main(argv=None):
+    started = time.monotonic()
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--idle-seconds",
+        type=float,
+        default=float(os.environ.get("CRT_WEB_IDLE_SECONDS", DEFAULT_IDLE_SECONDS)),
+        help="exit after this long without requests (0: never)",
+    )
+    parser.add_argument("--threads", type=int, default=DEFAULT_THREADS)
+    parser.add_argument("--listen", default=DEFAULT_LISTEN, help="host:port when not socket-activated")
+    args = parser.parse_args(argv)
+
+    def log(message):
+        print(f"crt-web: {message}", flush=True)
+
+    sockets = systemd_sockets() or [bind_socket(args.listen)]
+    # The slow imports (Flask, Jinja, waitress) happen here, with the first connection already queued.
+    from waitress import create_server
+
+    from server.app import app
+
+    tracker = IdleTracker(app)
+    server = create_server(tracker, sockets=sockets, threads=args.threads, ident="crt-kitchen-tv")
+    launched = process_start_since_boot()
+    since_exec = f", {time.clock_gettime(time.CLOCK_BOOTTIME) - launched:.2f}s after exec" if launched is not None else ""
+    log(f"serving {time.monotonic() - started:.2f}s after main(){since_exec}")
+    if args.idle_seconds > 0:
+        threading.Thread(target=watch_idle, args=(tracker, args.idle_seconds, log), name="idle-exit", daemon=True).start()
+    server.run()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
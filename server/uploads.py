@@ -0,0 +1,233 @@
+import fcntl
+import hashlib
+import json
+import os
+import re
+import shutil
+import threading
+import time
+import uuid
+from pathlib import Path
+
+from ui.library import is_video_name
+
+CHUNK_SIZE = 1024 * 1024
+STAGING_DIR = ".uploads"
+DEFAULT_RESERVE_MB = 200
+STALE_SECONDS = 24 * 3600
+ID_RE = re.compile(r"^[0-9a-f]{32}$")
+UNSAFE_RE = re.compile(r"[^\w .()+,-]")
+
+
+class UploadError(Exception):
+    """An upload request that cannot be served; status is the HTTP code to answer with."""
+
+    def __init__(self, message, status=400, offset=None):
+        super().__init__(message)
+        self.status = status
+        self.offset = offset
+
+
+def safe_filename(name):
+    name = os.path.basename(str(name or "").replace("\\", "/")).strip()
+    name = UNSAFE_RE.sub("_", name).lstrip(".")
+    return name[:200]
+
+
+def unique_path(folder, name):
+    target = Path(folder) / name
+    stem, suffix = target.stem, target.suffix
+    n = 1
+    while target.exists():
+        target = Path(folder) / f"{stem} ({n}){suffix}"
+        n += 1
+    return target
+
+
+class UploadStore:
+    """Resumable uploads staged under media_root/.uploads.
+
+    A client creates an upload (collection, filename, size, optional sha256),
+    then sends the body in any number of requests, each starting at the offset
+    the server reports. Bodies are copied to the .part file in CHUNK_SIZE
+    pieces, so memory use does not depend on the file size. When the last
+    byte arrives the checksum is verified and the file is renamed into the
+    collection folder; staging lives on the same filesystem, so the rename is
+    atomic and the library watcher only ever sees complete files.
+    """
+
+    def __init__(self, media_root, reserve_mb=DEFAULT_RESERVE_MB):
+        self.media_root = Path(media_root)
+        self.staging = self.media_root / STAGING_DIR
+        self.reserve = int(reserve_mb) * 1024 * 1024
+        # Running hashes for uploads whose bytes all passed through this process.
+        self._hashers = {}
+        self._lock = threading.Lock()
+
+    def _paths(self, upload_id):
+        if not ID_RE.match(str(upload_id)):
+            raise UploadError("unknown upload", 404)
+        return self.staging / f"{upload_id}.part", self.staging / f"{upload_id}.json"
+
+    def _meta(self, upload_id):
+        part, meta_path = self._paths(upload_id)
+        try:
+            with open(meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            raise UploadError("unknown upload", 404)
+        try:
+            meta["offset"] = part.stat().st_size
+        except FileNotFoundError:
+            meta["offset"] = 0
+        return meta
+
+    def _check_space(self, needed):
+        try:
+            free = shutil.disk_usage(self.staging).free
+        except OSError as exc:
+            raise UploadError(f"cannot check free space: {exc}", 507)
+        if needed + self.reserve > free:
+            raise UploadError(f"not enough free space ({free // (1024 * 1024)} MB free)", 507)
+
+    def prune(self, max_age=STALE_SECONDS):
+        """Drop staged uploads nobody touched for max_age seconds."""
+        cutoff = time.time() - max_age
+        try:
+            entries = list(os.scandir(self.staging))
+        except FileNotFoundError:
+            return
+        for entry in entries:
+            try:
+                if entry.stat().st_mtime < cutoff:
+                    os.remove(entry.path)
+            except OSError:
+                pass
+
+    def create(self, collection, filename, size, sha256=None, collections=()):
+        if collection not in collections:
+            raise UploadError(f"unknown collection: {collection}")
+        name = safe_filename(filename)
+        if not name or not is_video_name(name):
+            raise UploadError("filename must have a video extension")
+        try:
+            size = int(size)
+        except (TypeError, ValueError):
+            raise UploadError("size must be int")
+        if size <= 0:
+            raise UploadError("size must be positive")
+        if sha256 is not None and not re.match(r"^[0-9a-fA-F]{64}$", str(sha256)):
+            raise UploadError("sha256 must be 64 hex digits")
+        self.staging.mkdir(parents=True, exist_ok=True)
+        self.prune()
+        self._check_space(size)
+        upload_id = uuid.uuid4().hex
+        part, meta_path = self._paths(upload_id)
+        meta = {
+            "id": upload_id,
+            "collection": collection,
+            "filename": name,
+            "size": size,
+            "sha256": sha256.lower() if sha256 else None,
+            "created": time.time(),
+        }
+        part.touch()
+        tmp = meta_path.with_suffix(".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        os.replace(tmp, meta_path)
+        meta["offset"] = 0
+        return meta
+
+    def status(self, upload_id):
+        return self._meta(upload_id)
+
+    def abort(self, upload_id):
+        part, meta_path = self._paths(upload_id)
+        self._meta(upload_id)
+        with self._lock:
+            self._hashers.pop(upload_id, None)
+        for path in (part, meta_path):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def write(self, upload_id, offset, stream, length=None):
+        """Append a request body at offset. Returns the upload state; "path" is set once complete."""
+        meta = self._meta(upload_id)
+        part, _ = self._paths(upload_id)
+        if offset != meta["offset"]:
+            raise UploadError("offset does not match the uploaded size", 409, meta["offset"])
+        remaining = meta["size"] - offset
+        if length is not None and length > remaining:
+            raise UploadError("body is larger than the rest of the file", 413, offset)
+        self._check_space(remaining)
+        with open(part, "r+b") as f:
+            try:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                raise UploadError("another request is writing this upload", 409, offset)
+            f.seek(offset)
+            with self._lock:
+                hasher, hashed = self._hashers.get(upload_id, (None, 0))
+            if hasher is None or hashed != offset:
+                hasher = hashlib.sha256() if offset == 0 else None
+            written = 0
+            try:
+                while written < remaining:
+                    chunk = stream.read(min(CHUNK_SIZE, remaining - written))
+                    if not chunk:
+                        break
+                    f.write(chunk)
+                    if hasher is not None:
+                        hasher.update(chunk)
+                    written += len(chunk)
+            finally:
+                # A dropped connection keeps what arrived; the client resumes from here.
+                f.flush()
+                os.fsync(f.fileno())
+                with self._lock:
+                    if hasher is not None:
+                        self._hashers[upload_id] = (hasher, offset + written)
+                    else:
+                        self._hashers.pop(upload_id, None)
+            if stream.read(1):
+                raise UploadError("body is larger than the rest of the file", 413, offset + written)
+        meta["offset"] = offset + written
+        if meta["offset"] == meta["size"]:
+            meta["path"] = str(self._finish(meta, part))
+        return meta
+
+    def _digest(self, upload_id, part, size):
+        with self._lock:
+            hasher, hashed = self._hashers.pop(upload_id, (None, 0))
+        if hasher is not None and hashed == size:
+            return hasher.hexdigest()
+        # Resumed after a restart: hash the staged file once, in chunks.
+        hasher = hashlib.sha256()
+        with open(part, "rb") as f:
+            for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+                hasher.update(chunk)
+        return hasher.hexdigest()
+
+    def _finish(self, meta, part):
+        upload_id = meta["id"]
+        _, meta_path = self._paths(upload_id)
+        if meta["sha256"]:
+            digest = self._digest(upload_id, part, meta["size"])
+            if digest != meta["sha256"]:
+                self.abort(upload_id)
+                raise UploadError(f"checksum mismatch (got {digest})", 422)
+        else:
+            with self._lock:
+                self._hashers.pop(upload_id, None)
+        folder = self.media_root / meta["collection"]
+        folder.mkdir(parents=True, exist_ok=True)
+        target = unique_path(folder, meta["filename"])
+        os.replace(part, target)
+        try:
+            os.remove(meta_path)
+        except FileNotFoundError:
+            pass
+        return target
@@ -0,0 +1,810 @@
+"""Delta sync: mirror collections from a NAS mount or another machine into media_root.
+
+    python3 -m sync.worker                      every sync.interval_minutes (crt-sync.service)
+    python3 -m sync.worker once [--source SRC] [--dest DIR] [--collections A,B]
+    python3 -m sync.worker serve DIR [--listen 127.0.0.1:8090]
+
+The source is a directory or the URL of a machine running `serve`; its
+top-level folders are collections. Files are compared by the sha256 of each
+1 MiB chunk, so data that is already somewhere under media_root (a renamed
+file, one moved to another collection, an interrupted transfer) is copied
+or renamed locally instead of sent again. Chunk hashes are kept in
+sync.manifest_path and only recomputed when a file's size or mtime changes.
+"""
+import argparse
+import hashlib
+import http.client
+import json
+import os
+import signal
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import quote, unquote, urlsplit
+
+from downloads.worker import READ_SIZE, ConnectionPool, TokenBucket
+from ui import ringlog
+from ui.config_store import ConfigStore
+from ui.library import is_video_name
+
+SYNC_LOG = "/tmp/crt-kitchen-tv-sync.log"
+DEFAULT_MANIFEST_PATH = "/var/lib/crt-kitchen-tv/sync-manifest.json"
+DEFAULT_SERVE_MANIFEST = "/var/lib/crt-kitchen-tv/sync-serve-manifest.json"
+DEFAULT_LISTEN = "127.0.0.1:8090"
+CHUNK_SIZE = 1024 * 1024
+PART_SUFFIX = ".sync-part"
+SAVE_SECONDS = 30
+# serve: how long a manifest request waits for its rebuild before getting a 503.
+MANIFEST_WAIT = 5
+RETRY_AFTER_SECONDS = 15
+# Client: how long to keep retrying while the server is still hashing.
+MANIFEST_READY_TIMEOUT = 6 * 3600
+
+
+class SyncError(Exception):
+    pass
+
+
+_log = ringlog.Logger("sync", fallback_path=SYNC_LOG)
+
+
+def load_config(store=None):
+    cfg, _ = (store or ConfigStore()).load()
+    cfg.setdefault("media_root", "/var/lib/crt-kitchen-tv/media")
+    opts = cfg.setdefault("sync", {}) or {}
+    cfg["sync"] = opts
+    opts.setdefault("enabled", False)
+    opts.setdefault("source", "")
+    opts.setdefault("collections", [])
+    opts.setdefault("interval_minutes", 360)
+    opts.setdefault("bandwidth_kbps", 4000)
+    opts.setdefault("delete", True)
+    opts.setdefault("manifest_path", DEFAULT_MANIFEST_PATH)
+    return cfg
+
+
+def hash_chunks(path, chunk_size=CHUNK_SIZE):
+    chunks = []
+    with open(path, "rb") as f:
+        while True:
+            data = f.read(chunk_size)
+            if not data:
+                return chunks
+            chunks.append(hashlib.sha256(data).hexdigest())
+
+
+def list_collection_files(root, collections=None):
+    """{"Collection/name.mp4": path} for the video files in root's top-level folders."""
+    root = Path(root)
+    if not collections:
+        with os.scandir(root) as entries:
+            collections = sorted(e.name for e in entries if e.is_dir() and not e.name.startswith("."))
+    files = {}
+    for name in collections:
+        try:
+            entries = os.scandir(root / name)
+        except (FileNotFoundError, NotADirectoryError):
+            continue
+        except OSError as exc:
+            _log(f"cannot read {root / name} :: {exc}")
+            continue
+        with entries:
+            for entry in entries:
+                if is_video_name(entry.name) and entry.is_file():
+                    files[f"{name}/{entry.name}"] = entry.path
+    return files
+
+
+def _in_collections(rel, collections):
+    return not collections or rel.split("/", 1)[0] in collections
+
+
+def _read(f, length, bucket=None):
+    """Up to length bytes from f, read in READ_SIZE pieces that each wait for the bandwidth budget."""
+    pieces = []
+    while length > 0:
+        piece = f.read(min(READ_SIZE, length))
+        if not piece:
+            break
+        if bucket is not None:
+            bucket.consume(len(piece))
+        pieces.append(piece)
+        length -= len(piece)
+    return b"".join(pieces)
+
+
+def _runs(indices):
+    """[(first, count)] of consecutive chunk indices."""
+    runs = []
+    for idx in indices:
+        if runs and runs[-1][0] + runs[-1][1] == idx:
+            runs[-1][1] += 1
+        else:
+            runs.append([idx, 1])
+    return runs
+
+
+class HashCache:
+    """Chunk hashes per file, reused while its size and mtime stay the same; persisted as JSON.
+
+    Entries are keyed by path and also found by inode, so a file renamed on
+    the same filesystem is not hashed again. `synced` records the destination
+    files the sync created (with the source size and mtime they came from);
+    only those are ever replaced, moved or deleted.
+    """
+
+    def __init__(self, path, chunk_size=CHUNK_SIZE):
+        self.path = Path(path)
+        self.chunk_size = chunk_size
+        self.files = {}
+        self.synced = {}
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._last_save = time.monotonic()
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("chunk_size") == chunk_size:
+                self.files = data.get("files", {})
+            self.synced = data.get("synced", {})
+        except (FileNotFoundError, ValueError, AttributeError):
+            pass
+        self._by_inode = {self._inode_key(e): p for p, e in self.files.items() if "ino" in e}
+
+    @staticmethod
+    def _inode_key(entry):
+        return entry.get("ino"), entry["size"], entry["mtime_ns"]
+
+    def chunks(self, path):
+        """Chunk hashes of path; the file is only read if it changed since it was last hashed."""
+        path = str(path)
+        st = os.stat(path)
+        key = (st.st_ino, st.st_size, st.st_mtime_ns)
+        with self._lock:
+            entry = self.files.get(path)
+            if entry is None and key in self._by_inode:
+                entry = self.files.get(self._by_inode[key])
+            if entry and self._inode_key(entry) == key:
+                if path not in self.files:
+                    self.files[path] = entry
+                    self._by_inode[key] = path
+                    self._dirty = True
+                return entry["chunks"]
+        chunks = hash_chunks(path, self.chunk_size)
+        self._store(path, st, chunks)
+        return chunks
+
+    def record(self, path, chunks):
+        """Remember the hashes of a file just written, so it is not read back."""
+        self._store(str(path), os.stat(path), chunks)
+
+    def _store(self, path, st, chunks):
+        entry = {"size": st.st_size, "mtime_ns": st.st_mtime_ns, "ino": st.st_ino, "chunks": chunks}
+        with self._lock:
+            self.files[path] = entry
+            self._by_inode[self._inode_key(entry)] = path
+            self._dirty = True
+
+    def mark_synced(self, rel, info):
+        with self._lock:
+            self.synced[rel] = {"size": info["size"], "mtime_ns": info["mtime_ns"]}
+            self._dirty = True
+
+    def unmark_synced(self, rel):
+        with self._lock:
+            if self.synced.pop(rel, None) is not None:
+                self._dirty = True
+
+    def prune(self):
+        """Drop entries of files that no longer exist."""
+        with self._lock:
+            gone = [p for p in self.files if not os.path.exists(p)]
+            for path in gone:
+                entry = self.files.pop(path)
+                if self._by_inode.get(self._inode_key(entry)) == path:
+                    del self._by_inode[self._inode_key(entry)]
+            if gone:
+                self._dirty = True
+
+    def maybe_save(self):
+        """Save at most every SAVE_SECONDS, so a long first hashing run is not lost on a restart."""
+        if time.monotonic() - self._last_save >= SAVE_SECONDS:
+            self.save()
+
+    def save(self):
+        with self._lock:
+            if not self._dirty:
+                return
+            data = {"chunk_size": self.chunk_size, "files": dict(self.files), "synced": dict(self.synced)}
+            self._dirty = False
+            self._last_save = time.monotonic()
+        tmp = self.path.with_name(f".{self.path.name}.tmp")
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(data, f, separators=(",", ":"))
+            os.replace(tmp, self.path)
+        except OSError as exc:
+            _log(f"manifest save failed: {self.path} :: {exc}")
+            with self._lock:
+                self._dirty = True
+
+
+class LocalSource:
+    """A source directory (USB disk, NAS mount). Its files are hashed only when they need to be."""
+
+    def __init__(self, root, cache, bucket=None):
+        self.root = Path(root)
+        self.cache = cache
+        self.bucket = bucket
+
+    def __str__(self):
+        return str(self.root)
+
+    def path_for(self, rel):
+        """Path of a "Collection/name" from a manifest, refusing anything outside the collections."""
+        parts = rel.split("/")
+        if len(parts) != 2 or any(not p or p.startswith(".") for p in parts) or not is_video_name(parts[1]):
+            raise SyncError(f"not a collection file: {rel}")
+        return self.root / parts[0] / parts[1]
+
+    def files(self, collections=None, with_chunks=False):
+        if not self.root.is_dir():
+            raise SyncError(f"source not available: {self.root}")
+        files = {}
+        for rel, path in list_collection_files(self.root, collections).items():
+            try:
+                st = os.stat(path)
+                files[rel] = {"size": st.st_size, "mtime_ns": st.st_mtime_ns}
+                if with_chunks:
+                    files[rel]["chunks"] = self.cache.chunks(path)
+                    self.cache.maybe_save()
+            except OSError as exc:
+                _log(f"cannot read {path} :: {exc}")
+                files.pop(rel, None)
+        return files
+
+    def chunks(self, rel, info):
+        if "chunks" not in info:
+            info["chunks"] = self.cache.chunks(self.path_for(rel))
+        return info["chunks"]
+
+    def read(self, rel, first, count, info, chunk_size=CHUNK_SIZE):
+        """Yield chunks first .. first+count-1 of rel."""
+        with open(self.path_for(rel), "rb") as f:
+            f.seek(first * chunk_size)
+            for _ in range(count):
+                data = _read(f, chunk_size, self.bucket)
+                if not data:
+                    raise SyncError(f"{rel} is shorter on the source than its manifest says")
+                yield data
+
+    def close(self):
+        pass
+
+
+class HttpSource:
+    """Another machine running `python3 -m sync.worker serve`, read with Range requests over keep-alive connections."""
+
+    def __init__(self, url, bucket=None, pool=None, stop=None):
+        self.url = url.rstrip("/")
+        self.bucket = bucket
+        self.pool = pool or ConnectionPool()
+        self.stop = stop or threading.Event()
+
+    def __str__(self):
+        return self.url
+
+    def files(self, collections=None):
+        deadline = time.monotonic() + MANIFEST_READY_TIMEOUT
+        while True:
+            with self.pool.open(f"{self.url}/manifest") as resp:
+                body = resp.read()
+                status, retry_after = resp.status, resp.getheader("Retry-After")
+            if status == 200:
+                break
+            if status != 503:
+                raise SyncError(f"{self.url}/manifest: HTTP {status}")
+            # The server is still hashing its files (first run on a big library).
+            try:
+                delay = min(300.0, max(1.0, float(retry_after)))
+            except (TypeError, ValueError):
+                delay = RETRY_AFTER_SECONDS
+            if time.monotonic() + delay > deadline:
+                raise SyncError(f"{self.url}/manifest: still not ready after {MANIFEST_READY_TIMEOUT // 3600} h")
+            _log(f"{self.url} is still hashing its files; asking again in {delay:.0f}s")
+            if self.stop.wait(delay):
+                raise SyncError("stopped while waiting for the manifest")
+        try:
+            data = json.loads(body)
+        except ValueError as exc:
+            raise SyncError(f"{self.url}/manifest: {exc}") from exc
+        if data.get("chunk_size") != CHUNK_SIZE:
+            raise SyncError(f"{self.url} uses {data.get('chunk_size')} byte chunks, expected {CHUNK_SIZE}")
+        return {rel: info for rel, info in data.get("files", {}).items() if _in_collections(rel, collections)}
+
+    def chunks(self, rel, info):
+        return info["chunks"]
+
+    def read(self, rel, first, count, info, chunk_size=CHUNK_SIZE):
+        start = first * chunk_size
+        end = min(info["size"], (first + count) * chunk_size) - 1
+        headers = {"Range": f"bytes={start}-{end}"}
+        with self.pool.open(f"{self.url}/files/{quote(rel)}", headers) as resp:
+            if resp.status != 206:
+                raise SyncError(f"{rel}: HTTP {resp.status} for bytes {start}-{end}")
+            for _ in range(count):
+                data = _read(resp, chunk_size, self.bucket)
+                if not data:
+                    raise SyncError(f"{rel}: connection ended at chunk {first}")
+                yield data
+
+    def close(self):
+        self.pool.close()
+
+
+def make_source(spec, cache, bucket=None, stop=None):
+    if spec.startswith(("http://", "https://")):
+        return HttpSource(spec, bucket, stop=stop)
+    return LocalSource(spec, cache, bucket)
+
+
+class SyncEngine:
+    """Brings dest_root's collections in line with the source, fetching only chunks not found locally.
+
+    Per source file: unchanged files (same size and mtime as last synced)
+    are skipped without hashing; a synced file that disappeared from the
+    source under another name with the same content is renamed; anything
+    else is assembled in a hidden .name.sync-part next to the target from
+    chunks already in that part (a resumed transfer), chunks of any file
+    under dest_root and, last, chunks read from the source. Every chunk is
+    checked against its hash before it is written.
+    """
+
+    def __init__(self, source, dest_root, cache, collections=None, delete=True, stop=None):
+        self.source = source
+        self.dest_root = Path(dest_root)
+        self.cache = cache
+        self.collections = list(collections or [])
+        self.delete = delete
+        self.stop = stop or threading.Event()
+        self._index = None
+        self._spares = None
+
+    def run(self):
+        started = time.monotonic()
+        stats = dict.fromkeys(("files", "unchanged", "renamed", "copied", "fetched", "reused", "resumed", "deleted", "skipped", "failed"), 0)
+        files = self.source.files(self.collections)
+        stats["files"] = len(files)
+        self._index = None
+        self._spares = None
+        for rel in sorted(files):
+            if self.stop.is_set():
+                break
+            try:
+                self._sync_file(rel, files[rel], files, stats)
+            except (OSError, http.client.HTTPException, SyncError) as exc:
+                stats["failed"] += 1
+                _log(f"sync failed: {rel} :: {exc}")
+            self.cache.maybe_save()
+        if not self.stop.is_set():
+            self._clean_up(files, stats)
+        self.cache.prune()
+        self.cache.save()
+        _log(
+            f"sync from {self.source}: {stats['files']} files, {stats['unchanged']} unchanged, {stats['copied']} copied, "
+            f"{stats['renamed']} renamed, {stats['deleted']} deleted, {stats['skipped']} skipped, {stats['failed']} failed; "
+            f"{stats['fetched'] / 1e6:.1f} MB fetched, {stats['reused'] / 1e6:.1f} MB reused locally, "
+            f"{stats['resumed'] / 1e6:.1f} MB resumed in {time.monotonic() - started:.1f}s"
+        )
+        return stats
+
+    def _sync_file(self, rel, info, files, stats):
+        target = self.dest_root / rel
+        synced = self.cache.synced.get(rel)
+        try:
+            st = os.stat(target)
+        except FileNotFoundError:
+            st = None
+        if st is not None and synced and synced["mtime_ns"] == info["mtime_ns"] and st.st_size == synced["size"] == info["size"]:
+            stats["unchanged"] += 1
+            return
+        chunks = self.source.chunks(rel, info)
+        if st is not None:
+            if self.cache.chunks(target) == chunks:
+                # Same content copied by other means (Samba, send-to-pi.sh): adopt it.
+                self.cache.mark_synced(rel, info)
+                stats["unchanged"] += 1
+                return
+            if not synced:
+                _log(f"skipped {rel}: a different file with that name exists that sync did not create")
+                stats["skipped"] += 1
+                return
+        spare = self._spare_files(files).pop(tuple(chunks), None) if st is None else None
+        if spare is not None:
+            old = self.dest_root / spare
+            target.parent.mkdir(parents=True, exist_ok=True)
+            os.replace(old, target)
+            self.cache.unmark_synced(spare)
+            self.cache.record(target, chunks)
+            self.cache.mark_synced(rel, info)
+            if self._index is not None:
+                self._add_to_index(target, chunks)
+            stats["renamed"] += 1
+            _log(f"renamed {spare} -> {rel}")
+            return
+        self._assemble(rel, info, chunks, target, stats)
+        self.cache.mark_synced(rel, info)
+        stats["copied"] += 1
+
+    def _spare_files(self, files):
+        """{chunk hashes: rel} of synced files that are no longer on the source (rename candidates)."""
+        if self._spares is None:
+            self._spares = {}
+            for rel in list(self.cache.synced):
+                if rel in files:
+                    continue
+                try:
+                    self._spares.setdefault(tuple(self.cache.chunks(self.dest_root / rel)), rel)
+                except OSError:
+                    continue
+        return self._spares
+
+    def _local_index(self):
+        """{chunk hash: (path, index)} over every video file under dest_root, built on first use."""
+        if self._index is None:
+            self._index = {}
+            try:
+                paths = list_collection_files(self.dest_root).values()
+            except OSError:
+                paths = []
+            for path in paths:
+                try:
+                    self._add_to_index(path, self.cache.chunks(path))
+                except OSError:
+                    continue
+                self.cache.maybe_save()
+        return self._index
+
+    def _add_to_index(self, path, chunks):
+        for idx, digest in enumerate(chunks):
+            self._index[digest] = (str(path), idx)
+
+    def _local_chunk(self, digest, length):
+        found = self._local_index().get(digest)
+        if found is None:
+            return None
+        path, idx = found
+        try:
+            with open(path, "rb") as f:
+                f.seek(idx * self.cache.chunk_size)
+                data = f.read(length)
+        except OSError:
+            return None
+        return data if len(data) == length and hashlib.sha256(data).hexdigest() == digest else None
+
+    def _assemble(self, rel, info, chunks, target, stats):
+        size = info["size"]
+        chunk_size = self.cache.chunk_size
+        part = target.with_name(f".{target.name}{PART_SUFFIX}")
+        target.parent.mkdir(parents=True, exist_ok=True)
+        with open(part, "r+b" if part.exists() else "w+b") as out:
+            have = os.fstat(out.fileno()).st_size
+            missing = []
+            for idx, digest in enumerate(chunks):
+                start = idx * chunk_size
+                length = min(chunk_size, size - start)
+                if start + length <= have:
+                    out.seek(start)
+                    if hashlib.sha256(out.read(length)).hexdigest() == digest:
+                        stats["resumed"] += length
+                        continue
+                missing.append(idx)
+            remote = []
+            for idx in missing:
+                length = min(chunk_size, size - idx * chunk_size)
+                data = self._local_chunk(chunks[idx], length)
+                if data is None:
+                    remote.append(idx)
+                    continue
+                out.seek(idx * chunk_size)
+                out.write(data)
+                stats["reused"] += length
+            for first, count in _runs(remote):
+                for idx, data in enumerate(self.source.read(rel, first, count, info, chunk_size), first):
+                    if hashlib.sha256(data).hexdigest() != chunks[idx]:
+                        raise SyncError(f"chunk {idx} changed on the source during the transfer")
+                    out.seek(idx * chunk_size)
+                    out.write(data)
+                    stats["fetched"] += len(data)
+                    if self.stop.is_set():
+                        raise SyncError("stopped; the transfer resumes on the next run")
+            out.truncate(size)
+            out.flush()
+            os.fsync(out.fileno())
+        os.replace(part, target)
+        os.utime(target, ns=(info["mtime_ns"], info["mtime_ns"]))
+        self.cache.record(target, chunks)
+        if self._index is not None:
+            self._add_to_index(target, chunks)
+        _log(f"synced {rel} ({size / 1e6:.1f} MB, {len(remote)}/{len(chunks)} chunks fetched)")
+
+    def _clean_up(self, files, stats):
+        """Delete synced files that left the source (if enabled) and parts of files that did.
+
+        Collections the source lists no files in are left alone: their folder
+        is more likely missing, unreadable or an unmounted share than emptied.
+        """
+        listed = {rel.split("/", 1)[0] for rel in files}
+        kept = set()
+        for rel in list(self.cache.synced):
+            if rel in files or not _in_collections(rel, self.collections):
+                continue
+            path = self.dest_root / rel
+            if not path.exists():
+                self.cache.unmark_synced(rel)
+                continue
+            if not self.delete:
+                continue
+            collection = rel.split("/", 1)[0]
+            if collection not in listed:
+                kept.add(collection)
+                continue
+            try:
+                path.unlink()
+            except OSError as exc:
+                _log(f"delete failed: {rel} :: {exc}")
+                continue
+            self.cache.unmark_synced(rel)
+            stats["deleted"] += 1
+            _log(f"deleted {rel} (gone from the source)")
+        if kept:
+            _log(f"source lists no files in {', '.join(sorted(kept))}; not deleting anything there")
+        for collection in {rel.split("/", 1)[0] for rel in files}:
+            try:
+                entries = list(os.scandir(self.dest_root / collection))
+            except OSError:
+                continue
+            for entry in entries:
+                name = entry.name
+                if name.startswith(".") and name.endswith(PART_SUFFIX):
+                    if f"{collection}/{name[1:-len(PART_SUFFIX)]}" not in files:
+                        try:
+                            os.unlink(entry.path)
+                        except OSError:
+                            pass
+
+
+def run_sync(cfg, stop=None, source=None, dest=None, collections=None, manifest=None):
+    """One pass with the sync options from cfg (overridden by the arguments); returns the stats or None."""
+    opts = cfg["sync"]
+    source = source or opts.get("source")
+    if not source:
+        _log("sync.source is not set")
+        return None
+    bucket = TokenBucket(float(opts.get("bandwidth_kbps", 0) or 0) * 1000 / 8)
+    cache = HashCache(manifest or opts.get("manifest_path", DEFAULT_MANIFEST_PATH))
+    src = make_source(source, cache, bucket, stop)
+    engine = SyncEngine(
+        src,
+        dest or cfg["media_root"],
+        cache,
+        collections=opts.get("collections") if collections is None else collections,
+        delete=opts.get("delete", True),
+        stop=stop,
+    )
+    try:
+        return engine.run()
+    except (OSError, http.client.HTTPException, SyncError) as exc:
+        _log(f"sync from {src} failed :: {exc}")
+        cache.save()
+        return None
+    finally:
+        src.close()
+
+
+class ManifestBuilder:
+    """The served manifest, built on a background thread, one build at a time.
+
+    Every request asks for a rebuild that starts after it arrived, so renames
+    on the source show up at once; with the hashes cached that is only a
+    directory walk and the request waits up to MANIFEST_WAIT for it. Hashing
+    a large tree for the first time takes far longer than a client waits for
+    a response, so until the build is done get() returns None and the
+    handler answers 503 with Retry-After. Concurrent requests share builds.
+    """
+
+    def __init__(self, source):
+        self.source = source
+        self._cond = threading.Condition()
+        self._body = None
+        self._error = None
+        self._requested = 0
+        self._completed = 0
+        self._building = False
+
+    def _request(self):
+        self._requested += 1
+        if not self._building:
+            self._building = True
+            threading.Thread(target=self._build, name="manifest", daemon=True).start()
+        return self._requested
+
+    def start(self):
+        with self._cond:
+            self._request()
+
+    def _build(self):
+        while True:
+            with self._cond:
+                target = self._requested
+            started = time.monotonic()
+            body, error = None, None
+            try:
+                files = self.source.files(with_chunks=True)
+                self.source.cache.save()
+                body = json.dumps({"chunk_size": CHUNK_SIZE, "files": files}).encode("utf-8")
+                if self._body is None:
+                    _log(f"manifest ready: {len(files)} files in {time.monotonic() - started:.1f}s")
+            except (OSError, SyncError) as exc:
+                error = str(exc)
+                _log(f"manifest build failed :: {exc}")
+            with self._cond:
+                self._body, self._error = body, error
+                self._completed = target
+                self._cond.notify_all()
+                if self._requested == target:
+                    self._building = False
+                    return
+
+    def get(self, wait=MANIFEST_WAIT):
+        """The manifest as JSON bytes, or None while it is still being built."""
+        with self._cond:
+            target = self._request()
+            if not self._cond.wait_for(lambda: self._completed >= target, wait):
+                return None
+            if self._body is None:
+                raise SyncError(self._error or "manifest unavailable")
+            return self._body
+
+
+class _ServeHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_version = "crt-kitchen-tv-sync"
+
+    def do_GET(self):
+        path = unquote(urlsplit(self.path).path)
+        source = self.server.source
+        try:
+            if path == "/manifest":
+                try:
+                    body = self.server.manifest.get()
+                except SyncError as exc:
+                    self._respond(500, f"{exc}\n".encode("utf-8"))
+                    return
+                if body is None:
+                    self._respond(503, b"still hashing, try again later\n", headers={"Retry-After": str(RETRY_AFTER_SECONDS)})
+                else:
+                    self._respond(200, body, "application/json")
+            elif path.startswith("/files/"):
+                self._send_file(source.path_for(path[len("/files/"):]))
+            else:
+                self._respond(404, b"not found\n")
+        except SyncError as exc:
+            self._respond(404, f"{exc}\n".encode("utf-8"))
+        except FileNotFoundError:
+            self._respond(404, b"not found\n")
+
+    def _respond(self, status, body, content_type="text/plain; charset=utf-8", headers=None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_file(self, path):
+        with open(path, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            start, end = 0, size - 1
+            status = 200
+            spec = self.headers.get("Range", "")
+            if spec:
+                try:
+                    first, _, last = spec.removeprefix("bytes=").partition("-")
+                    start = int(first)
+                    end = min(int(last), size - 1) if last else size - 1
+                except ValueError:
+                    start, end = size, 0
+                if start > end or start >= size:
+                    self._respond(416, b"", headers={"Content-Range": f"bytes */{size}"})
+                    return
+                status = 206
+            self.send_response(status)
+            self.send_header("Content-Type", "application/octet-stream")
+            self.send_header("Content-Length", str(end - start + 1))
+            if status == 206:
+                self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+            self.end_headers()
+            f.seek(start)
+            remaining = end - start + 1
+            while remaining > 0:
+                data = f.read(min(READ_SIZE, remaining))
+                if not data:
+                    break
+                self.wfile.write(data)
+                remaining -= len(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # A client that stops mid-transfer resumes later; that is not worth a traceback.
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+def serve(root, listen=DEFAULT_LISTEN, manifest=DEFAULT_SERVE_MANIFEST):
+    """Share root's collections (manifest with chunk hashes, Range reads) for other machines to sync from."""
+    host, _, port = listen.rpartition(":")
+    server = _Server((host or "0.0.0.0", int(port)), _ServeHandler)
+    server.source = LocalSource(root, HashCache(manifest))
+    server.manifest = ManifestBuilder(server.source)
+    server.manifest.start()
+    _log(f"serving {root} on http://{host or '0.0.0.0'}:{server.server_address[1]}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        server.source.cache.save()
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    sub = parser.add_subparsers(dest="command")
+    once = sub.add_parser("once", help="one pass, then exit")
+    once.add_argument("--source", help="directory or http://host:port of `serve` (default: sync.source)")
+    once.add_argument("--dest", help="destination root (default: media_root)")
+    once.add_argument("--collections", help="comma separated (default: sync.collections, else all)")
+    once.add_argument("--manifest", help="hash manifest (default: sync.manifest_path)")
+    share = sub.add_parser("serve", help="share DIR's collections with machines that sync from it")
+    share.add_argument("root")
+    share.add_argument("--listen", default=DEFAULT_LISTEN, help="host:port")
+    share.add_argument("--manifest", default=DEFAULT_SERVE_MANIFEST)
+    args = parser.parse_args(argv)
+
+    if args.command == "serve":
+        return serve(args.root, args.listen, args.manifest)
+    cfg = load_config()
+    if args.command == "once":
+        collections = [c.strip() for c in args.collections.split(",") if c.strip()] if args.collections else None
+        stats = run_sync(cfg, source=args.source, dest=args.dest, collections=collections, manifest=args.manifest)
+        return 0 if stats is not None and not stats["failed"] else 1
+    opts = cfg["sync"]
+    if not opts.get("enabled", False):
+        _log("sync disabled in config; exiting")
+        return 0
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stop.set())
+    signal.signal(signal.SIGINT, lambda *_: stop.set())
+    interval = max(60.0, float(opts.get("interval_minutes", 360)) * 60)
+    _log(f"sync started: source={opts.get('source')} every {interval / 60:.0f} min")
+    while not stop.is_set():
+        run_sync(cfg, stop)
+        stop.wait(interval)
+    _log("sync stopping")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,44 @@
+import os
+import tempfile
+import threading
+import unittest
+
+from ui.watch import DirWatcher
+
+
+class DirWatcherTest(unittest.TestCase):
+    def setUp(self):
+        self.events = []
+        self.changed = threading.Event()
+        self.watcher = DirWatcher(self._record, poll_interval=0.1)
+        if not self.watcher.uses_inotify:
+            self.watcher.stop()
+            self.skipTest("inotify is not available")
+        self.addCleanup(self.watcher.stop)
+
+    def _record(self, key, name, kind):
+        self.events.append((key, name, kind))
+        self.changed.set()
+
+    def _touch(self, folder, name):
+        with open(os.path.join(folder, name), "wb"):
+            pass
+
+    def test_readding_a_key_moves_its_watch(self):
+        with tempfile.TemporaryDirectory() as old, tempfile.TemporaryDirectory() as new:
+            self.watcher.add("movies", old)
+            self.watcher.add("movies", new)
+            self.watcher.start()
+            self._touch(old, "stale.mp4")
+            self._touch(new, "fresh.mp4")
+            self.assertTrue(self.changed.wait(5))
+            # Give a stale event from the old folder time to arrive too.
+            self.watcher._stop.wait(0.3)
+            names = {name for key, name, _kind in self.events if key == "movies"}
+            self.assertIn("fresh.mp4", names)
+            self.assertNotIn("stale.mp4", names)
+            self.assertEqual(len(self.watcher._watched), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,165 @@
+import copy
+import fcntl
+import json
+import os
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+
+import yaml
+
+DEFAULT_CONFIG_PATH = "/etc/crt-kitchen-tv/config.yaml"
+
+
+class ConfigConflict(Exception):
+    """The config changed since the version the caller based its edit on."""
+
+    def __init__(self, version):
+        super().__init__(f"config is at version {version}")
+        self.version = version
+
+
+class ConfigStore:
+    """The YAML config shared by the web service, the UI and ingest.
+
+    Writes go to a temp file that is fsync'ed and renamed over config.yaml
+    while holding an flock, so readers never see a half-written file and two
+    saves cannot interleave. Every change bumps an integer version kept next
+    to the file (.config.yaml.version); edits made by hand are noticed by
+    their stat and bumped as well. Reads are served from memory until the
+    file's stat changes.
+    """
+
+    def __init__(self, path=None):
+        self.path = Path(path or os.environ.get("CRT_CONFIG", DEFAULT_CONFIG_PATH))
+        self.lock_path = self.path.with_name(f".{self.path.name}.lock")
+        self.version_path = self.path.with_name(f".{self.path.name}.version")
+        self._mutex = threading.Lock()
+        self._cached = None
+        self._cached_stat = None
+        self._version = 0
+
+    def _stat_key(self):
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return [st.st_ino, st.st_size, st.st_mtime_ns]
+
+    @contextmanager
+    def _flock(self):
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            fd = os.open(self.lock_path, os.O_RDWR | os.O_CREAT, 0o664)
+        except OSError:
+            # Read-only config dir: nobody can write here either, so nothing to serialise against.
+            yield
+            return
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            yield
+        finally:
+            os.close(fd)
+
+    def _read_version_file(self):
+        try:
+            with open(self.version_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            return int(data.get("version", 0)), data.get("stat")
+        except (OSError, ValueError, AttributeError):
+            return 0, None
+
+    def _write_atomic(self, path, text):
+        tmp = path.with_name(f".{path.name}.tmp.{os.getpid()}")
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(text)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+
+    def _write_version_file(self, version, stat_key):
+        try:
+            self._write_atomic(self.version_path, json.dumps({"version": version, "stat": stat_key}))
+        except OSError:
+            pass
+
+    def _read_file(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = yaml.safe_load(f) or {}
+        except FileNotFoundError:
+            data = {}
+        return data if isinstance(data, dict) else {}
+
+    def _refresh(self, locked=False):
+        """Reload from disk if the file changed; caller holds self._mutex (and the flock if locked)."""
+        stat_key = self._stat_key()
+        if self._cached is not None and stat_key == self._cached_stat:
+            return
+        version, recorded = self._read_version_file()
+        if stat_key is not None and recorded != stat_key:
+            # Changed behind our back (hand edit, older writer): give it a version of its own.
+            if locked:
+                version, stat_key = self._bump_external()
+            else:
+                with self._flock():
+                    version, stat_key = self._bump_external()
+        self._cached = self._read_file()
+        self._cached_stat = stat_key
+        self._version = max(version, self._version)
+
+    def _bump_external(self):
+        version, recorded = self._read_version_file()
+        stat_key = self._stat_key()
+        if stat_key is not None and recorded != stat_key:
+            version += 1
+            self._write_version_file(version, stat_key)
+        return version, stat_key
+
+    def load(self):
+        """Return (config dict, version). The dict is a copy the caller may modify."""
+        with self._mutex:
+            self._refresh()
+            return copy.deepcopy(self._cached), self._version
+
+    @property
+    def version(self):
+        with self._mutex:
+            self._refresh()
+            return self._version
+
+    def etag(self, version=None):
+        """Entity tag (unquoted) for a version; parse_etag() reverses it."""
+        return f"cfg-{self.version if version is None else version}"
+
+    @staticmethod
+    def parse_etag(tag):
+        try:
+            return int(str(tag).strip('"').rsplit("-", 1)[-1])
+        except ValueError:
+            return None
+
+    def update(self, changes, validate=None, expected_version=None):
+        """Merge changes into the config and save it.
+
+        validate(merged) returns a list of error strings; when it is non-empty
+        nothing is written. With expected_version set, ConfigConflict is raised
+        if someone else saved in between. Returns (config, version, errors).
+        """
+        with self._mutex, self._flock():
+            self._cached = None
+            self._refresh(locked=True)
+            if expected_version is not None and expected_version != self._version:
+                raise ConfigConflict(self._version)
+            merged = copy.deepcopy(self._cached)
+            merged.update(changes)
+            errors = validate(merged) if validate is not None else []
+            if errors:
+                return merged, self._version, errors
+            self._write_atomic(self.path, yaml.safe_dump(merged))
+            stat_key = self._stat_key()
+            self._version += 1
+            self._write_version_file(self._version, stat_key)
+            self._cached = merged
+            self._cached_stat = stat_key
+            return copy.deepcopy(merged), self._version, []
@@ -1,25 +1,97 @@
+import os
+import re
 import subprocess
-import shlex
+import threading
+import time
 
 RESPEAKER_CARD_IDS = ["seeed-2mic-voicecard", "seeedvoicecard"]
+ASOUND_DIR = "/proc/asound"
+SND_DEV_DIR = "/dev/snd"
+# " 1 [seeed2micvoicec]: seeed-2mic-voi - seeed-2mic-voicecard"
+CARD_LINE = re.compile(r"^\s*(\d+)\s+\[([^\]]+?)\s*\]")
+# Repeats of the same volume are only skipped this soon after the last set (one burst of steps);
+# later, something else (alsamixer, a reset after hotplug) may have changed it.
+REPEAT_SECONDS = 0.5
 
 
-def detect_respeaker_card():
-    try:
-        out = subprocess.check_output(["cat", "/proc/asound/cards"], text=True)
-    except Exception:
+class AudioRegistry:
+    """Sound cards from /proc/asound/cards and the mpv device resolved per audio_output.
+
+    The cards file is read once and re-read only when the card list changes:
+    every lookup compares a cheap signature (the /proc/asound entries and the
+    /dev/snd mtime, both updated on hotplug) with the one the cache was built
+    from. No process is forked.
+    """
+
+    def __init__(self, asound_dir=ASOUND_DIR, dev_dir=SND_DEV_DIR):
+        self.asound_dir = asound_dir
+        self.dev_dir = dev_dir
+        self._lock = threading.RLock()
+        self._signature = None
+        self._cards = []
+        self._devices = {}
+
+    def _current_signature(self):
+        try:
+            entries = tuple(sorted(os.listdir(self.asound_dir)))
+        except OSError:
+            entries = None
+        try:
+            dev_mtime = os.stat(self.dev_dir).st_mtime_ns
+        except OSError:
+            dev_mtime = None
+        return entries, dev_mtime
+
+    def _refresh(self):
+        signature = self._current_signature()
+        if signature == self._signature:
+            return
+        cards = []
+        try:
+            with open(os.path.join(self.asound_dir, "cards"), "r", encoding="utf-8") as f:
+                for line in f:
+                    match = CARD_LINE.match(line)
+                    if match:
+                        cards.append((int(match.group(1)), match.group(2), line.strip()))
+        except OSError:
+            pass
+        self._cards = cards
+        self._devices = {}
+        self._signature = signature
+
+    def cards(self):
+        """[(index, id, line)] of the cards ALSA currently knows."""
+        with self._lock:
+            self._refresh()
+            return list(self._cards)
+
+    def respeaker_card(self):
+        for _index, card_id, line in self.cards():
+            lower = line.lower()
+            for card in RESPEAKER_CARD_IDS:
+                if card in lower:
+                    return card_id
         return None
-    for line in out.splitlines():
-        lower = line.lower()
-        for card in RESPEAKER_CARD_IDS:
-            if card in lower:
-                return card
-    return None
 
+    def device_for(self, output_pref):
+        with self._lock:
+            self._refresh()
+            if output_pref not in self._devices:
+                self._devices[output_pref] = _resolve_device(output_pref, self)
+            return self._devices[output_pref]
 
-def audio_device_for(output_pref):
+    def invalidate(self):
+        with self._lock:
+            self._signature = None
+
+    def signature(self):
+        """Cheap token that changes whenever a card is added or removed."""
+        return self._current_signature()
+
+
+def _resolve_device(output_pref, registry):
     if output_pref == "respeaker":
-        card = detect_respeaker_card()
+        card = registry.respeaker_card()
         if card:
             return f"alsa/plughw:CARD={card}"
     if output_pref == "hdmi":
@@ -29,11 +101,108 @@ def audio_device_for(output_pref):
     return "auto"
 
 
+registry = AudioRegistry()
+
+
+def detect_respeaker_card():
+    return registry.respeaker_card()
+
+
+def audio_device_for(output_pref):
+    return registry.device_for(output_pref)
+
+
+class Mixer:
+    """One long-lived handle for volume changes instead of an amixer process per step.
+
+    Uses pyalsaaudio when it is installed, otherwise a single `amixer -s`
+    session fed commands on stdin. Setting the volume it set within the last
+    REPEAT_SECONDS is a no-op; a card hotplug reopens the mixer.
+    """
+
+    def __init__(self, control="Master", card=None):
+        self.control = control
+        self.card = card
+        self._lock = threading.Lock()
+        self._alsa = None
+        self._proc = None
+        self._volume = None
+        self._set_at = 0.0
+        self._signature = None
+
+    def _open(self):
+        if self._alsa is not None or (self._proc is not None and self._proc.poll() is None):
+            return True
+        try:
+            import alsaaudio
+        except ImportError:
+            alsaaudio = None
+        if alsaaudio is not None:
+            try:
+                kwargs = {} if self.card is None else {"device": f"hw:{self.card}"}
+                self._alsa = alsaaudio.Mixer(self.control, **kwargs)
+                return True
+            except Exception:
+                self._alsa = None
+        cmd = ["amixer", "-q"] + ([] if self.card is None else ["-c", str(self.card)]) + ["-s"]
+        try:
+            self._proc = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, text=True)
+        except OSError:
+            self._proc = None
+            return False
+        return True
+
+    def set_volume(self, percent):
+        percent = max(0, min(100, int(percent)))
+        with self._lock:
+            signature = registry.signature()
+            if signature != self._signature:
+                # Cards came or went: the handle may point at the wrong card and the level was reset.
+                self._close()
+                self._signature = signature
+            if percent == self._volume and time.monotonic() - self._set_at < REPEAT_SECONDS:
+                return True
+            if not self._open():
+                return False
+            try:
+                if self._alsa is not None:
+                    self._alsa.setvolume(percent)
+                else:
+                    self._proc.stdin.write(f"sset {self.control} {percent}%\n")
+                    self._proc.stdin.flush()
+            except Exception:
+                self._close()
+                return False
+            self._volume = percent
+            self._set_at = time.monotonic()
+            return True
+
+    def _close(self):
+        if self._alsa is not None:
+            try:
+                self._alsa.close()
+            except Exception:
+                pass
+            self._alsa = None
+        if self._proc is not None:
+            try:
+                self._proc.stdin.close()
+                self._proc.wait(timeout=1)
+            except Exception:
+                self._proc.kill()
+            self._proc = None
+        self._volume = None
+
+    def close(self):
+        with self._lock:
+            self._close()
+
+
+_mixer = Mixer()
+
+
 def set_volume(percent):
-    try:
-        subprocess.run(["amixer", "sset", "Master", f"{int(percent)}%"], check=False)
-    except FileNotFoundError:
-        pass
+    return _mixer.set_volume(percent)
 
 
 def build_mpv_args(output_pref):
@@ -0,0 +1,127 @@
+import queue
+import time
+
+BUTTON_GPIO = 17
+LONG_PRESS_SECONDS = 1.0
+JUMP_PRESS_SECONDS = 2.0
+DOUBLE_PRESS_SECONDS = 0.35
+MAX_EDGES = 64
+
+
+class GestureRecognizer:
+    """Turns press/release times (time.monotonic()) into gestures.
+
+    A release after less than long_press is a "short" press, unless a second
+    one follows within double_press, which makes it a "double". Holding for
+    long_press gives "long", for jump_press "jump". Not thread-safe; the UI
+    feeds it from its own loop.
+    """
+
+    def __init__(self, long_press=LONG_PRESS_SECONDS, jump_press=JUMP_PRESS_SECONDS, double_press=DOUBLE_PRESS_SECONDS):
+        self.long_press = long_press
+        self.jump_press = jump_press
+        self.double_press = double_press
+        self._pressed_at = None
+        self._short_at = None
+
+    def press(self, now):
+        gestures = self.expire(now)
+        self._pressed_at = now
+        return gestures
+
+    def release(self, now):
+        if self._pressed_at is None:
+            return []
+        held = now - self._pressed_at
+        self._pressed_at = None
+        # A second press that started inside the window is a double press, however long it took to let go.
+        pending = self._short_at is not None
+        self._short_at = None
+        if held >= self.jump_press:
+            return ["short", "jump"] if pending else ["jump"]
+        if held >= self.long_press:
+            return ["short", "long"] if pending else ["long"]
+        if pending:
+            return ["double"]
+        # Wait for a possible second press before calling it a short one.
+        self._short_at = now
+        return []
+
+    def expire(self, now):
+        """Gestures whose double-press window has run out by now."""
+        if self._short_at is not None and self._pressed_at is None and now - self._short_at >= self.double_press:
+            self._short_at = None
+            return ["short"]
+        return []
+
+    def deadline(self):
+        """Monotonic time by which expire() must be called again, or None."""
+        if self._short_at is None or self._pressed_at is not None:
+            return None
+        return self._short_at + self.double_press
+
+
+class ButtonInput:
+    """The front-panel button. open() imports gpiozero (slow on a Pi Zero), so the UI calls it off the main thread.
+
+    gpiozero callbacks only timestamp the edge into a bounded queue and call
+    wake() so an idle UI loop notices; poll() runs the recognizer on the UI
+    thread. A full queue drops new edges instead of blocking gpiozero.
+    """
+
+    def __init__(self, gpio_pin=BUTTON_GPIO, wake=None, recognizer=None):
+        self.gpio_pin = gpio_pin
+        self.wake = wake
+        self.recognizer = recognizer or GestureRecognizer()
+        self.edges = queue.Queue(MAX_EDGES)
+        self._enabled = False
+        self.button = None
+
+    def open(self):
+        try:
+            from gpiozero import Button
+        except ImportError:
+            return False
+        try:
+            self.button = Button(self.gpio_pin, pull_up=True, bounce_time=0.05)
+            self.button.when_pressed = self._on_press
+            self.button.when_released = self._on_release
+            self._enabled = True
+        except Exception:
+            self.button = None
+        return self._enabled
+
+    def _post(self, edge):
+        try:
+            self.edges.put_nowait((edge, time.monotonic()))
+        except queue.Full:
+            return
+        if self.wake is not None:
+            try:
+                self.wake()
+            except Exception:
+                pass
+
+    def _on_press(self):
+        self._post("press")
+
+    def _on_release(self):
+        self._post("release")
+
+    def poll(self, now=None):
+        """Gestures completed since the last call, oldest first."""
+        gestures = []
+        while True:
+            try:
+                edge, at = self.edges.get_nowait()
+            except queue.Empty:
+                break
+            if edge == "press":
+                gestures.extend(self.recognizer.press(at))
+            else:
+                gestures.extend(self.recognizer.release(at))
+        gestures.extend(self.recognizer.expire(time.monotonic() if now is None else now))
+        return gestures
+
+    def deadline(self):
+        return self.recognizer.deadline()
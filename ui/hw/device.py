@@ -21,3 +21,56 @@ def has_respeaker_hat():
         pass
 
     return False
+
+
+_MODEL_CACHE = {}
+
+# Stream budgets per board; the Zero (single-core ARMv6, software decode) gets
+# the smallest variant that is still watchable on a 576i CRT. Codecs are
+# matched by prefix, so "avc" covers both avc1 and avc3 H.264.
+CAPABILITY_PROFILES = {
+    "zero": {"max_bandwidth": 800000, "max_height": 360, "max_fps": 30, "codecs": ["avc"]},
+    "3": {"max_bandwidth": 2500000, "max_height": 576, "max_fps": 30, "codecs": ["avc"]},
+    "4": {"max_bandwidth": 6000000, "max_height": 1080, "max_fps": 60, "codecs": ["avc", "hvc1", "hev1"]},
+    "unknown": {"max_bandwidth": None, "max_height": None, "max_fps": None, "codecs": None},
+}
+
+
+def pi_model(model_path="/proc/device-tree/model"):
+    """Return "zero", "3", "4" (Pi 5/CM4 count as "4") or "unknown".
+
+    Pi 1, Pi 2 and CM1 get "zero": they are no faster than a Zero.
+    """
+    if model_path in _MODEL_CACHE:
+        return _MODEL_CACHE[model_path]
+    try:
+        with open(model_path, "rb") as f:
+            model = f.read().decode(errors="ignore").strip("\0").lower()
+    except (FileNotFoundError, PermissionError):
+        model = ""
+    if "zero 2" in model:
+        kind = "3"  # Zero 2 W has the Pi 3's quad-core SoC
+    elif "zero" in model:
+        kind = "zero"
+    elif "raspberry pi 3" in model or "compute module 3" in model:
+        kind = "3"
+    elif any(tag in model for tag in ("raspberry pi 4", "raspberry pi 5", "compute module 4", "compute module 5")):
+        kind = "4"
+    elif "raspberry pi" in model:
+        kind = "zero"
+    else:
+        kind = "unknown"
+    _MODEL_CACHE[model_path] = kind
+    return kind
+
+
+def capability_profile(config=None):
+    """Stream budget for this board; config stream_profile / stream_budget override detection."""
+    config = config or {}
+    name = str(config.get("stream_profile", "auto")).lower()
+    if name not in CAPABILITY_PROFILES:
+        name = pi_model()
+    profile = dict(CAPABILITY_PROFILES[name])
+    profile.update(config.get("stream_budget") or {})
+    profile["name"] = name
+    return profile
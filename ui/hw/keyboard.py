@@ -0,0 +1,83 @@
+import glob
+import os
+import select
+import threading
+
+INPUT_GLOB = "/dev/input/event*"
+# Keyboards plugged in later are picked up within this long.
+RESCAN_SECONDS = 5.0
+
+
+class InputWatcher:
+    """Calls wake() whenever an evdev input device (keyboard, remote) has events.
+
+    SDL reads these devices itself on kmsdrm/fbdev, but there its event.wait()
+    can only poll. This thread blocks in select() on its own file for each
+    device and drops what it reads (every open file gets its own copy of the
+    events), so the UI loop can sleep until a key is actually pressed.
+
+    polling_needed is True when a device exists that could not be opened
+    (e.g. not in the input group); the UI then falls back to polling SDL.
+    """
+
+    def __init__(self, wake, pattern=INPUT_GLOB):
+        self.wake = wake
+        self.pattern = pattern
+        self.polling_needed = False
+        self._fds = {}
+        self._stop = threading.Event()
+        self._stop_r, self._stop_w = os.pipe()
+        self._thread = None
+
+    def start(self):
+        self._rescan()
+        self._thread = threading.Thread(target=self._run, name="input-watch", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        os.write(self._stop_w, b"x")
+        if self._thread is not None:
+            self._thread.join(timeout=1)
+            self._thread = None
+        os.close(self._stop_r)
+        os.close(self._stop_w)
+
+    def _rescan(self):
+        paths = set(glob.glob(self.pattern))
+        for path in set(self._fds) - paths:
+            os.close(self._fds.pop(path))
+        failed = False
+        for path in paths - set(self._fds):
+            try:
+                self._fds[path] = os.open(path, os.O_RDONLY | os.O_NONBLOCK | os.O_CLOEXEC)
+            except OSError:
+                failed = True
+        self.polling_needed = failed
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                ready = set(select.select(list(self._fds.values()) + [self._stop_r], [], [], RESCAN_SECONDS)[0])
+            except (OSError, ValueError):
+                ready = set()
+            if self._stop.is_set():
+                break
+            active = False
+            for path, fd in list(self._fds.items()):
+                if fd not in ready:
+                    continue
+                try:
+                    active = bool(os.read(fd, 4096)) or active
+                except BlockingIOError:
+                    pass
+                except OSError:
+                    # Unplugged; a new device node is picked up by the next rescan.
+                    os.close(self._fds.pop(path))
+            if active:
+                self.wake()
+            else:
+                self._rescan()
+        for fd in self._fds.values():
+            os.close(fd)
+        self._fds = {}
@@ -0,0 +1,204 @@
+import math
+import threading
+import time
+
+DEFAULT_FPS = 30
+BREATHE_SECONDS = 2.5
+SPINNER_SECONDS = 0.9
+PROGRESS_STEPS = 8  # brightness steps per LED
+# Static frames are offered again this often, so LEDs opened after startup still light up.
+RECHECK_SECONDS = 1.0
+
+
+class Animation:
+    """Precomputed SPI frames (bytes) for one animation; loop=False stops on the last frame."""
+
+    def __init__(self, frames, loop=True, indexed=False):
+        self.frames = frames
+        self.loop = loop
+        # Indexed animations (progress) show the frame picked by a value instead of by time.
+        self.indexed = indexed
+
+    @property
+    def static(self):
+        return len(self.frames) == 1 or self.indexed
+
+
+def _scale(color, level):
+    return tuple(int(c * level) for c in color)
+
+
+class LedEngine:
+    """Drives the LEDs from its own thread so callers never wait on SPI.
+
+    Callers only describe what should be shown (off, solid, breathe, spinner,
+    progress, pulse); repeating the current request is a no-op. The thread
+    builds each animation's frames once with the driver's encode(), plays
+    them at no more than fps and lets the driver skip frames identical to
+    the last one sent. While nothing moves it sleeps until the next request.
+    """
+
+    def __init__(self, leds, fps=DEFAULT_FPS):
+        self.leds = leds
+        self.fps = max(1, min(60, int(fps)))
+        self._spec = ("off",)
+        self._value = None
+        self._overlay = None
+        self._dirty = True
+        self._cache = {}
+        self._next_leds = None
+        self._cond = threading.Condition()
+        self._stop = False
+        self._thread = None
+        self.writes = 0
+        self.skipped = 0
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="leds", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=1.0):
+        with self._cond:
+            self._stop = True
+            self._cond.notify()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        if self._next_leds is not None:
+            self._next_leds.close()
+        self.leds.off()
+        self.leds.close()
+
+    def use(self, leds):
+        """Switch to another driver (e.g. after leds_enabled changed).
+
+        The LED thread makes the swap: it turns off and closes the old driver
+        and opens the new one, so neither happens on the caller's thread nor
+        while a frame is being written.
+        """
+        with self._cond:
+            if self._next_leds is not None:
+                self._next_leds.close()
+            self._next_leds = leds
+            self._dirty = True
+            self._cond.notify()
+
+    def show(self, spec, value=None):
+        with self._cond:
+            if spec == self._spec and value == self._value:
+                return
+            self._spec = spec
+            self._value = value
+            self._dirty = True
+            self._cond.notify()
+
+    def off(self):
+        self.show(("off",))
+
+    def solid(self, r, g, b):
+        self.show(("solid", (r, g, b)))
+
+    def breathe(self, r, g, b, period=BREATHE_SECONDS):
+        self.show(("breathe", (r, g, b), period))
+
+    def spinner(self, r, g, b, period=SPINNER_SECONDS):
+        self.show(("spinner", (r, g, b), period))
+
+    def progress(self, fraction, r, g, b):
+        # Quantised to the frames that exist, so small progress changes do not wake the thread.
+        steps = self.leds.num_leds * PROGRESS_STEPS
+        self.show(("progress", (r, g, b)), round(max(0.0, min(1.0, float(fraction))) * steps))
+
+    def pulse(self, r, g, b, times=1, delay=0.15):
+        """Flash on top of the current animation, then go back to it."""
+        with self._cond:
+            self._overlay = {"spec": ("pulse", (r, g, b), times, delay), "started": None}
+            self._dirty = True
+            self._cond.notify()
+
+    def _build(self, spec, leds):
+        kind = spec[0]
+        n = leds.num_leds
+        if kind == "solid":
+            return Animation([leds.encode([spec[1]] * n)])
+        if kind == "breathe":
+            count = max(2, round(spec[2] * self.fps))
+            levels = [0.15 + 0.85 * (0.5 - 0.5 * math.cos(2 * math.pi * i / count)) for i in range(count)]
+            return Animation([leds.encode([_scale(spec[1], level)] * n) for level in levels])
+        if kind == "spinner":
+            count = max(n, round(spec[2] * self.fps))
+            frames = []
+            for i in range(count):
+                head = i * n / count
+                # Lit head with a fading tail behind it.
+                frames.append(leds.encode([_scale(spec[1], max(0.0, 1.0 - ((head - j) % n) / 2.0)) for j in range(n)]))
+            return Animation(frames)
+        if kind == "progress":
+            frames = []
+            for step in range(n * PROGRESS_STEPS + 1):
+                lit = step / PROGRESS_STEPS
+                frames.append(leds.encode([_scale(spec[1], max(0.0, min(1.0, lit - j))) for j in range(n)]))
+            return Animation(frames, indexed=True)
+        if kind == "pulse":
+            on = leds.encode([spec[1]] * n)
+            off = leds.encode([(0, 0, 0)] * n)
+            hold = max(1, round(spec[3] * self.fps))
+            return Animation(([on] * hold + [off] * hold) * max(1, spec[2]), loop=False)
+        return Animation([leds.encode([(0, 0, 0)] * n)])
+
+    def _animation(self, spec, leds):
+        anim = self._cache.get(spec)
+        if anim is None:
+            anim = self._cache[spec] = self._build(spec, leds)
+        return anim
+
+    def _run(self):
+        spec = None
+        started = 0.0
+        while True:
+            with self._cond:
+                if self._stop:
+                    return
+                self._dirty = False
+                old, new = self.leds, self._next_leds
+                if new is not None:
+                    self.leds, self._next_leds, self._cache = new, None, {}
+                leds = self.leds
+                overlay = self._overlay
+                base, value = self._spec, self._value
+            if new is not None:
+                old.off()
+                old.close()
+                new.open()
+            now = time.monotonic()
+            if overlay is not None:
+                if overlay["started"] is None:
+                    overlay["started"] = now
+                anim, value, anim_start = self._animation(overlay["spec"], leds), None, overlay["started"]
+            else:
+                if base != spec:
+                    spec = base
+                    started = now
+                anim, anim_start = self._animation(base, leds), started
+            if anim.indexed:
+                idx = min(value or 0, len(anim.frames) - 1)
+            else:
+                idx = int((now - anim_start) * self.fps)
+                if anim.loop:
+                    idx %= len(anim.frames)
+                elif idx >= len(anim.frames):
+                    # One-shot finished: continue with the animation below it.
+                    with self._cond:
+                        if self._overlay is overlay:
+                            self._overlay = None
+                    continue
+            if leds.write(anim.frames[idx]):
+                self.writes += 1
+            else:
+                self.skipped += 1
+            if anim.static:
+                timeout = RECHECK_SECONDS
+            else:
+                timeout = max(0.0, anim_start + (int((now - anim_start) * self.fps) + 1) / self.fps - time.monotonic())
+            with self._cond:
+                if not self._dirty and not self._stop:
+                    self._cond.wait(timeout)
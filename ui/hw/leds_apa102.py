@@ -1,50 +1,75 @@
-import time
-
-try:
-    import spidev
-except ImportError:  # running on dev machine
-    spidev = None
+START_FRAME = bytes(4)
+END_FRAME = b"\xff" * 4
 
 
 class Apa102Leds:
-    def __init__(self, enabled=True, num_leds=3, brightness=0.2):
-        self.enabled = bool(enabled) and spidev is not None
+    """APA102 LEDs on SPI bus 0.
+
+    With lazy=True nothing is imported or opened until open() is called
+    (the UI does that on a background thread during startup); until then
+    every call is a no-op. spi can be any object with spidev's writebytes2
+    or xfer2 and close, e.g. a fake for testing off the Pi.
+    """
+
+    def __init__(self, enabled=True, num_leds=3, brightness=0.2, lazy=False, spi=None):
+        self.enabled = False
+        self.wanted = bool(enabled)
         self.num_leds = num_leds
         self.brightness = brightness
-        if self.enabled:
-            try:
-                self.spi = spidev.SpiDev()
-                self.spi.open(0, 0)  # bus 0, device 0
-                self.spi.max_speed_hz = 8000000
-            except Exception:
-                self.enabled = False
-                self.spi = None
-        else:
-            self.spi = None
+        self.spi = None
+        self._last = None
+        if spi is not None and self.wanted:
+            self.spi = spi
+            self.enabled = True
+        elif not lazy:
+            self.open()
 
-    def _frame(self, r, g, b):
-        # APA102 frame: 0b111xxxxx brightness, then BGR
-        level = max(1, min(31, int(self.brightness * 31)))
-        return [0b11100000 | level, b & 0xFF, g & 0xFF, r & 0xFF]
+    def open(self):
+        if not self.wanted or self.spi is not None:
+            return self.enabled
+        try:
+            import spidev
+        except ImportError:  # running on dev machine
+            return False
+        try:
+            spi = spidev.SpiDev()
+            spi.open(0, 0)  # bus 0, device 0
+            spi.max_speed_hz = 8000000
+        except Exception:
+            return False
+        self.spi = spi
+        self.enabled = True
+        return True
 
-    def set_all(self, r, g, b):
-        if not self.enabled:
-            return
-        frames = [[0x00, 0x00, 0x00, 0x00]]
-        frames += [self._frame(r, g, b) for _ in range(self.num_leds)]
-        frames += [[0xFF, 0xFF, 0xFF, 0xFF]]
-        flat = [byte for frame in frames for byte in frame]
+    def encode(self, colors):
+        """Return the complete SPI frame (start frame, one LED frame per color, end frame) as bytes."""
+        # APA102 LED frame: 0b111xxxxx global brightness, then BGR.
+        level = 0b11100000 | max(1, min(31, int(self.brightness * 31)))
+        out = bytearray(START_FRAME)
+        for r, g, b in colors[: self.num_leds]:
+            out += bytes((level, int(b) & 0xFF, int(g) & 0xFF, int(r) & 0xFF))
+        for _ in range(self.num_leds - len(colors)):
+            out += bytes((level, 0, 0, 0))
+        out += END_FRAME
+        return bytes(out)
+
+    def write(self, frame):
+        """Send a frame from encode(); identical consecutive frames are not sent again."""
+        if not self.enabled or frame == self._last:
+            return False
         try:
-            self.spi.xfer2(flat)
+            if hasattr(self.spi, "writebytes2"):
+                self.spi.writebytes2(frame)
+            else:
+                self.spi.xfer2(list(frame))
         except Exception:
             self.enabled = False
+            return False
+        self._last = frame
+        return True
 
-    def pulse(self, r, g, b, times=1, delay=0.15):
-        for _ in range(times):
-            self.set_all(r, g, b)
-            time.sleep(delay)
-            self.set_all(0, 0, 0)
-            time.sleep(delay)
+    def set_all(self, r, g, b):
+        self.write(self.encode([(r, g, b)] * self.num_leds))
 
     def off(self):
         self.set_all(0, 0, 0)
@@ -55,3 +80,4 @@ class Apa102Leds:
                 self.spi.close()
             except Exception:
                 pass
+        self.enabled = False
@@ -0,0 +1,75 @@
+import json
+import os
+import time
+
+CHECK_SECONDS = 2.0
+# Same defaults as ingest/worker.py and downloads/worker.py.
+DEFAULT_INGEST_STATE = "/var/lib/crt-kitchen-tv/ingest-state.json"
+DEFAULT_DOWNLOADS_STATE = "/var/lib/crt-kitchen-tv/downloads-state.json"
+
+
+def job_state_paths(cfg):
+    ingest = cfg.get("ingest") or {}
+    downloads = cfg.get("downloads") or {}
+    paths = []
+    if ingest.get("enabled", True):
+        paths.append(ingest.get("state_path", DEFAULT_INGEST_STATE))
+    if downloads.get("enabled", True):
+        paths.append(downloads.get("state_path", DEFAULT_DOWNLOADS_STATE))
+    return paths
+
+
+class JobProgress:
+    """Average progress of the running ingest and download jobs, from their state files.
+
+    fraction() is cheap enough to call every frame: the state files are
+    stat'ed at most every interval seconds and only re-read when they
+    changed. Returns None while nothing is running.
+    """
+
+    def __init__(self, paths, interval=CHECK_SECONDS):
+        self.paths = [str(p) for p in paths if p]
+        self.interval = interval
+        self._checked = 0.0
+        self._mtimes = {}
+        self._jobs = {}
+        self._fraction = None
+
+    def due(self):
+        """Seconds until fraction() looks at the state files again."""
+        return max(0.0, self._checked + self.interval - time.monotonic())
+
+    def fraction(self):
+        now = time.monotonic()
+        if now - self._checked < self.interval:
+            return self._fraction
+        self._checked = now
+        values = []
+        for path in self.paths:
+            try:
+                mtime = os.stat(path).st_mtime_ns
+            except OSError:
+                self._jobs[path] = {}
+                continue
+            if self._mtimes.get(path) != mtime:
+                try:
+                    with open(path, "r", encoding="utf-8") as f:
+                        self._jobs[path] = json.load(f).get("jobs", {})
+                except (OSError, ValueError, AttributeError):
+                    self._jobs[path] = {}
+                self._mtimes[path] = mtime
+            for job in self._jobs[path].values():
+                if job.get("status") != "running":
+                    continue
+                if "progress" in job:
+                    values.append(float(job.get("progress") or 0.0))
+                elif job.get("total") and job.get("target"):
+                    # Downloads only record the expected size; the .part file shows how far they got.
+                    target = job["target"]
+                    part = os.path.join(os.path.dirname(target), f".{os.path.basename(target)}.part")
+                    try:
+                        values.append(min(1.0, os.path.getsize(part) / float(job["total"])))
+                    except OSError:
+                        values.append(0.0)
+        self._fraction = sum(values) / len(values) if values else None
+        return self._fraction
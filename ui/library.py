@@ -0,0 +1,238 @@
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+from ui import metrics
+from ui.watch import DirWatcher
+
+VIDEO_EXTS = {".mp4", ".mkv", ".mov"}
+DEFAULT_INDEX_PATH = "/var/lib/crt-kitchen-tv/library.db"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS collections (
+    collection TEXT PRIMARY KEY,
+    folder TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS files (
+    collection TEXT NOT NULL,
+    name TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime REAL NOT NULL,
+    sort_name TEXT NOT NULL,
+    PRIMARY KEY (collection, name)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS files_newest ON files (collection, mtime DESC);
+CREATE INDEX IF NOT EXISTS files_alpha ON files (collection, sort_name);
+"""
+
+# Ties are broken by name, which both indexes carry as the primary key.
+SORT_ORDER = {
+    "alpha": "sort_name ASC, name ASC",
+    "newest": "mtime DESC, name ASC",
+}
+# Rows sorted before (:mtime, :sort_name, :name) in each order, for position().
+SORT_BEFORE = {
+    "alpha": "(sort_name, name) < (:sort_name, :name)",
+    "newest": "mtime > :mtime OR (mtime = :mtime AND name < :name)",
+}
+
+
+def is_video_name(name):
+    return not name.startswith(".") and os.path.splitext(name)[1].lower() in VIDEO_EXTS
+
+
+class LibraryIndex:
+    """Persistent per-collection file index backed by SQLite.
+
+    Each collection is scanned once when the index starts; afterwards only the
+    files reported by the directory watcher are re-stat'ed. Readers get sorted
+    pages straight from SQLite and use version() to notice changes cheaply.
+    """
+
+    def __init__(self, db_path=DEFAULT_INDEX_PATH, poll_interval=10.0, on_change=None):
+        if db_path != ":memory:":
+            Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(SCHEMA)
+        self._lock = threading.Lock()
+        self._folders = {}
+        self._errors = {}
+        self._versions = {}
+        self._watcher = DirWatcher(self._on_change, poll_interval=poll_interval)
+        # Called with the collection after its version moved, from the scan or watcher thread.
+        self.on_change = on_change
+        self._started = False
+
+    def register(self, collection, folder):
+        folder = str(folder)
+        with self._lock:
+            previous = self._db.execute(
+                "SELECT folder FROM collections WHERE collection = ?", (collection,)
+            ).fetchone()
+            if previous is None or previous[0] != folder:
+                # Rows indexed for a different folder are stale.
+                self._db.execute("DELETE FROM files WHERE collection = ?", (collection,))
+                self._db.execute("INSERT OR REPLACE INTO collections VALUES (?, ?)", (collection, folder))
+            self._folders[collection] = folder
+            self._versions.setdefault(collection, 0)
+        self._watcher.add(collection, folder)
+        if self._started:
+            self.scan(collection)
+
+    def start(self):
+        """Run the startup scan and begin watching, both in the background."""
+        if self._started:
+            return
+        self._started = True
+        thread = threading.Thread(target=self._initial_scan, name="library-scan", daemon=True)
+        thread.start()
+
+    def close(self):
+        self._watcher.stop()
+        with self._lock:
+            self._db.close()
+
+    def _initial_scan(self):
+        for collection in list(self._folders):
+            self.scan(collection)
+        self._watcher.start()
+
+    def scan(self, collection):
+        folder = self._folders.get(collection)
+        if folder is None:
+            return
+        started = time.monotonic()
+        rows = []
+        error = None
+        try:
+            with os.scandir(folder) as it:
+                for entry in it:
+                    if not is_video_name(entry.name):
+                        continue
+                    try:
+                        if not entry.is_file():
+                            continue
+                        st = entry.stat()
+                    except OSError:
+                        continue
+                    rows.append((collection, entry.name, st.st_size, st.st_mtime, entry.name.lower()))
+        except (FileNotFoundError, NotADirectoryError):
+            error = f"Missing folder: {folder}"
+        except OSError as exc:
+            error = f"Cannot read {folder}: {exc.strerror or exc}"
+        with self._lock:
+            self._db.execute("BEGIN")
+            self._db.execute("DELETE FROM files WHERE collection = ?", (collection,))
+            self._db.executemany("INSERT INTO files VALUES (?, ?, ?, ?, ?)", rows)
+            self._db.execute("COMMIT")
+            self._errors[collection] = error
+            self._versions[collection] = self._versions.get(collection, 0) + 1
+        self._notify(collection)
+        metrics.observe("crt_library_scan_seconds", time.monotonic() - started, collection=collection)
+        metrics.set_gauge("crt_library_files", len(rows), collection=collection)
+
+    def _on_change(self, collection, name, kind):
+        if kind == "rescan" or name is None:
+            self.scan(collection)
+            return
+        if not is_video_name(name):
+            return
+        folder = self._folders.get(collection)
+        if folder is None:
+            return
+        st = None
+        if kind == "changed":
+            try:
+                st = os.stat(os.path.join(folder, name))
+            except OSError:
+                st = None
+        with self._lock:
+            if st is not None and os.path.isfile(os.path.join(folder, name)):
+                self._db.execute(
+                    "INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?)",
+                    (collection, name, st.st_size, st.st_mtime, name.lower()),
+                )
+            else:
+                self._db.execute("DELETE FROM files WHERE collection = ? AND name = ?", (collection, name))
+            self._versions[collection] = self._versions.get(collection, 0) + 1
+        self._notify(collection)
+
+    def _notify(self, collection):
+        if self.on_change is not None:
+            try:
+                self.on_change(collection)
+            except Exception:
+                pass
+
+    def version(self, collection):
+        return self._versions.get(collection, 0)
+
+    def error(self, collection):
+        return self._errors.get(collection)
+
+    def count(self, collection):
+        with self._lock:
+            row = self._db.execute("SELECT COUNT(*) FROM files WHERE collection = ?", (collection,)).fetchone()
+        return row[0]
+
+    def page(self, collection, sort_mode="newest", offset=0, limit=None):
+        """Return full paths for one sorted page (all files when limit is None)."""
+        folder = self._folders.get(collection)
+        if folder is None:
+            return []
+        order = SORT_ORDER.get(sort_mode, SORT_ORDER["newest"])
+        with self._lock:
+            rows = self._db.execute(
+                f"SELECT name FROM files WHERE collection = ? ORDER BY {order} LIMIT ? OFFSET ?",
+                (collection, -1 if limit is None else int(limit), int(offset)),
+            ).fetchall()
+        return [os.path.join(folder, name) for (name,) in rows]
+
+    def letter_offsets(self, collection, sort_mode="newest"):
+        """Map each first character of sort_name to the offset of its first file in that order."""
+        with self._lock:
+            if sort_mode == "alpha":
+                # Files sharing a first character are contiguous: offsets are running counts.
+                rows = self._db.execute(
+                    "SELECT substr(sort_name, 1, 1), COUNT(*) FROM files WHERE collection = ? GROUP BY 1 ORDER BY 1",
+                    (collection,),
+                ).fetchall()
+            else:
+                order = SORT_ORDER.get(sort_mode, SORT_ORDER["newest"])
+                return dict(
+                    self._db.execute(
+                        "SELECT substr(sort_name, 1, 1), MIN(pos) FROM ("
+                        f"SELECT sort_name, ROW_NUMBER() OVER (ORDER BY {order}) - 1 AS pos FROM files WHERE collection = ?"
+                        ") GROUP BY 1",
+                        (collection,),
+                    ).fetchall()
+                )
+        offsets = {}
+        total = 0
+        for first, count in rows:
+            offsets[first] = total
+            total += count
+        return offsets
+
+    def position(self, collection, sort_mode, path):
+        """Offset of path in the sorted collection, None when it is not indexed."""
+        folder = self._folders.get(collection)
+        if folder is None or os.path.join(folder, os.path.basename(path)) != path:
+            return None
+        mode = sort_mode if sort_mode in SORT_ORDER else "newest"
+        with self._lock:
+            row = self._db.execute(
+                "SELECT mtime, sort_name, name FROM files WHERE collection = ? AND name = ?",
+                (collection, os.path.basename(path)),
+            ).fetchone()
+            if row is None:
+                return None
+            params = {"collection": collection, "mtime": row[0], "sort_name": row[1], "name": row[2]}
+            (before,) = self._db.execute(
+                f"SELECT COUNT(*) FROM files WHERE collection = :collection AND ({SORT_BEFORE[mode]})", params
+            ).fetchone()
+        return before
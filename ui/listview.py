@@ -0,0 +1,166 @@
+import os
+from bisect import bisect_right
+
+
+def jump_letter(name):
+    first = name[:1].upper()
+    return first if first.isalpha() else "#"
+
+
+def list_source(items, display=os.path.basename):
+    """(count, fetch, letters, locate) for an in-memory list, for ListView.set_source()."""
+    items = list(items)
+    letters = {}
+    positions = {}
+    for idx, item in enumerate(items):
+        letters.setdefault(display(item)[:1], idx)
+        positions.setdefault(item, idx)
+    return len(items), lambda offset, limit: items[offset : offset + limit], letters, positions.get
+
+
+class ListView:
+    """Selection and scroll state for a list too long to show at once.
+
+    The items live behind a source: a count, a fetch(offset, limit) for one
+    window and optional per-letter offsets and locate(item) lookups. Only the
+    visible window is fetched and named, so moving, paging and letter jumps
+    cost the same for 10 or 50,000 entries.
+    """
+
+    def __init__(self, rows=8, empty_text="No files found"):
+        self.rows = max(1, rows)
+        self.empty_text = empty_text
+        self.selected = 0
+        self.top = 0
+        self._count = 0
+        self._fetch = None
+        self._display = os.path.basename
+        self._letter_source = None
+        self._letters = None
+        self._letter_start = {}
+        self._window_top = None
+        self._window = []
+        self._names = []
+
+    def __len__(self):
+        return self._count
+
+    def set_items(self, items, display=os.path.basename):
+        """Replace the items with an in-memory list (see set_source())."""
+        count, fetch, letters, locate = list_source(items, display)
+        self.set_source(count, fetch, letters=letters, locate=locate, display=display)
+
+    def set_source(self, count, fetch, letters=None, locate=None, display=os.path.basename):
+        """Replace the items; letters maps first characters to their first offset.
+
+        letters may also be a callable returning that map; it is only called on
+        the first letter jump. The selection follows the selected item when
+        locate() still finds it and otherwise stays at the same position.
+        """
+        current = self.selected_item()
+        self._count = max(0, int(count))
+        self._fetch = fetch
+        self._display = display
+        self._letter_source = letters
+        self._letters = None
+        self._window_top = None
+        idx = self.selected
+        if current is not None and locate is not None:
+            found = locate(current)
+            if found is not None:
+                idx = found
+        self.select(idx)
+
+    def set_rows(self, rows):
+        self.rows = max(1, rows)
+        self._window_top = None
+        self.select(self.selected)
+
+    def _load(self):
+        if self._window_top == self.top:
+            return
+        self._window = list(self._fetch(self.top, self.rows)) if self._count else []
+        self._names = [self._display(item) for item in self._window]
+        self._window_top = self.top
+
+    def selected_item(self):
+        if not self._count:
+            return None
+        self._load()
+        row = self.selected - self.top
+        return self._window[row] if row < len(self._window) else None
+
+    def select(self, idx):
+        if not self._count:
+            self.selected = self.top = 0
+            return
+        self.selected = max(0, min(idx, self._count - 1))
+        if self.selected < self.top:
+            self.top = self.selected
+        elif self.selected >= self.top + self.rows:
+            self.top = self.selected - self.rows + 1
+        self.top = max(0, min(self.top, max(0, self._count - self.rows)))
+
+    def move(self, delta):
+        if self._count:
+            self.select((self.selected + delta) % self._count)
+
+    def page(self, direction):
+        if not self._count:
+            return
+        # Keep the highlight on the same screen row while the window moves.
+        offset = self.selected - self.top
+        self.top = max(0, min(self.top + direction * self.rows, max(0, self._count - self.rows)))
+        self.select(min(self.top + offset, self._count - 1))
+
+    def _load_letters(self):
+        if self._letters is not None:
+            return
+        letters = self._letter_source() if callable(self._letter_source) else self._letter_source
+        self._letter_start = {}
+        for first, idx in (letters or {}).items():
+            letter = jump_letter(first)
+            if idx < self._letter_start.get(letter, self._count):
+                self._letter_start[letter] = idx
+        self._letters = sorted(self._letter_start)
+
+    def jump(self, letter=None):
+        """Jump to the first item starting with letter, or cycle to the next letter."""
+        self._load_letters()
+        if not self._letters:
+            return
+        if letter is None:
+            pos = bisect_right(self._letters, self.current_letter())
+            letter = self._letters[pos % len(self._letters)]
+        else:
+            letter = jump_letter(letter)
+        if letter not in self._letter_start:
+            return
+        # Put the jump target at the top of the window so its neighbours are visible.
+        self.top = min(self._letter_start[letter], max(0, self._count - 1))
+        self.select(self.top)
+
+    def current_letter(self):
+        if not self._count:
+            return ""
+        self._load()
+        row = self.selected - self.top
+        return jump_letter(self._names[row]) if row < len(self._names) else ""
+
+    def window(self):
+        """Return (visible names, highlighted row within them)."""
+        if not self._count:
+            return [self.empty_text], 0
+        self._load()
+        return self._names, self.selected - self.top
+
+    def visible_items(self):
+        if not self._count:
+            return []
+        self._load()
+        return self._window
+
+    def position_text(self):
+        if not self._count:
+            return "0/0"
+        return f"{self.selected + 1}/{self._count}"
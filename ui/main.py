@@ -1,65 +1,51 @@
 import os
+import signal
+import threading
 import time
 from pathlib import Path
 
 import pygame
-import yaml
 
-from ui.hw.leds_apa102 import Apa102Leds
-from player import play as player
+# Only what the splash needs is imported at load time; the services (player,
+# library, thumbnails, hardware, yaml, sqlite3, urllib/ssl) follow in main().
+from ui.render import Renderer, draw_splash, load_font
 
 CONFIG_PATH = os.environ.get("CRT_CONFIG", "/etc/crt-kitchen-tv/config.yaml")
-BUTTON_GPIO = 17
 REFRESH_SECONDS = 10
-VIDEO_EXTS = {".mp4", ".mkv", ".mov"}
+MOVIES_KEY = "__movies__"
 DEBUG_LOG_PATH = "/tmp/crt-kitchen-tv-ui.log"
+PLAYBACK_DONE = pygame.USEREVENT + 1
+THUMB_READY = pygame.USEREVENT + 2
+CONFIG_CHANGED = pygame.USEREVENT + 3
+BUTTON_EDGE = pygame.USEREVENT + 4
+LIBRARY_CHANGED = pygame.USEREVENT + 5
+# Button gestures are fed through the key handling: double press moves down, holding jumps to the next letter.
+GESTURE_KEYS = {"short": pygame.K_RETURN, "long": pygame.K_BACKSPACE, "double": pygame.K_DOWN, "jump": pygame.K_TAB}
+# Changing these means the idle mpv has to be restarted with new arguments.
+PLAYER_KEYS = {"mpv_backend", "mpv_ipc", "audio_output", "backend_cache"}
+SPINNER_SECONDS = 0.25
+# How often an idle loop pumps SDL for keyboard input when the input devices cannot be watched.
+INPUT_POLL_SECONDS = 0.1
+PLAY_LED = (64, 0, 0)
+NEWS_LED = (0, 0, 64)
+JOB_LED = (0, 48, 0)
 
 # Favor framebuffer output for pygame menu.
 os.environ.setdefault("SDL_FBDEV", "/dev/fb0")
 os.environ.setdefault("SDL_NOMOUSE", "1")
 
-try:
-    from gpiozero import Button
-except ImportError:
-    Button = None
 
-
-class ButtonInput:
-    def __init__(self, gpio_pin=BUTTON_GPIO):
-        self.last_event = None
-        self._enabled = Button is not None
-        self._press_time = None
-        self.button = None
-        if self._enabled:
-            try:
-                self.button = Button(gpio_pin, pull_up=True, bounce_time=0.05)
-                self.button.when_pressed = self._on_press
-                self.button.when_released = self._on_release
-            except Exception:
-                self._enabled = False
-                self.button = None
-
-    def _on_press(self):
-        self._press_time = time.time()
-
-    def _on_release(self):
-        if self._press_time is None:
-            return
-        self.last_event = "back" if (time.time() - self._press_time) >= 1.0 else "select"
-        self._press_time = None
-
-    def poll(self):
-        event_name = self.last_event
-        self.last_event = None
-        return event_name
+# Opened in main() once the splash is up.
+config_store = None
 
 
 def load_config():
-    try:
-        with open(CONFIG_PATH, "r", encoding="utf-8") as f:
-            cfg = yaml.safe_load(f) or {}
-    except FileNotFoundError:
-        cfg = {}
+    from player import hls
+    from player import play as player
+    from ui.library import DEFAULT_INDEX_PATH
+    from ui.thumbs import DEFAULT_CACHE_MB, DEFAULT_THUMB_DIR
+
+    cfg, _ = config_store.load()
     cfg.setdefault("news_streams", [])
     cfg.setdefault("movies_dir", "/home/pi/Videos")
     cfg.setdefault("media_root", "/var/lib/crt-kitchen-tv/media")
@@ -68,10 +54,21 @@ def load_config():
     cfg.setdefault("mpv_backend", "drm")
     cfg.setdefault("font_size", 48)
     cfg.setdefault("leds_enabled", True)
+    cfg.setdefault("mpv_ipc", True)
+    cfg.setdefault("backend_cache", player.DEFAULT_CACHE_PATH)
+    cfg.setdefault("stream_profile", "auto")
+    cfg.setdefault("thumbnails", True)
+    cfg.setdefault("thumbnail_dir", DEFAULT_THUMB_DIR)
+    cfg.setdefault("thumbnail_cache_mb", DEFAULT_CACHE_MB)
+    cfg.setdefault("hls_cache_ttl", hls.DEFAULT_TTL)
+    cfg.setdefault("library_index", DEFAULT_INDEX_PATH)
+    cfg.setdefault("prewarm", {})
     return cfg
 
 
 def list_video_files(folder, sort_mode):
+    from ui.library import VIDEO_EXTS
+
     path = Path(folder)
     if not path.exists() or not path.is_dir():
         return None, f"Missing folder: {folder}"
@@ -83,163 +80,419 @@ def list_video_files(folder, sort_mode):
     return [str(f) for f in files], None
 
 
-def ui_log(message):
-    stamp = time.strftime("%Y-%m-%d %H:%M:%S")
+_wake = threading.Event()
+
+
+def post_event(event_type, **attrs):
+    """Queue an event for the UI loop and wake it; safe from any thread."""
     try:
-        with open(DEBUG_LOG_PATH, "a", encoding="utf-8") as f:
-            f.write(f"[{stamp}] {message}\n")
-    except Exception:
+        pygame.event.post(pygame.event.Event(event_type, **attrs))
+    except pygame.error:
         pass
+    _wake.set()
 
 
-def wrap_text(text, max_chars=42):
-    words = str(text).split()
-    if not words:
-        return [""]
-    lines = []
-    cur = words[0]
-    for word in words[1:]:
-        candidate = f"{cur} {word}"
-        if len(candidate) <= max_chars:
-            cur = candidate
-        else:
-            lines.append(cur)
-            cur = word
-    lines.append(cur)
-    return lines
-
-
-def draw_list(screen, font, title, items, selected, subtitle=""):
-    screen.fill((0, 0, 0))
-    title_surf = font.render(title, True, (255, 255, 0))
-    screen.blit(title_surf, (40, 25))
-    if subtitle:
-        sub = font.render(subtitle, True, (120, 180, 255))
-        screen.blit(sub, (40, 80))
-    y = 145
-    visible = items[:8]
-    for idx, text in enumerate(visible):
-        color = (0, 255, 0) if idx == selected else (220, 220, 220)
-        line = font.render(text, True, color)
-        screen.blit(line, (60, y))
-        y += font.get_linesize() + 8
-    pygame.display.flip()
-
-
-def draw_message(screen, font, message, hint="Backspace to return"):
-    screen.fill((0, 0, 0))
-    y = 150
-    for line in wrap_text(message, max_chars=42)[:4]:
-        msg = font.render(line, True, (255, 120, 120))
-        screen.blit(msg, (40, y))
-        y += font.get_linesize() + 5
-    hint_surf = font.render(hint, True, (200, 200, 200))
-    screen.blit(hint_surf, (40, min(y + 20, 430)))
-    pygame.display.flip()
-
-
-def play_news(cfg, leds):
+def open_library(cfg, on_change=None):
+    from ui.library import DEFAULT_INDEX_PATH, LibraryIndex
+
+    try:
+        library = LibraryIndex(cfg.get("library_index", DEFAULT_INDEX_PATH), poll_interval=REFRESH_SECONDS, on_change=on_change)
+    except Exception as exc:
+        ui_log(f"library index unavailable ({exc}); using in-memory index", level="warning")
+        library = LibraryIndex(":memory:", poll_interval=REFRESH_SECONDS, on_change=on_change)
+    media_root = Path(cfg.get("media_root", "/var/lib/crt-kitchen-tv/media"))
+    for name in cfg.get("collections", []):
+        library.register(name, media_root / name)
+    library.register(MOVIES_KEY, cfg.get("movies_dir", "/home/pi/Videos"))
+    library.start()
+    return library
+
+
+_ui_log = None
+
+
+def ui_log(message, level="info"):
+    global _ui_log
+    if _ui_log is None:
+        from ui import ringlog
+
+        _ui_log = ringlog.Logger("ui", fallback_path=DEBUG_LOG_PATH)
+    _ui_log(message, level=level)
+
+
+def play_news(cfg, session):
+    from player import hls
+
     streams = cfg.get("news_streams", [])
     if not streams:
         return "No news stream configured"
     ui_log(f"news play request: {streams[0]}")
-    leds.set_all(0, 0, 64)
-    ok, err, detail = player.play_media(streams[0], cfg)
-    leds.off()
-    if not ok:
-        ui_log(f"news play failed: {err}")
-    else:
-        ui_log(f"news play finished via {detail}")
-    return None if ok else err
+    session.start(streams[0], kind="news", resolve=lambda url: hls.resolve_stream(url, cfg, log=ui_log))
+    return None
+
+
+def watch_config():
+    """Post CONFIG_CHANGED whenever config.yaml is replaced or rewritten (web saves, hand edits)."""
+    from ui.watch import DirWatcher
+
+    name = config_store.path.name
+
+    def on_change(_key, changed, _kind):
+        if changed is None or changed == name:
+            post_event(CONFIG_CHANGED)
+
+    watcher = DirWatcher(on_change, poll_interval=REFRESH_SECONDS)
+    watcher.add("config", config_store.path.parent)
+    watcher.start()
+    return watcher
 
 
 def main():
-    cfg = load_config()
-    pygame.init()
+    global config_store
+    from ui.startup import StartupReport
+
+    startup = StartupReport(log=ui_log)
+    # Only the pygame modules the menu needs; pygame.init() would also bring up audio and joysticks.
+    pygame.display.init()
+    pygame.font.init()
     screen = pygame.display.set_mode((0, 0), pygame.FULLSCREEN)
     pygame.mouse.set_visible(False)
-    font = pygame.font.SysFont("dejavusans", int(cfg.get("font_size", 48)))
-    clock = pygame.time.Clock()
+    draw_splash(screen)
+    startup.mark("first_frame")
+
+    from player import play as player
+    from player.session import FINISHED, LOADING, STOPPING, PlaybackSession
+    from ui import metrics
+    from ui.config_store import ConfigStore
+    from ui.hw.button import ButtonInput
+    from ui.hw.keyboard import InputWatcher
+    from ui.hw.led_engine import LedEngine
+    from ui.hw.leds_apa102 import Apa102Leds
+    from ui.jobs import JobProgress, job_state_paths
+    from ui.listview import ListView
+    from ui.prewarm import Prewarmer
+    from ui.storage import PlayHistory, StorageManager, storage_options
+    from ui.thumbs import DEFAULT_CACHE_MB, DEFAULT_THUMB_DIR, ThumbnailCache
+
+    config_store = ConfigStore(CONFIG_PATH)
+    startup.mark("imports")
 
-    leds = Apa102Leds(enabled=cfg.get("leds_enabled", True))
-    button = ButtonInput()
+    cfg = load_config()
+    applied_version = config_store.version
+    font_size = int(cfg.get("font_size", 48))
+    font = load_font(font_size)
+    renderer = Renderer(screen, font, font_size)
+    startup.mark("font")
 
     menu_items = ["News", "Movies", "Library"]
     menu_idx = 0
     mode = "menu"
-
-    movies = []
-    movies_idx = 0
-
-    collection_idx = 0
-    file_idx = 0
+    # The menu goes up before libraries, watchers and hardware are started; the loop's first draw is then a no-op.
+    renderer.draw_list("CRT Kitchen TV", menu_items, menu_idx)
+    startup.mark("menu")
+
+    leds = Apa102Leds(enabled=cfg.get("leds_enabled", True), lazy=True)
+    led_engine = LedEngine(leds, fps=cfg.get("led_fps", 30))
+    led_engine.start()
+    job_progress = JobProgress(job_state_paths(cfg))
+    button = ButtonInput(wake=lambda: post_event(BUTTON_EDGE))
+    input_watcher = InputWatcher(wake=_wake.set)
+    input_watcher.start()
+    # SDL only turns SIGTERM into QUIT while it is pumped, and the idle loop does not pump.
+    signal.signal(signal.SIGTERM, lambda _signum, _frame: post_event(pygame.QUIT))
+
+    def open_hardware():
+        if button.open():
+            startup.mark("button")
+        if leds.open():
+            startup.mark("leds")
+
+    def warm_player():
+        player.warm_up(cfg)
+        startup.mark("mpv_ready")
+
+    threading.Thread(target=open_hardware, name="hardware", daemon=True).start()
+    threading.Thread(target=warm_player, name="mpv-warm-up", daemon=True).start()
+    library = open_library(cfg, on_change=lambda collection: post_event(LIBRARY_CHANGED))
+    startup.mark("library")
+    # The worker posts PLAYBACK_DONE, so the loop never waits on mpv.
+    session = PlaybackSession(cfg, on_done=lambda status: post_event(PLAYBACK_DONE))
+    playback_return_mode = "menu"
+    thumbs = None
+    if cfg.get("thumbnails", True):
+        thumbs = ThumbnailCache(
+            cfg.get("thumbnail_dir", DEFAULT_THUMB_DIR),
+            cfg.get("thumbnail_cache_mb", DEFAULT_CACHE_MB),
+            row_height=renderer.thumb_height,
+            on_ready=lambda: post_event(THUMB_READY),
+        )
+        try:
+            thumbs.start()
+        except OSError as exc:
+            ui_log(f"thumbnails disabled: {exc}", level="warning")
+            thumbs = None
+
+    config_watcher = watch_config()
+    try:
+        history = PlayHistory(storage_options(cfg)["history_path"])
+    except Exception as exc:
+        ui_log(f"play history unavailable ({exc}); using in-memory history", level="warning")
+        history = PlayHistory(":memory:")
+    storage = StorageManager(
+        cfg, history, log=ui_log, protect=lambda: [session.status.source] if session.busy else []
+    )
+    storage.start()
+    prewarm_opts = cfg.get("prewarm") or {}
+    prewarmer = None
+    if prewarm_opts.get("enabled", True):
+        prewarmer = Prewarmer(
+            dwell_ms=prewarm_opts.get("dwell_ms", 400),
+            head_mb=prewarm_opts.get("head_mb", 8),
+            tail_mb=prewarm_opts.get("tail_mb", 1),
+            budget_mb=prewarm_opts.get("budget_mb", 64),
+            log=ui_log,
+            protect=lambda: [session.status.source] if session.busy else [],
+        )
+        prewarmer.start()
+    # Frame, scan and playback metrics for the web service's /api/metrics.
+    metrics_publisher = metrics.Publisher()
+    metrics_publisher.start()
+
+    def row_thumbs(view):
+        if thumbs is None or not view:
+            return None
+        return thumbs.lookup(view.visible_items())
+
+    movies = ListView(renderer.rows)
+    movies_version = -1
+
+    collections_view = ListView(renderer.rows, empty_text="No collections configured")
+    collections_view.set_items(cfg.get("collections", []), display=str)
     active_collection = None
-    collection_files = []
+    collection_files = ListView(renderer.rows)
     collection_error = None
-    last_scan_ts = 0.0
+    collection_version = -1
     error_message = None
     error_return_mode = "menu"
+    views = {"movies": movies, "library_collections": collections_view, "library_files": collection_files}
+
+    def apply_config():
+        """Hot-apply a saved config: fonts, collections, sorting, LEDs and player settings."""
+        nonlocal applied_version, font, font_size, renderer, leds, mode, active_collection
+        nonlocal movies_version, collection_version
+        version = config_store.version
+        if version == applied_version:
+            return False
+        applied_version = version
+        new = load_config()
+        changed = {key for key in set(cfg) | set(new) if cfg.get(key) != new.get(key)}
+        if not changed:
+            return False
+        cfg.clear()
+        cfg.update(new)
+        ui_log(f"config v{version} applied: {', '.join(sorted(changed))}")
+        if "font_size" in changed:
+            font_size = int(cfg.get("font_size", 48))
+            font = load_font(font_size)
+            renderer = Renderer(screen, font, font_size)
+            for view in views.values():
+                view.set_rows(renderer.rows)
+            if thumbs is not None:
+                thumbs.set_row_height(renderer.thumb_height)
+        if changed & {"collections", "media_root"}:
+            media_root = Path(cfg.get("media_root", "/var/lib/crt-kitchen-tv/media"))
+            for name in cfg.get("collections", []):
+                library.register(name, media_root / name)
+            collections_view.set_items(cfg.get("collections", []), display=str)
+            if active_collection not in cfg.get("collections", []):
+                active_collection = None
+                collection_files.set_items([])
+                if mode == "library_files":
+                    mode = "library_collections"
+        if "movies_dir" in changed:
+            library.register(MOVIES_KEY, cfg.get("movies_dir", "/home/pi/Videos"))
+        # Forces the views to reload (and re-sort) on this frame.
+        movies_version = -1
+        collection_version = -1
+        if "leds_enabled" in changed:
+            leds = Apa102Leds(enabled=cfg.get("leds_enabled", True), lazy=True)
+            led_engine.use(leds)
+        job_progress.paths = job_state_paths(cfg)
+        if changed & PLAYER_KEYS and not session.busy:
+            player.shutdown()
+            threading.Thread(target=player.warm_up, args=(cfg,), name="mpv-warm-up", daemon=True).start()
+        renderer.invalidate()
+        return True
+
+    def show_indexed(view, collection):
+        """Point view at the index: only count() and the visible page(offset, limit) are read."""
+        sort_mode = cfg.get("library_sort", "newest")
+        view.set_source(
+            library.count(collection),
+            lambda offset, limit: library.page(collection, sort_mode, offset, limit),
+            letters=lambda: library.letter_offsets(collection, sort_mode),
+            locate=lambda path: library.position(collection, sort_mode, path),
+        )
 
     def refresh_movies():
-        nonlocal movies, movies_idx
-        files, err = list_video_files(cfg.get("movies_dir", "/home/pi/Videos"), cfg.get("library_sort", "newest"))
-        movies = files or []
-        movies_idx = min(movies_idx, max(0, len(movies) - 1))
-        return err
+        nonlocal movies_version
+        movies_version = library.version(MOVIES_KEY)
+        show_indexed(movies, MOVIES_KEY)
+        return library.error(MOVIES_KEY)
+
+    def refresh_collection():
+        nonlocal collection_error, collection_version
+        collection_version = library.version(active_collection)
+        show_indexed(collection_files, active_collection)
+        collection_error = library.error(active_collection)
 
     def enter_collection(name):
-        nonlocal mode, active_collection, collection_files, collection_error, file_idx, last_scan_ts
+        nonlocal mode, active_collection
+        if name != active_collection:
+            collection_files.set_items([])
         active_collection = name
-        target = str(Path(cfg.get("media_root", "/var/lib/crt-kitchen-tv/media")) / name)
-        collection_files, collection_error = list_video_files(target, cfg.get("library_sort", "newest"))
-        collection_files = collection_files or []
-        file_idx = 0
-        last_scan_ts = time.time()
+        refresh_collection()
         mode = "library_files"
 
     def play_item(path):
-        nonlocal mode, error_message, error_return_mode
+        nonlocal mode, playback_return_mode
         ui_log(f"play request: {path}")
-        leds.set_all(64, 0, 0)
-        ok, err, detail = player.play_media(path, cfg)
-        leds.off()
-        if not ok:
-            error_message = err or "Failed to start playback"
-            ui_log(f"play failed: {path} :: {error_message}")
-            error_return_mode = mode
+        if session.start(path) is None:
+            return
+        playback_return_mode = mode
+        mode = "playing"
+
+    def update_leds():
+        # Only describes the wanted animation; the engine ignores repeats and never blocks.
+        if mode == "playing":
+            status = session.status
+            color = NEWS_LED if status.kind == "news" else PLAY_LED
+            if status.state in (LOADING, STOPPING):
+                led_engine.spinner(*color)
+            else:
+                led_engine.breathe(*color)
+            return
+        fraction = job_progress.fraction()
+        if fraction is None:
+            led_engine.off()
+        else:
+            led_engine.progress(fraction, *JOB_LED)
+
+    def finish_playback():
+        nonlocal mode, error_message, error_return_mode
+        status = session.status
+        renderer.invalidate()
+        if prewarmer is not None and status.kind == "file":
+            prewarmer.record_play(status.source, status.first_frame)
+        if status.state == FINISHED:
+            try:
+                history.record(status.source, completed=status.completed)
+            except Exception as exc:
+                ui_log(f"play history write failed: {exc}", level="warning")
+        if status.error:
+            error_message = status.error
+            if status.kind == "news":
+                ui_log(f"news play failed: {status.error}", level="error")
+            else:
+                ui_log(f"play failed: {status.source} :: {status.error}", level="error")
+            error_return_mode = playback_return_mode
             mode = "error"
         else:
-            ui_log(f"play finished: {path} via {detail}")
+            if status.kind == "news":
+                ui_log(f"news play finished via {status.detail}")
+            else:
+                ui_log(f"play finished: {status.source} via {status.detail}")
+            mode = playback_return_mode
+
+    def next_timeout():
+        """Seconds until something the loop must do without an event (None: nothing, sleep until one)."""
+        if state_version != drawn_version:
+            return 0
+        now = time.monotonic()
+        waits = []
+        deadline = button.deadline()
+        if deadline is not None:
+            waits.append(deadline - now)
+        if mode == "playing":
+            status = session.status
+            if status.state in (LOADING, STOPPING):
+                waits.append(SPINNER_SECONDS - status.elapsed % SPINNER_SECONDS)
+        elif job_progress.paths:
+            waits.append(job_progress.due())
+        return max(0.0, min(waits)) if waits else None
+
+    def wait_events(timeout):
+        # Not pygame.event.wait(): without a driver that can block (kmsdrm, fbdev) SDL polls every 1 ms.
+        # Other threads wake us through post_event(), keyboards through the input watcher.
+        if input_watcher.polling_needed:
+            timeout = INPUT_POLL_SECONDS if timeout is None else min(timeout, INPUT_POLL_SECONDS)
+        if timeout is None or timeout > 0:
+            _wake.wait(timeout)
+        _wake.clear()
+        return pygame.event.get()
+
+    # Bumped on every state change; the screen is only redrawn when it moved.
+    state_version = 0
+    drawn_version = -1
+    loading_tick = -1
+    startup.mark("services")
+    interactive = False
 
-    draw_list(screen, font, "CRT Kitchen TV", menu_items, menu_idx)
     running = True
     while running:
-        for event in pygame.event.get():
+        for event in wait_events(next_timeout()):
             if event.type == pygame.QUIT:
                 running = False
+            if event.type in (pygame.VIDEOEXPOSE, pygame.WINDOWEXPOSED):
+                # Something else (mpv) painted over us; the next frame must be a full redraw.
+                renderer.invalidate()
+                state_version += 1
+            if event.type == PLAYBACK_DONE:
+                finish_playback()
+                state_version += 1
+                continue
+            if event.type == THUMB_READY:
+                state_version += 1
+                continue
+            if event.type in (BUTTON_EDGE, LIBRARY_CHANGED):
+                # Handled below: gestures are polled, library versions compared.
+                continue
+            if event.type == CONFIG_CHANGED:
+                if apply_config():
+                    state_version += 1
+                continue
             if event.type != pygame.KEYDOWN:
                 continue
+            state_version += 1
+
+            if mode == "playing":
+                # Back (or a long button press) stops playback; everything else waits for mpv.
+                if event.key in (pygame.K_BACKSPACE, pygame.K_ESCAPE):
+                    ui_log("play stop requested")
+                    session.stop()
+                continue
 
+            view = views.get(mode)
             if event.key == pygame.K_ESCAPE:
                 running = False
             elif event.key == pygame.K_UP:
                 if mode == "menu":
                     menu_idx = (menu_idx - 1) % len(menu_items)
-                elif mode == "movies" and movies:
-                    movies_idx = (movies_idx - 1) % len(movies)
-                elif mode == "library_collections":
-                    collection_idx = (collection_idx - 1) % len(cfg.get("collections", []))
-                elif mode == "library_files" and collection_files:
-                    file_idx = (file_idx - 1) % len(collection_files)
+                elif view is not None:
+                    view.move(-1)
             elif event.key == pygame.K_DOWN:
                 if mode == "menu":
                     menu_idx = (menu_idx + 1) % len(menu_items)
-                elif mode == "movies" and movies:
-                    movies_idx = (movies_idx + 1) % len(movies)
-                elif mode == "library_collections":
-                    collection_idx = (collection_idx + 1) % len(cfg.get("collections", []))
-                elif mode == "library_files" and collection_files:
-                    file_idx = (file_idx + 1) % len(collection_files)
+                elif view is not None:
+                    view.move(1)
+            elif event.key in (pygame.K_PAGEUP, pygame.K_PAGEDOWN) and view is not None:
+                view.page(-1 if event.key == pygame.K_PAGEUP else 1)
+            elif event.key in (pygame.K_HOME, pygame.K_END) and view is not None:
+                view.select(0 if event.key == pygame.K_HOME else len(view) - 1)
+            elif event.key == pygame.K_TAB and view is not None:
+                view.jump()
+            elif view is not None and getattr(event, "unicode", "").isalnum():
+                view.jump(event.unicode)
             elif event.key in (pygame.K_RETURN, pygame.K_KP_ENTER):
                 if mode == "error":
                     mode = error_return_mode
@@ -248,27 +501,28 @@ def main():
                 if mode == "menu":
                     selected = menu_items[menu_idx]
                     if selected == "News":
-                        draw_list(screen, font, "News", ["Loading stream..."], 0)
-                        err = play_news(cfg, leds)
+                        err = play_news(cfg, session)
                         if err:
                             error_message = err
                             error_return_mode = "menu"
                             mode = "error"
+                        elif session.busy:
+                            playback_return_mode = mode
+                            mode = "playing"
                     elif selected == "Movies":
                         mode = "movies"
                         err = refresh_movies()
                         if err:
-                            draw_message(screen, font, err)
+                            renderer.draw_message(err)
                     else:
                         mode = "library_collections"
                 elif mode == "movies" and movies:
-                    play_item(movies[movies_idx])
+                    play_item(movies.selected_item())
                 elif mode == "library_collections":
-                    collections = cfg.get("collections", [])
-                    if collections:
-                        enter_collection(collections[collection_idx])
+                    if collections_view:
+                        enter_collection(collections_view.selected_item())
                 elif mode == "library_files" and collection_files and not collection_error:
-                    play_item(collection_files[file_idx])
+                    play_item(collection_files.selected_item())
             elif event.key == pygame.K_BACKSPACE:
                 if mode == "error":
                     mode = error_return_mode
@@ -280,49 +534,82 @@ def main():
                 else:
                     mode = "menu"
 
-        btn_event = button.poll()
-        if btn_event == "select":
-            pygame.event.post(pygame.event.Event(pygame.KEYDOWN, key=pygame.K_RETURN))
-        elif btn_event == "back":
-            pygame.event.post(pygame.event.Event(pygame.KEYDOWN, key=pygame.K_BACKSPACE))
-
-        # Refresh file list periodically while browsing a collection.
-        if mode == "library_files" and active_collection and (time.time() - last_scan_ts) >= REFRESH_SECONDS:
-            target = str(Path(cfg.get("media_root", "/var/lib/crt-kitchen-tv/media")) / active_collection)
-            collection_files, collection_error = list_video_files(target, cfg.get("library_sort", "newest"))
-            collection_files = collection_files or []
-            file_idx = min(file_idx, max(0, len(collection_files) - 1))
-            last_scan_ts = time.time()
-
-        if mode == "menu":
-            draw_list(screen, font, "CRT Kitchen TV", menu_items, menu_idx)
+        for gesture in button.poll():
+            post_event(pygame.KEYDOWN, key=GESTURE_KEYS[gesture])
+
+        # The index bumps a version whenever the watcher sees a change; reload only then.
+        if mode == "library_files" and active_collection and library.version(active_collection) != collection_version:
+            refresh_collection()
+            state_version += 1
+        elif mode == "movies" and library.version(MOVIES_KEY) != movies_version:
+            refresh_movies()
+            state_version += 1
+
+        if mode == "playing" and session.status.state in (LOADING, STOPPING):
+            # Animate the loading screen by bumping the version on spinner ticks only.
+            tick = int(session.status.elapsed / SPINNER_SECONDS)
+            if tick != loading_tick:
+                loading_tick = tick
+                state_version += 1
+
+        if state_version == drawn_version:
+            renderer.stats.record("skipped")
+        elif mode == "playing":
+            status = session.status
+            if status.state in (LOADING, STOPPING):
+                title = "Stopping" if status.state == STOPPING else "Loading"
+                name = "News" if status.kind == "news" else Path(status.source).name
+                renderer.draw_loading(title, name, loading_tick, hint=f"{status.backend or 'mpv'} {status.elapsed:.0f}s")
+        elif mode == "menu":
+            renderer.draw_list("CRT Kitchen TV", menu_items, menu_idx)
         elif mode == "movies":
-            items = [Path(p).name for p in movies] if movies else ["No files found"]
-            draw_list(screen, font, "Movies", items, movies_idx)
+            items, row = movies.window()
+            renderer.draw_list("Movies", items, row, status=movies.position_text(), thumbs=row_thumbs(movies))
         elif mode == "library_collections":
-            collections = cfg.get("collections", [])
-            items = collections if collections else ["No collections configured"]
-            draw_list(screen, font, "Library", items, collection_idx, subtitle=cfg.get("media_root", ""))
+            items, row = collections_view.window()
+            renderer.draw_list("Library", items, row, subtitle=cfg.get("media_root", ""))
         elif mode == "library_files":
             if collection_error:
-                draw_message(screen, font, collection_error)
+                renderer.draw_message(collection_error)
             else:
-                items = [Path(p).name for p in collection_files] if collection_files else ["No files found"]
-                draw_list(
-                    screen,
-                    font,
+                items, row = collection_files.window()
+                renderer.draw_list(
                     active_collection or "Library",
                     items,
-                    file_idx,
+                    row,
                     subtitle=f"Sort: {cfg.get('library_sort', 'newest')}",
+                    status=collection_files.position_text(),
+                    thumbs=row_thumbs(collection_files),
                 )
         elif mode == "error":
-            draw_message(screen, font, error_message or "Playback failed")
-
-        clock.tick(30)
-
-    leds.off()
-    leds.close()
+            renderer.draw_message(error_message or "Playback failed")
+        drawn_version = state_version
+        renderer.stats.maybe_report(ui_log)
+        update_leds()
+        if not interactive:
+            interactive = True
+            startup.mark("interactive")
+            startup.finish()
+        if prewarmer is not None:
+            # Only a list selection is worth warming; anything else (incl. playback) cancels it.
+            view = views.get(mode) if mode in ("movies", "library_files") else None
+            prewarmer.hint(view.selected_item() if view else None)
+
+    if session.busy:
+        session.stop()
+        session.join(timeout=5)
+    if thumbs is not None:
+        thumbs.stop()
+    config_watcher.stop()
+    input_watcher.stop()
+    storage.stop()
+    if prewarmer is not None:
+        prewarmer.stop()
+    metrics_publisher.stop()
+    history.close()
+    led_engine.stop()
+    library.close()
+    player.shutdown()
     pygame.quit()
 
 
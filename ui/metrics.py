@@ -0,0 +1,203 @@
+import json
+import math
+import os
+import threading
+import time
+from bisect import bisect_left
+from pathlib import Path
+
+# tmpfs, so publishing never touches the SD card.
+DEFAULT_SNAPSHOT_PATH = "/dev/shm/crt-kitchen-tv-metrics.json" if os.path.isdir("/dev/shm") else "/tmp/crt-kitchen-tv-metrics.json"
+PUBLISH_SECONDS = 5.0
+
+FRAME_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5)
+SCAN_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+LAUNCH_BUCKETS = (0.1, 0.25, 0.5, 1, 1.5, 2, 3, 5, 10, 20, 30)
+ATTEMPT_BUCKETS = (1, 2, 3, 4, 5)
+REQUEST_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+# name: (type, help, histogram buckets)
+DEFINITIONS = {
+    "crt_ui_frames_total": ("counter", "UI frames by kind (full, partial, skipped).", None),
+    "crt_ui_frame_seconds": ("histogram", "Time to draw a UI frame that repainted something.", FRAME_BUCKETS),
+    "crt_library_scan_seconds": ("histogram", "Duration of a full scan of one library collection.", SCAN_BUCKETS),
+    "crt_library_files": ("gauge", "Video files found by the last full scan of a collection.", None),
+    "crt_play_launch_seconds": ("histogram", "From starting (or reusing) mpv for a backend to its first frame.", LAUNCH_BUCKETS),
+    "crt_play_attempts": ("histogram", "Backend attempts per play_media call.", ATTEMPT_BUCKETS),
+    "crt_play_failures_total": ("counter", "Backend attempts that failed, by backend.", None),
+    "crt_plays_total": ("counter", "play_media calls by result (ok, failed, stopped).", None),
+    "crt_web_request_seconds": ("histogram", "Web request latency up to the response headers.", REQUEST_BUCKETS),
+    "crt_ui_up": ("gauge", "1 while the UI process that published the UI metrics is running.", None),
+}
+
+
+class Registry:
+    """In-process counters, gauges and histograms, keyed by metric name and label values.
+
+    Updates are a dict lookup and an add under one lock, cheap enough for
+    every frame. snapshot() returns plain data for publishing.
+    """
+
+    def __init__(self, definitions=DEFINITIONS):
+        self.definitions = dict(definitions)
+        self._series = {}
+        self._lock = threading.Lock()
+        self.version = 0
+
+    def _key(self, name, labels):
+        if name not in self.definitions:
+            raise KeyError(f"unknown metric {name}")
+        return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+    def inc(self, name, amount=1, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            self._series[key] = self._series.get(key, 0) + amount
+            self.version += 1
+
+    def set(self, name, value, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            self._series[key] = value
+            self.version += 1
+
+    def observe(self, name, value, **labels):
+        key = self._key(name, labels)
+        buckets = self.definitions[name][2]
+        with self._lock:
+            hist = self._series.get(key)
+            if hist is None:
+                hist = self._series[key] = {"counts": [0] * (len(buckets) + 1), "sum": 0.0, "count": 0}
+            hist["counts"][bisect_left(buckets, value)] += 1
+            hist["sum"] += value
+            hist["count"] += 1
+            self.version += 1
+
+    def snapshot(self):
+        with self._lock:
+            series = [(name, labels, dict(v, counts=list(v["counts"])) if isinstance(v, dict) else v)
+                      for (name, labels), v in self._series.items()]
+            version = self.version
+        metrics = {}
+        for name, labels, value in series:
+            kind, help_text, buckets = self.definitions[name]
+            entry = metrics.setdefault(name, {"type": kind, "help": help_text, "buckets": buckets, "series": []})
+            item = {"labels": dict(labels)}
+            if isinstance(value, dict):
+                item.update(value)
+            else:
+                item["value"] = value
+            entry["series"].append(item)
+        return {"pid": os.getpid(), "time": time.time(), "version": version, "metrics": metrics}
+
+
+registry = Registry()
+
+
+def inc(name, amount=1, **labels):
+    registry.inc(name, amount, **labels)
+
+
+def set_gauge(name, value, **labels):
+    registry.set(name, value, **labels)
+
+
+def observe(name, value, **labels):
+    registry.observe(name, value, **labels)
+
+
+class Publisher:
+    """Writes the registry snapshot to a tmpfs file for the web service, only when something changed."""
+
+    def __init__(self, path=DEFAULT_SNAPSHOT_PATH, interval=PUBLISH_SECONDS, source=registry):
+        self.path = Path(path)
+        self.interval = interval
+        self.source = source
+        self._published = None
+        self._stop = threading.Event()
+
+    def start(self):
+        threading.Thread(target=self._run, name="metrics", daemon=True).start()
+
+    def stop(self):
+        self._stop.set()
+        self.publish()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.publish()
+
+    def publish(self):
+        if self.source.version == self._published:
+            return
+        snapshot = self.source.snapshot()
+        tmp = self.path.with_name(f".{self.path.name}.tmp")
+        try:
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(snapshot, f, separators=(",", ":"))
+            os.replace(tmp, self.path)
+        except OSError:
+            return
+        self._published = snapshot["version"]
+
+
+def load_snapshot(path=DEFAULT_SNAPSHOT_PATH):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def pid_alive(pid):
+    try:
+        os.kill(int(pid), 0)
+    except PermissionError:
+        return True
+    except (ProcessLookupError, TypeError, ValueError):
+        return False
+    return True
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(labels, extra=None):
+    items = list(labels.items()) + ([extra] if extra else [])
+    if not items:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in items) + "}"
+
+
+def _number(value):
+    if isinstance(value, float) and math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render(snapshots):
+    """Prometheus text exposition (format 0.0.4) of one or more snapshots."""
+    merged = {}
+    for snap in snapshots:
+        for name, entry in (snap or {}).get("metrics", {}).items():
+            target = merged.setdefault(name, dict(entry, series=[]))
+            target["series"].extend(entry["series"])
+    out = []
+    for name in sorted(merged):
+        entry = merged[name]
+        out.append(f"# HELP {name} {entry['help']}")
+        out.append(f"# TYPE {name} {entry['type']}")
+        for item in entry["series"]:
+            labels = item["labels"]
+            if entry["type"] != "histogram":
+                out.append(f"{name}{_labels(labels)} {_number(item['value'])}")
+                continue
+            cumulative = 0
+            bounds = list(entry["buckets"]) + [float("inf")]
+            for bound, count in zip(bounds, item["counts"]):
+                cumulative += count
+                out.append(f"{name}_bucket{_labels(labels, ('le', _number(float(bound))))} {cumulative}")
+            out.append(f"{name}_sum{_labels(labels)} {_number(float(item['sum']))}")
+            out.append(f"{name}_count{_labels(labels)} {item['count']}")
+    return "\n".join(out) + "\n"
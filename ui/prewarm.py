@@ -0,0 +1,178 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+MB = 1024 * 1024
+READ_CHUNK = 256 * 1024
+DEFAULT_DWELL_MS = 400
+DEFAULT_HEAD_MB = 8
+DEFAULT_TAIL_MB = 1
+DEFAULT_BUDGET_MB = 64
+
+
+def _fadvise(fd, offset, length, advice):
+    if hasattr(os, "posix_fadvise"):
+        try:
+            os.posix_fadvise(fd, offset, length, advice)
+        except OSError:
+            pass
+
+
+class Prewarmer:
+    """Pulls the start (and end, where MP4s often keep their index) of the highlighted file into the page cache.
+
+    hint(path) is cheap and called whenever the selection changes; the work
+    only starts once the selection has rested for dwell_ms, runs on one
+    background thread in READ_CHUNK steps and stops as soon as the hint
+    moves on. The ranges warmed are tracked per file and those of the oldest
+    files are dropped again (POSIX_FADV_DONTNEED) to stay within budget_mb,
+    except for the paths protect() returns (the one playing).
+    """
+
+    def __init__(self, dwell_ms=DEFAULT_DWELL_MS, head_mb=DEFAULT_HEAD_MB, tail_mb=DEFAULT_TAIL_MB,
+                 budget_mb=DEFAULT_BUDGET_MB, log=None, protect=None):
+        self.dwell = max(0, int(dwell_ms)) / 1000.0
+        self.head = int(float(head_mb) * MB)
+        self.tail = int(float(tail_mb) * MB)
+        self.budget = int(float(budget_mb) * MB)
+        self.log = log
+        self.protect = protect or (lambda: ())
+        self._warm = OrderedDict()
+        self._ranges = {}
+        self._finished = {}
+        self._target = None
+        self._since = 0.0
+        self._cond = threading.Condition()
+        self._stop = False
+        self._thread = None
+        self.stats = {"prewarmed": [], "cold": []}
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="prewarm", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        with self._cond:
+            self._stop = True
+            self._cond.notify_all()
+
+    def hint(self, path):
+        """The item now highlighted (None when no list is showing)."""
+        with self._cond:
+            if path == self._target:
+                return
+            self._target = path
+            self._since = time.monotonic()
+            self._cond.notify_all()
+
+    def _current(self, path):
+        with self._cond:
+            return not self._stop and self._target == path
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._stop and (self._target is None or self._target in self._finished):
+                    self._cond.wait()
+                if self._stop:
+                    return
+                path = self._target
+                wait = self._since + self.dwell - time.monotonic()
+                if wait > 0:
+                    self._cond.wait(wait)
+                    continue
+            self._warm_file(path)
+
+    def _warm_file(self, path):
+        started = time.monotonic()
+        try:
+            fd = os.open(path, os.O_RDONLY)
+        except OSError:
+            with self._cond:
+                self._finished[path] = 0
+            return
+        warmed = 0
+        done = []
+        try:
+            size = os.fstat(fd).st_size
+            ranges = [(0, min(size, self.head))]
+            if size > self.head and self.tail:
+                tail_start = max(self.head, size - self.tail)
+                ranges.append((tail_start, size - tail_start))
+            # Ask the kernel first (async), then read to make sure it happens even where WILLNEED is ignored.
+            for offset, length in ranges:
+                _fadvise(fd, offset, length, getattr(os, "POSIX_FADV_WILLNEED", 3))
+            for offset, length in ranges:
+                pos = offset
+                while pos < offset + length:
+                    if not self._current(path):
+                        break
+                    chunk = os.pread(fd, min(READ_CHUNK, offset + length - pos), pos)
+                    if not chunk:
+                        break
+                    pos += len(chunk)
+                    warmed += len(chunk)
+                if pos > offset:
+                    done.append((offset, pos - offset))
+        except OSError:
+            pass
+        finally:
+            os.close(fd)
+        complete = self._current(path)
+        with self._cond:
+            if complete:
+                self._finished[path] = time.monotonic()
+            self._warm[path] = warmed
+            self._ranges[path] = done
+            self._warm.move_to_end(path)
+            victims = self._trim()
+        self._drop(victims)
+        if self.log and complete:
+            self.log(f"prewarm {os.path.basename(path)}: {warmed // 1024} KiB in {time.monotonic() - started:.2f}s")
+
+    def _trim(self):
+        """Forget the oldest files until within budget (called under the lock); returns [(path, ranges)] to drop."""
+        try:
+            protected = {str(p) for p in self.protect()}
+        except Exception:
+            protected = set()
+        total = sum(self._warm.values())
+        victims = []
+        for old in list(self._warm)[:-1]:
+            if total <= self.budget:
+                break
+            if old in protected:
+                continue
+            total -= self._warm.pop(old)
+            self._finished.pop(old, None)
+            victims.append((old, self._ranges.pop(old, [])))
+        return victims
+
+    def _drop(self, victims):
+        """Release the ranges we warmed (not the whole file); done outside the lock, open() may block."""
+        for path, ranges in victims:
+            try:
+                fd = os.open(path, os.O_RDONLY)
+            except OSError:
+                continue
+            try:
+                for offset, length in ranges:
+                    _fadvise(fd, offset, length, getattr(os, "POSIX_FADV_DONTNEED", 4))
+            finally:
+                os.close(fd)
+
+    def record_play(self, path, first_frame):
+        """Log first-frame latency split by whether the file had been prewarmed, for before/after comparisons."""
+        if first_frame is None:
+            return
+        with self._cond:
+            warm = path in self._finished
+            warmed = self._warm.get(path, 0)
+        samples = self.stats["prewarmed" if warm else "cold"]
+        samples.append(first_frame)
+        del samples[:-50]
+        if self.log:
+            avg = {k: (sum(v) / len(v) if v else None) for k, v in self.stats.items()}
+            summary = " ".join(f"{k}_avg={v:.2f}s/{len(self.stats[k])}" for k, v in avg.items() if v is not None)
+            self.log(f"first frame {first_frame:.2f}s {'prewarmed ' + str(warmed // 1024) + ' KiB' if warm else 'cold'} ({summary})")
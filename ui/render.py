@@ -0,0 +1,292 @@
+import json
+import os
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+import pygame
+
+from ui import metrics
+
+BACKGROUND = (0, 0, 0)
+TITLE_COLOR = (255, 255, 0)
+SUBTITLE_COLOR = (120, 180, 255)
+ITEM_COLOR = (220, 220, 220)
+SELECTED_COLOR = (0, 255, 0)
+ERROR_COLOR = (255, 120, 120)
+HINT_COLOR = (200, 200, 200)
+LIST_TOP = 145
+STATS_INTERVAL = 60.0
+FONT_NAME = "dejavusans"
+DEFAULT_FONT_CACHE = "/var/lib/crt-kitchen-tv/font-cache.json"
+
+
+def load_font(size, name=FONT_NAME, cache_path=DEFAULT_FONT_CACHE):
+    """Open a system font by name, remembering the resolved file.
+
+    pygame.font.SysFont runs fc-list on first use, which takes seconds on a
+    Pi Zero; with the path cached later starts open the file directly.
+    """
+    cache = Path(cache_path)
+    try:
+        with open(cache, "r", encoding="utf-8") as f:
+            path = json.load(f).get(name)
+    except (OSError, ValueError, AttributeError):
+        path = None
+    if path and os.path.exists(path):
+        try:
+            return pygame.font.Font(path, size)
+        except (OSError, pygame.error):
+            pass
+    path = pygame.font.match_font(name)
+    if path is None:
+        return pygame.font.Font(None, size)
+    try:
+        cache.parent.mkdir(parents=True, exist_ok=True)
+        tmp = cache.with_name(cache.name + ".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({name: path}, f)
+        os.replace(tmp, cache)
+    except OSError:
+        pass
+    return pygame.font.Font(path, size)
+
+
+def draw_splash(screen, title="CRT Kitchen TV"):
+    """First static frame: pygame's bundled font, so nothing has to be looked up yet."""
+    screen.fill(BACKGROUND)
+    font = pygame.font.Font(None, max(24, screen.get_height() // 10))
+    surf = font.render(title, True, TITLE_COLOR)
+    screen.blit(surf, surf.get_rect(center=(screen.get_width() // 2, screen.get_height() // 2)))
+    pygame.display.flip()
+
+
+def wrap_text(text, max_chars=42):
+    words = str(text).split()
+    if not words:
+        return [""]
+    lines = []
+    cur = words[0]
+    for word in words[1:]:
+        candidate = f"{cur} {word}"
+        if len(candidate) <= max_chars:
+            cur = candidate
+        else:
+            lines.append(cur)
+            cur = word
+    lines.append(cur)
+    return lines
+
+
+class TextCache:
+    """LRU of rendered text surfaces keyed by (text, color, font size)."""
+
+    def __init__(self, font, font_size, capacity=256):
+        self.font = font
+        self.font_size = font_size
+        self.capacity = capacity
+        self.hits = 0
+        self.misses = 0
+        self._surfaces = OrderedDict()
+
+    def render(self, text, color):
+        key = (text, color, self.font_size)
+        surf = self._surfaces.get(key)
+        if surf is not None:
+            self._surfaces.move_to_end(key)
+            self.hits += 1
+            return surf
+        self.misses += 1
+        surf = self.font.render(text, True, color)
+        self._surfaces[key] = surf
+        if len(self._surfaces) > self.capacity:
+            self._surfaces.popitem(last=False)
+        return surf
+
+
+class FrameStats:
+    """Counts full, partial and skipped frames plus draw time, reported periodically."""
+
+    def __init__(self, interval=STATS_INTERVAL):
+        self.interval = interval
+        self.reset()
+
+    def reset(self):
+        self.full = 0
+        self.partial = 0
+        self.skipped = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.started = time.monotonic()
+
+    def record(self, kind, elapsed_ms=0.0):
+        metrics.inc("crt_ui_frames_total", kind=kind)
+        if kind in ("full", "partial"):
+            metrics.observe("crt_ui_frame_seconds", elapsed_ms / 1000.0, kind=kind)
+        if kind == "full":
+            self.full += 1
+        elif kind == "partial":
+            self.partial += 1
+        else:
+            self.skipped += 1
+            return
+        self.total_ms += elapsed_ms
+        self.max_ms = max(self.max_ms, elapsed_ms)
+
+    def summary(self):
+        drawn = self.full + self.partial
+        avg = self.total_ms / drawn if drawn else 0.0
+        return (
+            f"frames full={self.full} partial={self.partial} skipped={self.skipped} "
+            f"avg={avg:.2f}ms max={self.max_ms:.2f}ms busy={self.total_ms:.0f}ms"
+        )
+
+    def maybe_report(self, log):
+        if time.monotonic() - self.started < self.interval:
+            return
+        if self.full or self.partial:
+            log(self.summary())
+        self.reset()
+
+
+class Renderer:
+    """Draws menu screens, repainting only what changed since the last frame.
+
+    A call with the same scene as last time is a no-op; a list whose only
+    change is the highlighted row repaints just the old and new rows.
+    """
+
+    def __init__(self, screen, font, font_size, cache_size=256):
+        self.screen = screen
+        self.font = font
+        self.text = TextCache(font, font_size, capacity=cache_size)
+        self.stats = FrameStats()
+        self.row_height = font.get_linesize() + 8
+        self.rows = max(1, (screen.get_height() - LIST_TOP - 10) // self.row_height)
+        self._scene = None
+        self._status = None
+        self._thumbs = ()
+
+    def invalidate(self):
+        self._scene = None
+        self._status = None
+        self._thumbs = ()
+
+    def _row_rect(self, idx):
+        return pygame.Rect(0, LIST_TOP + idx * self.row_height, self.screen.get_width(), self.row_height)
+
+    def _draw_status(self, status):
+        # Position counter, right-aligned on the title line; repainted on its own.
+        width = self.screen.get_width()
+        rect = pygame.Rect(width * 2 // 3, 25, width - width * 2 // 3, self.font.get_linesize())
+        self.screen.fill(BACKGROUND, rect)
+        if status:
+            surf = self.text.render(status, SUBTITLE_COLOR)
+            self.screen.blit(surf, (width - surf.get_width() - 20, rect.y))
+        self._status = status
+        return rect
+
+    @property
+    def thumb_height(self):
+        return self.row_height - 8
+
+    def _draw_row(self, idx, text, selected, thumb=None, with_thumb=False):
+        rect = self._row_rect(idx)
+        self.screen.fill(BACKGROUND, rect)
+        color = SELECTED_COLOR if selected else ITEM_COLOR
+        x = 60
+        if with_thumb:
+            # Fixed-width thumbnail column so text does not jump when thumbnails arrive.
+            if thumb is not None:
+                self.screen.blit(thumb, (40, rect.y + (self.thumb_height - thumb.get_height()) // 2))
+            x = 40 + self.thumb_height * 4 // 3 + 12
+        self.screen.blit(self.text.render(text, color), (x, rect.y))
+        return rect
+
+    def draw_list(self, title, items, selected, subtitle="", status="", thumbs=None):
+        """Draw a list; items should already be the visible window (see ListView).
+
+        thumbs, when given, holds a surface or None per visible row; rows whose
+        thumbnail changed are repainted on their own.
+        """
+        visible = tuple(items[: self.rows])
+        with_thumb = thumbs is not None
+        thumbs = tuple(thumbs[: self.rows]) if with_thumb else ()
+        scene = ("list", title, subtitle, visible, with_thumb)
+        start = time.perf_counter()
+        if self._scene is not None and self._scene[:-1] == scene:
+            previous = self._scene[-1]
+            changed = set()
+            if previous != selected:
+                changed.update((previous, selected))
+            for idx, thumb in enumerate(thumbs):
+                if idx >= len(self._thumbs) or self._thumbs[idx] is not thumb:
+                    changed.add(idx)
+            if not changed and status == self._status:
+                self.stats.record("skipped")
+                return False
+            rects = []
+            for idx in sorted(changed):
+                if 0 <= idx < len(visible):
+                    thumb = thumbs[idx] if idx < len(thumbs) else None
+                    rects.append(self._draw_row(idx, visible[idx], idx == selected, thumb, with_thumb))
+            self._thumbs = thumbs
+            if status != self._status:
+                rects.append(self._draw_status(status))
+            pygame.display.update(rects)
+            self._scene = scene + (selected,)
+            self.stats.record("partial", (time.perf_counter() - start) * 1000)
+            return True
+
+        self.screen.fill(BACKGROUND)
+        self.screen.blit(self.text.render(title, TITLE_COLOR), (40, 25))
+        if subtitle:
+            self.screen.blit(self.text.render(subtitle, SUBTITLE_COLOR), (40, 80))
+        for idx, text in enumerate(visible):
+            thumb = thumbs[idx] if idx < len(thumbs) else None
+            self._draw_row(idx, text, idx == selected, thumb, with_thumb)
+        self._thumbs = thumbs
+        self._draw_status(status)
+        pygame.display.flip()
+        self._scene = scene + (selected,)
+        self.stats.record("full", (time.perf_counter() - start) * 1000)
+        return True
+
+    def draw_message(self, message, hint="Backspace to return"):
+        scene = ("message", message, hint)
+        if scene == self._scene:
+            self.stats.record("skipped")
+            return False
+        start = time.perf_counter()
+        self.screen.fill(BACKGROUND)
+        y = 150
+        for line in wrap_text(message, max_chars=42)[:4]:
+            self.screen.blit(self.text.render(line, ERROR_COLOR), (40, y))
+            y += self.font.get_linesize() + 5
+        self.screen.blit(self.text.render(hint, HINT_COLOR), (40, min(y + 20, 430)))
+        pygame.display.flip()
+        self._scene = scene
+        self.stats.record("full", (time.perf_counter() - start) * 1000)
+        return True
+
+    def draw_loading(self, title, subtitle, phase, hint=""):
+        """Loading screen; consecutive phases only repaint the spinner line."""
+        scene = ("loading", title, subtitle)
+        start = time.perf_counter()
+        width = self.screen.get_width()
+        spinner_rect = pygame.Rect(0, LIST_TOP + self.row_height, width, self.row_height)
+        full = scene != self._scene
+        if full:
+            self.screen.fill(BACKGROUND)
+            self.screen.blit(self.text.render(title, TITLE_COLOR), (40, 25))
+            self.screen.blit(self.text.render(subtitle, ITEM_COLOR), (40, LIST_TOP))
+        self.screen.fill(BACKGROUND, spinner_rect)
+        dots = "." * (phase % 4)
+        self.screen.blit(self.text.render(f"{dots:<3} {hint}".rstrip(), SUBTITLE_COLOR), (40, spinner_rect.y))
+        if full:
+            pygame.display.flip()
+        else:
+            pygame.display.update([spinner_rect])
+        self._scene = scene
+        self.stats.record("full" if full else "partial", (time.perf_counter() - start) * 1000)
+        return True
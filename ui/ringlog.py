@@ -0,0 +1,286 @@
+import atexit
+import fcntl
+import json
+import mmap
+import os
+import struct
+import threading
+import time
+import zlib
+from collections import deque
+
+# tmpfs: bounded, never written to the SD card, gone after a reboot.
+DEFAULT_RING_PATH = os.environ.get(
+    "CRT_LOG_RING",
+    "/dev/shm/crt-kitchen-tv-log.ring" if os.path.isdir("/dev/shm") else "/tmp/crt-kitchen-tv-log.ring",
+)
+DEFAULT_CAPACITY = 2 * 1024 * 1024
+FLUSH_SECONDS = 0.25
+MAX_PENDING = 256
+MAX_MESSAGE = 4096
+LEVELS = ("debug", "info", "warning", "error")
+
+MAGIC = b"CRTRING1"
+HEADER = struct.Struct("<8sQQQ")  # magic, capacity, head (bytes ever written), records ever written
+HEADER_SIZE = 64
+RECORD = struct.Struct("<II")  # payload length, crc32
+TRAILER = struct.Struct("<I")  # payload length again, so the ring can be walked backwards
+OVERHEAD = RECORD.size + TRAILER.size
+
+
+class RingLog:
+    """Fixed-size log of JSON records in a memory-mapped file.
+
+    Records are framed as length, crc32, payload, length and written at
+    head % capacity, wrapping at the end; head counts every byte ever written
+    and doubles as a stream position. Writers take an flock per batch. Readers
+    take no lock: they copy the span they need, re-read head and keep only records that
+    cannot have been overwritten meanwhile and whose crc matches.
+    """
+
+    def __init__(self, path=DEFAULT_RING_PATH, capacity=DEFAULT_CAPACITY, readonly=False):
+        self.path = path
+        self.readonly = readonly
+        self._mm = None
+        self._fd = None
+        self._lock = threading.Lock()
+        self._pending = deque()
+        self._cond = threading.Condition(self._lock)
+        self._flusher = None
+        self._closed = False
+        if readonly:
+            try:
+                self._fd = os.open(path, os.O_RDONLY)
+                self._mm = mmap.mmap(self._fd, 0, access=mmap.ACCESS_READ)
+            except (OSError, ValueError):
+                self._close_fd()
+                return
+            magic, self.capacity, _, _ = HEADER.unpack_from(self._mm, 0)
+            if magic != MAGIC or len(self._mm) < HEADER_SIZE + self.capacity:
+                self.close()
+            return
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        fcntl.flock(self._fd, fcntl.LOCK_EX)
+        try:
+            size = os.fstat(self._fd).st_size
+            existing = None
+            if size >= HEADER_SIZE:
+                magic, mapped, _, _ = HEADER.unpack(os.pread(self._fd, HEADER.size, 0))
+                if magic == MAGIC and size >= HEADER_SIZE + mapped:
+                    existing = mapped
+            if existing is None:
+                # New or unrecognised file: start an empty ring.
+                os.ftruncate(self._fd, 0)
+                os.ftruncate(self._fd, HEADER_SIZE + capacity)
+                os.pwrite(self._fd, HEADER.pack(MAGIC, capacity, 0, 0), 0)
+            self.capacity = existing or capacity
+            self._mm = mmap.mmap(self._fd, HEADER_SIZE + self.capacity)
+        finally:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    @property
+    def available(self):
+        return self._mm is not None
+
+    def _close_fd(self):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+    def head(self):
+        if self._mm is None:
+            return 0
+        return HEADER.unpack_from(self._mm, 0)[2]
+
+    def append(self, record):
+        """Queue a record; a background thread writes queued records in batches."""
+        with self._cond:
+            if self._closed:
+                return
+            self._pending.append(record)
+            if self._flusher is None:
+                self._flusher = threading.Thread(target=self._run, name="ringlog", daemon=True)
+                self._flusher.start()
+            # The flusher sleeps without a timeout while nothing is queued: wake it for the first record.
+            if len(self._pending) == 1 or len(self._pending) >= MAX_PENDING:
+                self._cond.notify()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._closed or self._pending)
+                if self._closed:
+                    return
+                # Let a batch collect for up to FLUSH_SECONDS; an idle TV does not wake at all.
+                self._cond.wait_for(lambda: self._closed or len(self._pending) >= MAX_PENDING, FLUSH_SECONDS)
+                if self._closed:
+                    return
+            self.flush()
+
+    def flush(self):
+        with self._cond:
+            batch = list(self._pending)
+            self._pending.clear()
+        if batch and self._mm is not None:
+            self.write(batch)
+
+    def write(self, records):
+        frames = []
+        for record in records:
+            payload = json.dumps(record, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+            if len(payload) + OVERHEAD > self.capacity // 4:
+                continue
+            frames.append(RECORD.pack(len(payload), zlib.crc32(payload)) + payload + TRAILER.pack(len(payload)))
+        if not frames:
+            return
+        data = b"".join(frames)
+        fcntl.flock(self._fd, fcntl.LOCK_EX)
+        try:
+            # Re-read head under the lock: another process may have written since.
+            _, capacity, head, count = HEADER.unpack_from(self._mm, 0)
+            if len(data) > capacity:
+                data = data[-capacity:]
+            offset = head % capacity
+            first = min(len(data), capacity - offset)
+            self._mm[HEADER_SIZE + offset : HEADER_SIZE + offset + first] = data[:first]
+            if first < len(data):
+                self._mm[HEADER_SIZE : HEADER_SIZE + len(data) - first] = data[first:]
+            HEADER.pack_into(self._mm, 0, MAGIC, capacity, head + len(data), count + len(frames))
+        finally:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    def read(self, since=None, limit=None, match=None, component=None):
+        """Return (records oldest first, head).
+
+        Only records starting at or after since (a previous head) are returned;
+        with limit, the newest limit records that pass match(record). Records
+        of other components are skipped before being decoded.
+        """
+        if self._mm is None:
+            return [], since or 0
+        capacity = self.capacity
+        end = self.head()
+        if since is not None and since > end:
+            # The ring was recreated (e.g. after a reboot); the old position means nothing.
+            since = None
+        if since == end:
+            return [], end
+        # Copy only the span that can hold wanted records, so that data[i] is the
+        # byte at stream position base + i (two slices when it wraps).
+        base = max(since or 0, end - capacity)
+        split = HEADER_SIZE + base % capacity
+        stop = split + (end - base)
+        if stop <= HEADER_SIZE + capacity:
+            data = self._mm[split:stop]
+        else:
+            data = self._mm[split : HEADER_SIZE + capacity] + self._mm[HEADER_SIZE : stop - capacity]
+        needle = b'"component":' + json.dumps(component, ensure_ascii=False).encode("utf-8") if component else None
+        low = max(base, self.head() - capacity, since or 0)
+        records = []
+        pos = end
+        while pos - OVERHEAD >= low:
+            length = TRAILER.unpack_from(data, pos - TRAILER.size - base)[0]
+            start = pos - OVERHEAD - length
+            if start < low:
+                break
+            frame_len, crc = RECORD.unpack_from(data, start - base)
+            if frame_len != length:
+                break
+            pos = start
+            begin = start - base + RECORD.size
+            if needle is not None and data.find(needle, begin, begin + length) < 0:
+                continue
+            payload = data[begin : begin + length]
+            if zlib.crc32(payload) != crc:
+                break
+            try:
+                record = json.loads(payload)
+            except ValueError:
+                continue
+            if match is not None and not match(record):
+                continue
+            record["pos"] = start
+            records.append(record)
+            if limit is not None and len(records) >= limit:
+                break
+        records.reverse()
+        return records, end
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        if not self.readonly:
+            self.flush()
+        if self._mm is not None:
+            self._mm.close()
+            self._mm = None
+        self._close_fd()
+
+
+_rings = {}
+_rings_lock = threading.Lock()
+
+
+def open_ring(path=DEFAULT_RING_PATH):
+    """The process-wide writer for path, opened on first use (None if it cannot be mapped)."""
+    with _rings_lock:
+        if path not in _rings:
+            try:
+                _rings[path] = RingLog(path)
+            except OSError:
+                _rings[path] = None
+        return _rings[path]
+
+
+@atexit.register
+def _flush_all():
+    for ring in list(_rings.values()):
+        if ring is not None:
+            ring.flush()
+
+
+class Logger:
+    """Callable logger writing structured records (ts, level, component, message) to the ring.
+
+    Falls back to appending a text line to fallback_path when the ring
+    cannot be mapped.
+    """
+
+    def __init__(self, component, path=DEFAULT_RING_PATH, fallback_path=None):
+        self.component = component
+        self.path = path
+        self.fallback_path = fallback_path
+
+    def __call__(self, message, level="info", **fields):
+        record = {"ts": round(time.time(), 3), "level": level, "component": self.component, "message": str(message)[:MAX_MESSAGE]}
+        if fields:
+            record.update(fields)
+        ring = open_ring(self.path)
+        if ring is not None:
+            ring.append(record)
+            return
+        if self.fallback_path:
+            try:
+                with open(self.fallback_path, "a", encoding="utf-8") as f:
+                    f.write(format_record(record) + "\n")
+            except Exception:
+                pass
+
+
+def level_at_least(minimum):
+    rank = LEVELS.index(minimum) if minimum in LEVELS else 0
+
+    def match(record):
+        level = record.get("level", "info")
+        return level not in LEVELS or LEVELS.index(level) >= rank
+
+    return match
+
+
+def format_record(record, with_component=False):
+    stamp = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(record.get("ts", 0)))
+    level = record.get("level", "info")
+    prefix = f"{record.get('component', '')}: " if with_component else ""
+    marker = "" if level == "info" else f"{level.upper()} "
+    return f"[{stamp}] {marker}{prefix}{record.get('message', '')}"
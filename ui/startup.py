@@ -0,0 +1,119 @@
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+DEFAULT_REPORT_PATH = "/var/lib/crt-kitchen-tv/startup.json"
+HISTORY_LENGTH = 50
+
+
+def _boottime():
+    try:
+        return time.clock_gettime(time.CLOCK_BOOTTIME)
+    except (AttributeError, OSError):
+        return None
+
+
+def process_start_since_boot():
+    """Seconds after boot at which this process was started (from /proc/self/stat), or None."""
+    try:
+        with open("/proc/self/stat", "r", encoding="ascii") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+        # Field 22 (starttime) is the 20th after the ")" that ends the command name.
+        return int(fields[19]) / os.sysconf("SC_CLK_TCK")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class StartupReport:
+    """Timestamps for each startup phase, relative to boot and to process start.
+
+    mark() may be called from any thread. finish() stores the report
+    (latest run plus a short history) so boot-to-interactive can be tracked
+    across releases; phases marked afterwards by background threads are
+    added to the stored report as they arrive.
+    """
+
+    def __init__(self, path=DEFAULT_REPORT_PATH, log=None):
+        self.path = Path(path)
+        self.log = log
+        self.process_start = process_start_since_boot()
+        now_boot = _boottime()
+        # Anchor monotonic time to process start, so phases are comparable to "since boot".
+        self._t0 = time.monotonic() - (now_boot - self.process_start if now_boot and self.process_start else 0.0)
+        self.phases = []
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        self._finished = False
+        self.mark("process_start")
+
+    def mark(self, name):
+        since_start = time.monotonic() - self._t0
+        with self._lock:
+            self.phases.append(
+                {
+                    "phase": name,
+                    "since_start": round(since_start, 3),
+                    "since_boot": round(self.process_start + since_start, 3) if self.process_start is not None else None,
+                    "thread": threading.current_thread().name,
+                }
+            )
+            finished = self._finished
+        if finished:
+            self._save()
+        return since_start
+
+    def summary(self):
+        with self._lock:
+            phases = list(self.phases)
+        interactive = next((p for p in phases if p["phase"] == "interactive"), None)
+        return {
+            "recorded_at": time.time(),
+            "boot_to_interactive": interactive["since_boot"] if interactive else None,
+            "start_to_interactive": interactive["since_start"] if interactive else None,
+            "phases": phases,
+        }
+
+    def finish(self):
+        with self._lock:
+            self._finished = True
+        report = self._save()
+        if self.log and report:
+            steps = " ".join(f"{p['phase']}={p['since_start']:.2f}" for p in report["phases"])
+            boot = report["boot_to_interactive"]
+            self.log(f"startup: interactive {report['start_to_interactive']:.2f}s after start"
+                     f"{f', {boot:.1f}s after boot' if boot is not None else ''} ({steps})")
+
+    def _save(self):
+        with self._save_lock:
+            return self._write()
+
+    def _write(self):
+        report = self.summary()
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                history = json.load(f).get("history", [])
+        except (OSError, ValueError, AttributeError):
+            history = []
+        # The same run is rewritten as late phases arrive; keep one history entry per run.
+        history = [h for h in history if h.get("pid") != os.getpid() or h.get("process_start") != self.process_start]
+        history.append(
+            {
+                "pid": os.getpid(),
+                "process_start": self.process_start,
+                "recorded_at": report["recorded_at"],
+                "boot_to_interactive": report["boot_to_interactive"],
+                "start_to_interactive": report["start_to_interactive"],
+            }
+        )
+        payload = {"latest": report, "history": history[-HISTORY_LENGTH:]}
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.path.with_name(self.path.name + ".tmp")
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(payload, f, indent=1)
+            os.replace(tmp, self.path)
+        except OSError:
+            pass
+        return report
@@ -0,0 +1,266 @@
+import os
+import shutil
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+from ui.library import is_video_name
+
+DEFAULT_HISTORY_PATH = "/var/lib/crt-kitchen-tv/plays.db"
+DEFAULT_MIN_FREE_MB = 500
+DEFAULT_MIN_AGE_HOURS = 24
+DEFAULT_CHECK_MINUTES = 30
+GB = 1024 * 1024 * 1024
+MB = 1024 * 1024
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS plays (
+    path TEXT PRIMARY KEY,
+    last_played REAL NOT NULL,
+    plays INTEGER NOT NULL DEFAULT 0,
+    completed INTEGER NOT NULL DEFAULT 0
+) WITHOUT ROWID;
+"""
+
+
+class PlayHistory:
+    """Last-played time and watched flag per path, in SQLite (WAL) so the web service can read it."""
+
+    def __init__(self, db_path=DEFAULT_HISTORY_PATH, readonly=False):
+        self._lock = threading.Lock()
+        if readonly:
+            if not os.path.exists(db_path):
+                self._db = None
+                return
+            self._db = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True, check_same_thread=False)
+            return
+        if db_path != ":memory:":
+            Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(SCHEMA)
+
+    def record(self, path, completed=False, when=None):
+        when = time.time() if when is None else when
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO plays VALUES (?, ?, 1, ?) ON CONFLICT(path) DO UPDATE SET "
+                "last_played = excluded.last_played, plays = plays + 1, completed = MAX(completed, excluded.completed)",
+                (str(path), when, int(bool(completed))),
+            )
+
+    def forget(self, paths):
+        with self._lock:
+            self._db.executemany("DELETE FROM plays WHERE path = ?", [(str(p),) for p in paths])
+
+    def all(self):
+        """Return {path: (last_played, plays, completed)}."""
+        if self._db is None:
+            return {}
+        with self._lock:
+            try:
+                rows = self._db.execute("SELECT path, last_played, plays, completed FROM plays").fetchall()
+            except sqlite3.Error:
+                return {}
+        return {row[0]: (row[1], row[2], bool(row[3])) for row in rows}
+
+    def close(self):
+        if self._db is not None:
+            with self._lock:
+                self._db.close()
+
+
+def storage_options(cfg):
+    opts = dict(cfg.get("storage") or {})
+    opts.setdefault("history_path", DEFAULT_HISTORY_PATH)
+    opts.setdefault("max_total_gb", 0)
+    opts.setdefault("min_free_mb", DEFAULT_MIN_FREE_MB)
+    opts.setdefault("quotas_gb", {})
+    opts.setdefault("min_age_hours", DEFAULT_MIN_AGE_HOURS)
+    opts.setdefault("check_minutes", DEFAULT_CHECK_MINUTES)
+    opts.setdefault("enforce", False)
+    opts.setdefault("evict_unwatched", False)
+    return opts
+
+
+def scan_collections(media_root, collections):
+    """Return {collection: [(path, size, mtime), ...]} for the video files in each collection folder."""
+    usage = {}
+    for name in collections:
+        files = []
+        try:
+            with os.scandir(Path(media_root) / name) as it:
+                for entry in it:
+                    if not is_video_name(entry.name):
+                        continue
+                    try:
+                        if entry.is_file():
+                            st = entry.stat()
+                            files.append((entry.path, st.st_size, st.st_mtime))
+                    except OSError:
+                        continue
+        except OSError:
+            pass
+        usage[name] = files
+    return usage
+
+
+def plan_eviction(cfg, history, now=None, protect=()):
+    """Work out which files to delete to get every quota back under its limit.
+
+    Candidates are ordered watched-before-unwatched, then least recently
+    played (files never played count from their mtime). Files younger than
+    min_age_hours and paths in protect (e.g. the one playing) are never
+    picked. Unwatched files only go for the quotas the user set, not to
+    make free space, unless evict_unwatched is on. Nothing is deleted here;
+    the returned report is what /api/storage shows.
+    """
+    now = time.time() if now is None else now
+    opts = storage_options(cfg)
+    media_root = cfg.get("media_root", "/var/lib/crt-kitchen-tv/media")
+    usage = scan_collections(media_root, cfg.get("collections", []))
+    plays = history.all()
+    protect = {str(p) for p in protect}
+    min_age = float(opts["min_age_hours"]) * 3600
+
+    candidates = []
+    report_collections = {}
+    for name, files in usage.items():
+        used = sum(size for _, size, _ in files)
+        quota = float((opts["quotas_gb"] or {}).get(name) or 0) * GB
+        report_collections[name] = {"files": len(files), "bytes": used, "quota_bytes": int(quota) or None}
+        for path, size, mtime in files:
+            last_played, count, watched = plays.get(path, (None, 0, False))
+            if path in protect or now - mtime < min_age:
+                continue
+            candidates.append(
+                {
+                    "path": path,
+                    "collection": name,
+                    "size": size,
+                    "last_played": last_played,
+                    "plays": count,
+                    "watched": watched,
+                    "_key": (not watched, last_played or mtime),
+                }
+            )
+    candidates.sort(key=lambda c: c["_key"])
+
+    try:
+        disk = shutil.disk_usage(media_root)
+        disk_free = disk.free
+    except OSError:
+        disk_free = None
+    total_used = sum(c["bytes"] for c in report_collections.values())
+    total_quota = float(opts["max_total_gb"] or 0) * GB
+    min_free = float(opts["min_free_mb"] or 0) * MB
+
+    over = {name: c["bytes"] - c["quota_bytes"] for name, c in report_collections.items() if c["quota_bytes"]}
+    evict = []
+    freed = 0
+
+    def global_excess():
+        excess = 0.0
+        if total_quota:
+            excess = max(excess, total_used - freed - total_quota)
+        if disk_free is not None and min_free:
+            excess = max(excess, min_free - (disk_free + freed))
+        return excess
+
+    # Per-collection quotas first, then the global limits from whatever is left.
+    for cand in candidates:
+        if over.get(cand["collection"], 0) > 0:
+            over[cand["collection"]] -= cand["size"]
+            cand["reason"] = "collection quota"
+            evict.append(cand)
+            freed += cand["size"]
+    chosen = {c["path"] for c in evict}
+    for cand in candidates:
+        if global_excess() <= 0:
+            break
+        if cand["path"] in chosen:
+            continue
+        reason = "total quota" if total_quota and total_used - freed > total_quota else "free space"
+        if reason == "free space" and not cand["watched"] and not opts["evict_unwatched"]:
+            continue
+        cand["reason"] = reason
+        evict.append(cand)
+        freed += cand["size"]
+    for cand in evict:
+        cand.pop("_key", None)
+    return {
+        "media_root": str(media_root),
+        "enforce": bool(opts["enforce"]),
+        "collections": report_collections,
+        "total": {
+            "bytes": total_used,
+            "quota_bytes": int(total_quota) or None,
+            "disk_free": disk_free,
+            "min_free_bytes": int(min_free) or None,
+        },
+        "evict": evict,
+        "freed_bytes": freed,
+        "unresolved_bytes": max(0, int(global_excess())) + sum(max(0, int(v)) for v in over.values()),
+    }
+
+
+class StorageManager:
+    """Periodically checks the storage quotas; deletes what plan_eviction picks only with storage.enforce.
+
+    Without it each check is a dry run that just logs what would go.
+    """
+
+    def __init__(self, cfg, history, log=None, protect=None):
+        self.cfg = cfg
+        self.history = history
+        self.log = log or (lambda message: None)
+        self.protect = protect or (lambda: ())
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="storage", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.enforce()
+            except Exception as exc:
+                self.log(f"storage check failed: {exc}")
+            minutes = float(storage_options(self.cfg)["check_minutes"] or DEFAULT_CHECK_MINUTES)
+            self._stop.wait(max(60.0, minutes * 60))
+
+    def enforce(self):
+        plan = plan_eviction(self.cfg, self.history, protect=self.protect())
+        if not plan["enforce"]:
+            if plan["evict"]:
+                self.log(
+                    f"storage dry run: would evict {len(plan['evict'])} file(s), {plan['freed_bytes'] // MB} MB "
+                    "(set storage.enforce: true to delete)"
+                )
+            return []
+        removed = []
+        for cand in plan["evict"]:
+            try:
+                os.remove(cand["path"])
+            except FileNotFoundError:
+                pass
+            except OSError as exc:
+                self.log(f"storage evict failed: {cand['path']} :: {exc}")
+                continue
+            removed.append(cand["path"])
+            self.log(
+                f"storage evicted ({cand['reason']}): {cand['path']} {cand['size'] // MB} MB "
+                f"watched={cand['watched']} last_played={cand['last_played']}"
+            )
+        if removed:
+            self.history.forget(removed)
+        if plan["unresolved_bytes"]:
+            self.log(f"storage still over quota by {plan['unresolved_bytes'] // MB} MB (nothing old enough to evict)")
+        return removed
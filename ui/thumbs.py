@@ -0,0 +1,167 @@
+import hashlib
+import os
+import subprocess
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+import pygame
+
+from ingest.worker import low_priority
+
+DEFAULT_THUMB_DIR = "/var/lib/crt-kitchen-tv/thumbs"
+DEFAULT_CACHE_MB = 64
+EXTRACT_SIZE = (160, 120)
+SEEK_SECONDS = (10, 2, 0)
+LOADED_CAPACITY = 64
+
+
+def thumb_key(path, st):
+    raw = f"{path}|{st.st_mtime_ns}|{st.st_size}".encode("utf-8", errors="surrogateescape")
+    return hashlib.sha1(raw).hexdigest()
+
+
+def extract_frame(src, dst, size=EXTRACT_SIZE, timeout=60):
+    """Grab one frame with ffmpeg at low priority; tries a few seek points for short clips."""
+    w, h = size
+    vf = f"scale={w}:{h}:force_original_aspect_ratio=decrease"
+    tmp = Path(dst).with_suffix(".tmp.jpg")
+    for seek in SEEK_SECONDS:
+        cmd = ["ffmpeg", "-y", "-hide_banner", "-loglevel", "error", "-nostdin", "-ss", str(seek), "-i", str(src)]
+        cmd += ["-frames:v", "1", "-vf", vf, "-q:v", "5", str(tmp)]
+        try:
+            subprocess.run(low_priority(cmd), check=False, capture_output=True, timeout=timeout)
+        except FileNotFoundError:
+            return False
+        except subprocess.TimeoutExpired:
+            continue
+        if tmp.exists() and tmp.stat().st_size > 0:
+            os.replace(tmp, dst)
+            return True
+    if tmp.exists():
+        tmp.unlink()
+    return False
+
+
+class ThumbnailCache:
+    """Poster frames for library rows.
+
+    JPEGs live in a size-bounded directory (LRU by file mtime, refreshed on
+    every hit) keyed by path, mtime and size. lookup() never blocks: it
+    returns the surfaces that are ready and hands the rest to one
+    low-priority worker, which calls on_ready() when a new one is available.
+    """
+
+    def __init__(self, cache_dir=DEFAULT_THUMB_DIR, max_mb=DEFAULT_CACHE_MB, row_height=56, on_ready=None):
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = int(max_mb) * 1024 * 1024
+        self.height = max(8, row_height)
+        self.width = self.height * 4 // 3
+        self.on_ready = on_ready
+        self._loaded = OrderedDict()
+        self._failed = set()
+        self._wanted = []
+        self._cond = threading.Condition()
+        self._stop = False
+        self._thread = None
+        self._used = 0
+
+    def start(self):
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self._used = sum(e.stat().st_size for e in os.scandir(self.cache_dir) if e.name.endswith(".jpg"))
+        self._thread = threading.Thread(target=self._run, name="thumbnails", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        with self._cond:
+            self._stop = True
+            self._cond.notify_all()
+
+    def set_row_height(self, row_height):
+        """Rows changed size (font change); scaled surfaces are rebuilt from the JPEGs on demand."""
+        with self._cond:
+            self.height = max(8, row_height)
+            self.width = self.height * 4 // 3
+            self._loaded.clear()
+            self._wanted = []
+
+    def lookup(self, paths):
+        """Return a surface or None per path; missing ones become the worker's wanted list."""
+        result = []
+        wanted = []
+        with self._cond:
+            for path in paths:
+                try:
+                    key = thumb_key(path, os.stat(path))
+                except OSError:
+                    result.append(None)
+                    continue
+                surf = self._loaded.get(key)
+                if surf is not None:
+                    self._loaded.move_to_end(key)
+                elif key not in self._failed:
+                    wanted.append((key, path))
+                result.append(surf)
+            # Only rows on screen right now are worth extracting; older requests are dropped.
+            self._wanted = wanted
+            if wanted:
+                self._cond.notify()
+        return result
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._stop and not self._wanted:
+                    self._cond.wait()
+                if self._stop:
+                    return
+                key, path = self._wanted.pop(0)
+            surf = self._produce(key, path)
+            with self._cond:
+                if surf is None:
+                    self._failed.add(key)
+                    continue
+                self._loaded[key] = surf
+                while len(self._loaded) > LOADED_CAPACITY:
+                    self._loaded.popitem(last=False)
+            if self.on_ready is not None:
+                self.on_ready()
+
+    def _produce(self, key, path):
+        jpg = self.cache_dir / f"{key}.jpg"
+        if jpg.exists():
+            os.utime(jpg)
+        else:
+            if not extract_frame(path, jpg):
+                return None
+            self._used += jpg.stat().st_size
+            self._evict()
+        try:
+            image = pygame.image.load(str(jpg))
+        except (pygame.error, OSError):
+            jpg.unlink(missing_ok=True)
+            return None
+        w, h = image.get_size()
+        scale = min(self.width / max(1, w), self.height / max(1, h))
+        return pygame.transform.smoothscale(image, (max(1, int(w * scale)), max(1, int(h * scale))))
+
+    def _evict(self):
+        if self._used <= self.max_bytes:
+            return
+        entries = []
+        for entry in os.scandir(self.cache_dir):
+            if entry.name.endswith(".jpg"):
+                st = entry.stat()
+                entries.append((st.st_mtime, st.st_size, entry.path))
+        entries.sort()
+        self._used = sum(size for _, size, _ in entries)
+        # Drop least recently used down to 90% so eviction does not run on every new thumbnail.
+        target = self.max_bytes * 9 // 10
+        for _, size, path in entries:
+            if self._used <= target:
+                break
+            try:
+                os.remove(path)
+                self._used -= size
+            except OSError:
+                pass
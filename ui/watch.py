@@ -0,0 +1,203 @@
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import threading
+
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+
+WATCH_MASK = IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF
+EVENT_HEADER = struct.Struct("iIII")
+
+
+def _load_inotify():
+    if not os.path.exists("/proc/sys/fs/inotify"):
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        libc.inotify_init1.argtypes = [ctypes.c_int]
+        libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        libc.inotify_rm_watch.argtypes = [ctypes.c_int, ctypes.c_int]
+        return libc
+    except (OSError, AttributeError):
+        return None
+
+
+class DirWatcher:
+    """Report file changes in a set of directories.
+
+    Uses inotify where available and falls back to polling directory mtimes
+    (dev machines, exotic filesystems). The callback runs on the watcher thread
+    as callback(key, name, kind) with kind one of "changed", "removed" or
+    "rescan" (name is None for rescans).
+    """
+
+    def __init__(self, callback, poll_interval=10.0):
+        self.callback = callback
+        self.poll_interval = poll_interval
+        self._folders = {}
+        self._wds = {}
+        self._watched = {}
+        self._mtimes = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._libc = _load_inotify()
+        self._fd = -1
+        if self._libc is not None:
+            self._fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+            if self._fd < 0:
+                self._libc = None
+
+    @property
+    def uses_inotify(self):
+        return self._fd >= 0
+
+    def add(self, key, folder):
+        """Watch folder under key; re-adding a key with another folder moves its watch."""
+        folder = str(folder)
+        with self._lock:
+            if self._folders.get(key, folder) != folder:
+                self._drop_watch(key)
+            self._folders[key] = folder
+            self._mtimes[key] = self._dir_mtime(folder)
+            if self.uses_inotify:
+                self._add_watch(key)
+
+    def remove(self, key):
+        with self._lock:
+            self._folders.pop(key, None)
+            self._mtimes.pop(key, None)
+            self._drop_watch(key)
+
+    def _drop_watch(self, key):
+        wd = self._watched.pop(key, None)
+        if wd is not None:
+            keys = self._wds.get(wd, set())
+            keys.discard(key)
+            if not keys:
+                self._wds.pop(wd, None)
+                self._libc.inotify_rm_watch(self._fd, wd)
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name="dir-watcher", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+            self._thread = None
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+
+    def _dir_mtime(self, folder):
+        try:
+            return os.stat(folder).st_mtime_ns
+        except OSError:
+            return None
+
+    def _add_watch(self, key):
+        if key in self._watched:
+            return True
+        folder = self._folders[key]
+        wd = self._libc.inotify_add_watch(self._fd, os.fsencode(folder), WATCH_MASK)
+        if wd < 0:
+            return False
+        # The kernel hands out one descriptor per inode, so two keys may share it.
+        self._wds.setdefault(wd, set()).add(key)
+        self._watched[key] = wd
+        return True
+
+    def _emit(self, key, name, kind):
+        try:
+            self.callback(key, name, kind)
+        except Exception:
+            pass
+
+    def _run(self):
+        if self.uses_inotify:
+            self._run_inotify()
+        else:
+            self._run_polling()
+
+    def _run_polling(self):
+        while not self._stop.wait(self.poll_interval):
+            with self._lock:
+                folders = dict(self._folders)
+            for key, folder in folders.items():
+                mtime = self._dir_mtime(folder)
+                if mtime != self._mtimes.get(key):
+                    self._mtimes[key] = mtime
+                    self._emit(key, None, "rescan")
+
+    def _run_inotify(self):
+        while not self._stop.is_set():
+            # Folders that did not exist yet (or were replaced) are retried here.
+            with self._lock:
+                missing = [k for k in self._folders if k not in self._watched]
+                for key in missing:
+                    if self._add_watch(key):
+                        self._emit(key, None, "rescan")
+            try:
+                ready, _, _ = select.select([self._fd], [], [], self.poll_interval)
+            except (OSError, ValueError):
+                return
+            if not ready:
+                continue
+            try:
+                data = os.read(self._fd, 64 * 1024)
+            except BlockingIOError:
+                continue
+            except OSError:
+                return
+            self._dispatch(data)
+
+    def _dispatch(self, data):
+        pending = {}
+        offset = 0
+        while offset + EVENT_HEADER.size <= len(data):
+            wd, mask, _cookie, length = EVENT_HEADER.unpack_from(data, offset)
+            raw_name = data[offset + EVENT_HEADER.size : offset + EVENT_HEADER.size + length]
+            offset += EVENT_HEADER.size + length
+            if mask & IN_Q_OVERFLOW:
+                with self._lock:
+                    keys = list(self._folders)
+                for key in keys:
+                    pending[(key, None)] = "rescan"
+                continue
+            gone = bool(mask & (IN_IGNORED | IN_DELETE_SELF | IN_MOVE_SELF))
+            with self._lock:
+                keys = set(self._wds.get(wd, ()))
+                if keys and gone:
+                    self._wds.pop(wd, None)
+                    for key in keys:
+                        self._watched.pop(key, None)
+            if gone:
+                for key in keys:
+                    pending[(key, None)] = "rescan"
+                continue
+            if mask & IN_ISDIR:
+                continue
+            name = os.fsdecode(raw_name.rstrip(b"\0"))
+            kind = "removed" if mask & (IN_DELETE | IN_MOVED_FROM) else "changed"
+            for key in keys:
+                pending[(key, name)] = kind
+        # Coalesce bursts (e.g. a copy emitting ATTRIB + CLOSE_WRITE) into one callback per file.
+        for (key, name), kind in pending.items():
+            self._emit(key, name, kind)
+